@@ -1,12 +1,23 @@
+import argparse
 from io import StringIO
+from typing import Iterable, Optional
 
 import ruamel.yaml
 
-from custom_components.sleep_as_android.device_trigger import DOMAIN, TRIGGERS
+from custom_components.sleep_as_android.const import DEVICE_TRIGGER_EVENT, DOMAIN
+from custom_components.sleep_as_android.events import (
+    CATEGORY_EVENTS,
+    CATEGORY_TRIGGERS,
+    EVENT_CATEGORIES,
+)
 
 yaml = ruamel.yaml.YAML()
 
 yaml.preserve_quotes = True
+# keep long source_url on one line
+yaml.width = 4096
+
+SOURCE_URL = "https://github.com/IATkachenko/HA-SleepAsAndroid/blob/main/{}"
 
 
 def tagged_empty_scalar(tag, value):
@@ -19,13 +30,21 @@ def single_quote_dump(raw_str):
     return changed_yaml.load(raw_str)
 
 
-def main():
-    blueprint = {
+def variant_file_name(category: Optional[str] = None, compact: bool = False) -> str:
+    """Name of blueprint file for all events or for events of category."""
+    if category is not None:
+        return f"blueprint_{category}.yaml"
+    return "blueprint_compact.yaml" if compact else "blueprint.yaml"
+
+
+def base_blueprint(name: str, description: str, file_name: str) -> dict:
+    """Blueprint with device, person and state inputs and no triggers or actions."""
+    return {
         "blueprint": {
-            "name": "Sleep as Android MQTT actions",
-            "description": "Define actions based on Sleep As Android sensor states",
+            "name": name,
+            "description": description,
             "domain": "automation",
-            "source_url": "https://github.com/IATkachenko/HA-SleepAsAndroid/blob/main/blueprint.yaml",
+            "source_url": SOURCE_URL.format(file_name),
             "input": {
                 "device": {
                     "name": "SleepAsAndroid device",
@@ -61,13 +80,27 @@ def main():
         "action": [{"choose": []}],
     }
 
-    for t in TRIGGERS:
-        blueprint["blueprint"]["input"][t] = {
-            "name": t,
-            "description": f"{t} event",
-            "default": [],
-            "selector": {"action": {}},
-        }
+
+def add_action_input(blueprint: dict, t: str) -> None:
+    """Add input for actions on event t."""
+    blueprint["blueprint"]["input"][t] = {
+        "name": t,
+        "description": f"{t} event",
+        "default": [],
+        "selector": {"action": {}},
+    }
+
+
+def full_blueprint(events: Iterable[str]) -> dict:
+    """Blueprint with a device trigger and a choose branch per event."""
+    blueprint = base_blueprint(
+        "Sleep as Android MQTT actions",
+        "Define actions based on Sleep As Android sensor states",
+        variant_file_name(),
+    )
+
+    for t in events:
+        add_action_input(blueprint, t)
         blueprint["action"][0]["choose"].append(
             {
                 "conditions": {
@@ -87,16 +120,142 @@ def main():
             }
         )
 
-    string_stream = StringIO()
+    return blueprint
 
+
+def compact_blueprint(events: Iterable[str], category: Optional[str] = None) -> dict:
+    """Blueprint with a single trigger, dispatching to actions by event type.
+
+    Blueprint for category uses category device trigger, blueprint for any events
+    uses event trigger for device events of the device. Both provide event type
+    as trigger.event.data.type.
+    """
+    if category is None:
+        blueprint = base_blueprint(
+            "Sleep as Android MQTT actions (compact)",
+            "Define actions based on Sleep As Android events with a single trigger",
+            variant_file_name(compact=True),
+        )
+        blueprint["trigger"].append(
+            {
+                "platform": "event",
+                "event_type": DEVICE_TRIGGER_EVENT,
+                "event_data": {
+                    "device_id": tagged_empty_scalar("input", "'device'"),
+                },
+            }
+        )
+    else:
+        blueprint = base_blueprint(
+            f"Sleep as Android {category.replace('_', ' ')} actions",
+            f"Define actions based on Sleep As Android {category.replace('_', ' ')} "
+            "events",
+            variant_file_name(category),
+        )
+        blueprint["trigger"].append(
+            {
+                "platform": "device",
+                "domain": f"{DOMAIN}",
+                "device_id": tagged_empty_scalar("input", "'device'"),
+                "type": next(t for t, c in CATEGORY_TRIGGERS.items() if c == category),
+            }
+        )
+
+    for t in events:
+        add_action_input(blueprint, t)
+        blueprint["action"][0]["choose"].append(
+            {
+                "conditions": f"{{{{ trigger.event.data.type == '{t}' }}}}",
+                "sequence": tagged_empty_scalar("input", f"'{t}'"),
+            }
+        )
+
+    return blueprint
+
+
+def build_blueprint(
+    compact: bool = False,
+    category: Optional[str] = None,
+    events: Optional[Iterable[str]] = None,
+) -> dict:
+    """Build blueprint.
+
+    :param compact: use a single trigger instead of a trigger per event
+    :param category: only events of category, implies compact
+    :param events: only these events; events without actions do not need inputs
+    """
+    selected = list(EVENT_CATEGORIES if events is None else events)
+    unknown = [t for t in selected if t not in EVENT_CATEGORIES]
+    if unknown:
+        raise ValueError(f"Unknown events: {', '.join(unknown)}")
+    if category is not None:
+        selected = [t for t in selected if t in CATEGORY_EVENTS[category]]
+        return compact_blueprint(selected, category)
+    if compact:
+        return compact_blueprint(selected)
+    return full_blueprint(selected)
+
+
+def dump(blueprint: dict) -> str:
+    """Blueprint as YAML."""
+    string_stream = StringIO()
     yaml.dump(blueprint, string_stream)
     output_str = string_stream.getvalue()
     string_stream.close()
-    print(output_str.replace('"', "'"))
+    return output_str
+
 
-    with open("blueprint.yaml", "w") as outfile:
+def write(blueprint: dict, file_name: str) -> None:
+    """Write blueprint to file."""
+    with open(file_name, "w") as outfile:
         yaml.dump(blueprint, outfile)
 
 
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate Sleep As Android automation blueprints"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="single trigger for all events instead of a trigger per event",
+    )
+    variant = parser.add_mutually_exclusive_group()
+    variant.add_argument(
+        "--category",
+        choices=list(CATEGORY_EVENTS),
+        help="blueprint for events of category, with a single category trigger",
+    )
+    variant.add_argument(
+        "--all-categories",
+        action="store_true",
+        help="write blueprint_<category>.yaml for every category",
+    )
+    parser.add_argument(
+        "--events",
+        nargs="+",
+        metavar="EVENT",
+        help="only inputs for these events",
+    )
+    parser.add_argument("--output", help="output file, defaults to blueprint.yaml")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None):
+    args = parse_args(argv)
+
+    if args.all_categories:
+        for category in CATEGORY_EVENTS:
+            write(
+                build_blueprint(category=category, events=args.events),
+                variant_file_name(category),
+            )
+        return
+
+    blueprint = build_blueprint(args.compact, args.category, args.events)
+    print(dump(blueprint).replace('"', "'"))
+    write(blueprint, args.output or variant_file_name(args.category, args.compact))
+
+
 if __name__ == "__main__":
     main()
@@ -1,25 +1,82 @@
 """Sleep As Android integration."""
 from __future__ import annotations
 
-from functools import cache, cached_property
+import asyncio
+from datetime import datetime, timedelta
+from functools import cached_property
 import logging
-import re
-from typing import Callable
+from time import perf_counter_ns
+from typing import Awaitable, Callable
 
-from awesomeversion import AwesomeVersion
-from homeassistant.components.mqtt import subscription
-from homeassistant.components.mqtt.subscription import EntitySubscription
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant, callback
-from homeassistant.exceptions import NoEntitySpecifiedError
-from homeassistant.helpers import entity_registry as er
-from pyhaversion import HaVersion
-
-from .const import DEVICE_MACRO, DOMAIN
-from .sensor import SleepAsAndroidSensor
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, Platform
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
+
+from .alarm import async_get_alarm_scheduler
+from .binary_sensor import BINARY_SENSORS, SleepAsAndroidBinarySensor
+from .cache import caches_info, clear_caches, lru_cache_method
+from .capture import MessageRecorder
+from .const import (
+    CAPTURE_FLUSH_INTERVAL,
+    CAPTURE_FLUSH_SIZE,
+    CONF_ALARM_TOPIC,
+    CONF_ALARMS,
+    CONF_CAPTURE_FILE,
+    CONF_COALESCE_WINDOW,
+    CONF_DIAGNOSTIC_SENSORS,
+    CONF_EVENT_MODE,
+    CONF_QUEUE_POLICY,
+    CONF_QUEUE_SIZE,
+    CONF_TRACE_SAMPLE_RATE,
+    CONF_VOLATILE_ATTRIBUTES,
+    DATA_ALARM_SCHEDULER,
+    DEFAULT_ALARM_TOPIC,
+    DEFAULT_CAPTURE_FILE,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_DIAGNOSTIC_SENSORS,
+    DEFAULT_EVENT_MODE,
+    DEFAULT_NAME,
+    DEFAULT_QOS,
+    DEFAULT_QUEUE_POLICY,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_TRACE_SAMPLE_RATE,
+    DEFAULT_VOLATILE_ATTRIBUTES,
+    DEVICE_MACRO,
+    DOMAIN,
+    QUEUE_POLICY_OFF,
+    SENSOR_ATTRIBUTES,
+    SESSION_UNIQUE_ID_SUFFIX,
+)
+from .logs import TraceSampler
+from .metrics import (
+    STAGE_RECEIVE,
+    STAGE_TOPIC,
+    STARTUP_REGISTRY_SCANNED,
+    STARTUP_SENSORS_RESTORED,
+    STARTUP_SUBSCRIBED,
+    Metrics,
+)
+from .sensor import SleepAsAndroidSensor, SleepAsAndroidSessionSensor
+from .subscriptions import async_get_subscription_manager
+from .topic import TopicRouter
+from .work_queue import DeviceQueue
 
 _LOGGER = logging.getLogger(__name__)
+_TRACE_LOGGER = logging.getLogger(f"{__name__}.trace")
+
+PLATFORMS = [Platform.SENSOR, Platform.BINARY_SENSOR]
+# platforms and unique id suffixes of entities created for every device
+DEVICE_ENTITIES: tuple[tuple[Platform, str], ...] = (
+    (Platform.SENSOR, ""),
+    (Platform.SENSOR, SESSION_UNIQUE_ID_SUFFIX),
+    *((Platform.BINARY_SENSOR, f"_{key}") for key in BINARY_SENSORS),
+)
+
+# options that change the set of entities: applied by reloading the entry
+RELOAD_OPTIONS = frozenset({CONF_DIAGNOSTIC_SENSORS})
 
 
 async def async_setup(_hass: HomeAssistant, _config_entry: ConfigEntry):
@@ -35,28 +92,39 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
         hass.data[DOMAIN] = {}
 
     registry = await er.async_get_registry(hass)
-    hass.data[DOMAIN][config_entry.entry_id] = SleepAsAndroidInstance(
+    instance = hass.data[DOMAIN][config_entry.entry_id] = SleepAsAndroidInstance(
         hass, config_entry, registry
     )
+    # subscribe before platforms are set up: sensors created for incoming messages
+    # buffer them until sensor platform adds them to Home Assistant
+    await instance.subscribe_root_topic()
+    instance.async_update_alarms()
 
-    hass.config_entries.async_setup_platforms(config_entry, [Platform.SENSOR])
+    hass.config_entries.async_setup_platforms(config_entry, PLATFORMS)
     config_entry.async_on_unload(config_entry.add_update_listener(async_update_options))
     return True
 
 
 async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Update options for entry that was configured via user interface."""
-    await hass.config_entries.async_reload(entry.entry_id)
+    instance: SleepAsAndroidInstance | None = hass.data[DOMAIN].get(entry.entry_id)
+    if instance is None or not await instance.async_apply_options():
+        await hass.config_entries.async_reload(entry.entry_id)
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Remove entry configured via user interface."""
-    unload_ok = await hass.config_entries.async_unload_platforms(
-        entry, [Platform.SENSOR]
-    )
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         instance: SleepAsAndroidInstance = hass.data[DOMAIN].pop(entry.entry_id)
         await instance.unsubscribe()
+        scheduler = async_get_alarm_scheduler(hass)
+        scheduler.async_set_alarms(entry.entry_id, [])
+        if not hass.data[DOMAIN]:
+            # scheduler is shared by entries: the last one stops it
+            scheduler.async_stop()
+            hass.data.pop(DATA_ALARM_SCHEDULER)
+        instance.invalidate_caches()
     return unload_ok
 
 
@@ -68,89 +136,269 @@ class SleepAsAndroidInstance:
         self.hass = hass
         self._config_entry = config_entry
         self.__sensors: dict[str, SleepAsAndroidSensor] = {}
+        self._queues: dict[str, DeviceQueue] = {}
+        self.metrics = Metrics()
         self._entity_registry: er = registry
-        self._subscription_state = None
-        self._ha_version: AwesomeVersion | None = None
+        self._unsubscribe: Callable[[], Awaitable[None]] | None = None
+        self._recorder: MessageRecorder | None = None
+        self._capture_flush: asyncio.Task | None = None
+        self._unsub_capture_timer: Callable[[], None] | None = None
+        self._unsub_capture_stop: Callable[[], None] | None = None
+        self._add_entities: dict[Platform, Callable] = {}
+        self._unadded: dict[Platform, list[Entity]] = {}
+        self._restoring: set[str] = set()
+        self._device_ids: dict[str, str] | None = None
+        self._unsub_device_registry: Callable | None = None
+        self._applied_config: dict = self._current_config()
+        self._name: str = self.get_option("name", DEFAULT_NAME)
+        self._resolve_options()
+
+    def _current_config(self) -> dict:
+        """Return configuration of the entry with options overriding data."""
+        return {**self._config_entry.data, **self._config_entry.options}
+
+    async def async_apply_options(self) -> bool:
+        """Apply changed options of the entry without reloading it.
+
+        Only pieces affected by changed options are rebuilt: sensors keep their state,
+        and subscription is replaced only when topic or QoS is changed, so no
+        messages are lost.
+
+        :returns: False if changed options require reloading the entry
+        """
+        config = self._current_config()
+        changed = {
+            key
+            for key in config.keys() | self._applied_config.keys()
+            if config.get(key) != self._applied_config.get(key)
+        }
+        if changed & RELOAD_OPTIONS:
+            return False
+        self._applied_config = config
+        if not changed:
+            return True
+        _LOGGER.debug("Applying changed options: %s", sorted(changed))
+
+        clear_caches(self, "get_from_config")
+        self.__dict__.pop("tracked_attributes", None)
+        self.__dict__.pop("trace_sampler", None)
+        self._resolve_options()
+
+        if changed & {CONF_QUEUE_POLICY, CONF_QUEUE_SIZE}:
+            for queue in self._queues.values():
+                if self.queue_policy == QUEUE_POLICY_OFF:
+                    # messages are processed in MQTT callback from now on: queued
+                    # ones go first, before anything is awaited, to keep order
+                    queue.flush()
+                queue.policy = self.queue_policy
+                queue.maxsize = self.queue_size
+
+        if "name" in changed:
+            self._rename(self.get_option("name", DEFAULT_NAME))
+
+        if changed & {"topic_template", "qos"}:
+            for attribute in (
+                "configured_topic",
+                "topic_router",
+                "topic_template",
+                "device_position_in_topic",
+            ):
+                self.__dict__.pop(attribute, None)
+            if self._unsubscribe is not None:
+                await self.subscribe_root_topic()
+
+        if CONF_CAPTURE_FILE in changed:
+            await self._async_stop_capture()
+            self._start_capture()
+
+        if changed & {CONF_ALARMS, CONF_ALARM_TOPIC, "qos"}:
+            self.async_update_alarms()
+
+        return True
+
+    def _rename(self, name: str) -> None:
+        """Change name of the instance and unique ids of its sensors and devices.
+
+        Entity ids are kept, so automations referring to sensors keep working.
+        """
+        old_name, self._name = self._name, name
+        clear_caches(self, "create_entity_id", "device_name_from_entity_id")
+        device_registry = dr.async_get(self.hass)
+        for device_name in self.__sensors:
+            old_id = f"{old_name}_{device_name}"
+            new_id = self.create_entity_id(device_name)
+            for platform, suffix in DEVICE_ENTITIES:
+                entity_id = self._entity_registry.async_get_entity_id(
+                    platform, DOMAIN, old_id + suffix
+                )
+                if entity_id is not None:
+                    self._entity_registry.async_update_entity(
+                        entity_id, new_unique_id=new_id + suffix
+                    )
+            device = device_registry.async_get_device(
+                identifiers={(DOMAIN, old_id)}, connections=set()
+            )
+            if device is not None:
+                device_registry.async_update_device(
+                    device.id, name=new_id, new_identifiers={(DOMAIN, new_id)}
+                )
+                if self._device_ids is not None:
+                    self._device_ids.pop(old_id, None)
+                    self._device_ids[new_id] = device.id
+
+    @callback
+    def async_get_device_id(self, unique_id: str) -> str | None:
+        """Get id of the device of sensor.
+
+        Devices of the config entry are indexed in a single pass over device registry
+        on first call, devices created later are looked up individually and added.
 
+        :param unique_id: unique id of sensor, used as device identifier
+        :returns: device id or None if there is no such device
+        """
+        device_registry = dr.async_get(self.hass)
+        if self._device_ids is None:
+            self._unsub_device_registry = self.hass.bus.async_listen(
+                dr.EVENT_DEVICE_REGISTRY_UPDATED, self._async_device_registry_updated
+            )
+            self._device_ids = {
+                identifier[1]: device.id
+                for device in dr.async_entries_for_config_entry(
+                    device_registry, self._config_entry.entry_id
+                )
+                for identifier in device.identifiers
+                if identifier[0] == DOMAIN
+            }
         try:
-            self._name: str = self.get_from_config("name")
+            return self._device_ids[unique_id]
         except KeyError:
-            self._name = "SleepAsAndroid"
+            pass
 
-        # ToDo prepare topic_template and other variables that should be defined one time.
+        device = device_registry.async_get_device(
+            identifiers={(DOMAIN, unique_id)}, connections=set()
+        )
+        if device is None:
+            return None
+        self._device_ids[unique_id] = device.id
+        return device.id
+
+    @callback
+    def _async_device_registry_updated(self, event: Event) -> None:
+        """Forget removed devices, so recreated ones are looked up again."""
+        if event.data.get("action") != "remove" or not self._device_ids:
+            return
+        device_id = event.data.get("device_id")
+        self._device_ids = {
+            unique_id: known_id
+            for unique_id, known_id in self._device_ids.items()
+            if known_id != device_id
+        }
 
     async def unsubscribe(self):
         """Unsubscribe from topics."""
-        _LOGGER.debug(f"subscription state is {self._subscription_state}")
-        if self._subscription_state is not None:
+        if self._unsubscribe is not None:
             _LOGGER.debug("Unsubscribing")
-            if self._ha_version is None:
-                await self._get_version()
-            if self._ha_version >= AwesomeVersion("2022.3.0"):
-                self._subscription_state = subscription.async_unsubscribe_topics(
-                    hass=self.hass,
-                    sub_state=self._subscription_state,
-                )
-            else:
-                self._subscription_state = await subscription.async_unsubscribe_topics(
-                    hass=self.hass,
-                    sub_state=self._subscription_state,
-                )
-
-    @cached_property
-    def device_position_in_topic(self) -> int:
-        """Position of DEVICE_MACRO in configured MQTT topic."""
-        result: int = 0
+            await self._unsubscribe()
+            self._unsubscribe = None
+        for queue in self._queues.values():
+            queue.stop()
+        self._queues.clear()
+        if self._unsub_device_registry is not None:
+            self._unsub_device_registry()
+            self._unsub_device_registry = None
+            self._device_ids = None
+        await self._async_stop_capture()
+
+    def _start_capture(self) -> None:
+        """Start recording raw MQTT messages if capture file is configured."""
+        path = self.get_option(CONF_CAPTURE_FILE, DEFAULT_CAPTURE_FILE)
+        if path and self._recorder is None:
+            self._recorder = MessageRecorder(
+                self.hass.config.path(path), CAPTURE_FLUSH_SIZE
+            )
+            # messages of quiet periods must not stay in memory until unload
+            self._unsub_capture_timer = async_track_time_interval(
+                self.hass,
+                self._async_capture_interval,
+                timedelta(seconds=CAPTURE_FLUSH_INTERVAL),
+            )
+            self._unsub_capture_stop = self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_STOP, self._async_capture_on_stop
+            )
+            _LOGGER.info("Recording MQTT messages to %s", self._recorder.path)
+
+    @callback
+    def _async_schedule_capture_flush(self) -> None:
+        """Write recorded messages unless they are being written already."""
+        if self._capture_flush is None:
+            self._capture_flush = self.hass.async_create_task(
+                self._async_flush_capture()
+            )
 
-        for p in self.configured_topic.split("/"):
-            if p == DEVICE_MACRO:
-                break
-            else:
-                result += 1
+    @callback
+    def _async_capture_interval(self, _now: datetime) -> None:
+        """Write messages recorded since last flush."""
+        if self._recorder is not None and self._recorder.buffered:
+            self._async_schedule_capture_flush()
 
-        return result
+    async def _async_capture_on_stop(self, _event: Event) -> None:
+        """Write remaining recorded messages when Home Assistant stops."""
+        # listener is removed after it was called
+        self._unsub_capture_stop = None
+        await self._async_stop_capture()
 
-    @staticmethod
-    def device_name_from_topic_and_position(topic: str, position: int) -> str:
-        """Get device name from full topic.
+    async def _async_flush_capture(self) -> None:
+        """Write recorded messages to capture file in executor."""
+        try:
+            while data := self._recorder.take():
+                await self.hass.async_add_executor_job(self._recorder.write, data)
+        finally:
+            self._capture_flush = None
+
+    async def _async_stop_capture(self) -> None:
+        """Write remaining recorded messages and stop recording."""
+        if self._recorder is None:
+            return
+        if self._unsub_capture_timer is not None:
+            self._unsub_capture_timer()
+            self._unsub_capture_timer = None
+        if self._unsub_capture_stop is not None:
+            self._unsub_capture_stop()
+            self._unsub_capture_stop = None
+        if self._capture_flush is not None:
+            await self._capture_flush
+        await self._async_flush_capture()
+        _LOGGER.info(
+            "Recorded %d MQTT messages to %s",
+            self._recorder.recorded,
+            self._recorder.path,
+        )
+        self._recorder = None
 
-        :param topic: full topic from MQTT message
-        :param position: position of device template
-        :returns: device name
-        """
-        s = topic.split("/")
-        if position >= len(s):
-            # If we have no DEVICE_MACRO in configured_topic,
-            # then device_position_in_topic is greater than topic length and we should use
-            # last segment of topic as device name
-            position = len(s) - 1
+    @cached_property
+    def topic_router(self) -> TopicRouter:
+        """Router compiled from configured MQTT topic."""
+        return TopicRouter(self.configured_topic)
 
-        return s[position]
+    @cached_property
+    def device_position_in_topic(self) -> int:
+        """Position of DEVICE_MACRO in configured MQTT topic."""
+        return self.topic_router.device_position
 
-    @cache
-    def device_name_from_topic(self, topic: str) -> str:
+    def device_name_from_topic(self, topic: str) -> str | None:
         """Get device name from topic.
 
         :param topic: topic string from MQTT message
-        :returns: device name
+        :returns: device name or None if topic does not match configured topic
         """
-        return self.device_name_from_topic_and_position(
-            topic, self.device_position_in_topic
-        )
+        return self.topic_router.device_name(topic)
 
     @cached_property
     def topic_template(self) -> str:
         """Convert topic with {device} to MQTT topic for subscribing."""
-        splitted_topic = self.configured_topic.split("/")
-        try:
-            splitted_topic[self.device_position_in_topic] = "+"
-        except IndexError:
-            # If we have no DEVICE_MACRO in configured_topic,
-            # then device_position_in_topic is greater than topic length
-            pass
-        return "/".join(splitted_topic)
+        return self.topic_router.subscription_topic
 
-    @cache
+    @lru_cache_method()
     def get_from_config(self, name: str) -> str:
         """Get current configuration."""
         try:
@@ -160,6 +408,75 @@ class SleepAsAndroidInstance:
 
         return data
 
+    def get_option(self, name: str, default):
+        """Get current configuration or default value if it is not configured."""
+        try:
+            return self.get_from_config(name)
+        except KeyError:
+            return default
+
+    def _resolve_options(self) -> None:
+        """Resolve options used for every message once, with their defaults.
+
+        Entries created before an option existed do not have it: looking it up
+        per message would fail and fall back to default every time.
+        """
+        # seconds for batching state writes of sensors, 0 disables batching
+        self.coalesce_window: float = float(
+            self.get_option(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW)
+        )
+        # which events sensors fire: per-device, domain event for triggers or both
+        self.event_mode: str = self.get_option(CONF_EVENT_MODE, DEFAULT_EVENT_MODE)
+        # policy of per-device message queues, off for processing in MQTT callback
+        self.queue_policy: str = self.get_option(
+            CONF_QUEUE_POLICY, DEFAULT_QUEUE_POLICY
+        )
+        # maximum number of queued messages per device
+        self.queue_size: int = int(self.get_option(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE))
+
+    @cached_property
+    def trace_sampler(self) -> TraceSampler:
+        """Sampler of messages for trace logging."""
+        return TraceSampler(
+            int(self.get_option(CONF_TRACE_SAMPLE_RATE, DEFAULT_TRACE_SAMPLE_RATE))
+        )
+
+    def get_queue(self, device_name: str, sensor: SleepAsAndroidSensor) -> DeviceQueue:
+        """Get message queue of device, create it if needed."""
+        try:
+            return self._queues[device_name]
+        except KeyError:
+            queue = self._queues[device_name] = DeviceQueue(
+                device_name,
+                sensor.process_message,
+                self.hass.async_create_task,
+                self.queue_policy,
+                self.queue_size,
+            )
+            return queue
+
+    @property
+    def sensors(self) -> dict[str, SleepAsAndroidSensor]:
+        """Sensors by device name."""
+        return self.__sensors
+
+    @property
+    def diagnostic_sensors(self) -> bool:
+        """Are diagnostic sensors enabled."""
+        return self.get_option(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS)
+
+    def queue_stats(self) -> dict[str, dict[str, int]]:
+        """Statistics of message queues by device name."""
+        return {name: queue.stats() for name, queue in self._queues.items()}
+
+    @cached_property
+    def tracked_attributes(self) -> tuple[str, ...]:
+        """Sensor attributes that cause state write when changed."""
+        volatile = self.get_option(
+            CONF_VOLATILE_ATTRIBUTES, DEFAULT_VOLATILE_ATTRIBUTES
+        )
+        return tuple(a for a in SENSOR_ATTRIBUTES if a not in volatile)
+
     @property
     def name(self) -> str:
         """Name of the integration in Home Assistant."""
@@ -181,7 +498,7 @@ class SleepAsAndroidInstance:
 
         return _topic
 
-    @cache
+    @lru_cache_method()
     def create_entity_id(self, device_name: str) -> str:
         """Generate entity_id based on instance name and device name.
 
@@ -191,102 +508,172 @@ class SleepAsAndroidInstance:
         :returns: id that may be used for searching sensor by entity_id in entity_registry
         """
         _LOGGER.debug(
-            f"create_entity_id: my name is {self.name}, device name is {device_name}"
+            "create_entity_id: my name is %s, device name is %s", self.name, device_name
         )
         return self.name + "_" + device_name
 
-    @cache
+    @lru_cache_method()
     def device_name_from_entity_id(self, entity_id: str) -> str:
         """Extract device name from entity_id.
 
         :param entity_id: entity id that was generated by self.create_entity_id
         :returns: pure device name
         """
-        _LOGGER.debug(f"device_name_from_entity_id: entity_id='{entity_id}'")
+        _LOGGER.debug("device_name_from_entity_id: entity_id='%s'", entity_id)
         return entity_id.replace(self.name + "_", "", 1)
 
+    def invalidate_caches(self) -> None:
+        """Drop cached topics, names and configuration values."""
+        clear_caches(self)
+        if "topic_router" in self.__dict__:
+            self.topic_router.clear()
+
+    def cache_info(self) -> dict[str, dict[str, int]]:
+        """Statistics of instance caches."""
+        info = caches_info(self)
+        if "topic_router" in self.__dict__:
+            info["topic_router"] = {"size": len(self.topic_router)}
+        return info
+
     @property
     def entity_registry(self) -> er:
         """Return the entity registry."""
         return self._entity_registry
 
-    async def subscribe_root_topic(self, async_add_entities: Callable):
-        """(Re)Subscribe to topics."""
+    async def subscribe_root_topic(self, async_add_entities: Callable | None = None):
+        """(Re)Subscribe to topics.
+
+        :param async_add_entities: callback for adding new sensors, if sensor platform
+            is already set up
+        """
         _LOGGER.debug(
             "Subscribing to '%s' (generated from '%s')",
             self.topic_template,
             self.configured_topic,
         )
-        self._subscription_state = None
+        if async_add_entities is not None:
+            self.async_set_add_entities(async_add_entities)
+        self._start_capture()
 
         @callback
         def message_received(msg):
             """Handle new MQTT messages."""
 
-            _LOGGER.debug("Got message %s", msg)
+            received = perf_counter_ns()
+            metrics = self.metrics
+            metrics.messages += 1
+            debug = _LOGGER.isEnabledFor(logging.DEBUG)
+            if debug:
+                _LOGGER.debug("Got message %s", msg)
+            if self._recorder is not None and self._recorder.record(
+                msg.topic, msg.payload
+            ):
+                self._async_schedule_capture_flush()
             device_name = self.device_name_from_topic(msg.topic)
-            entity_id = self.create_entity_id(device_name)
-            _LOGGER.debug(f"sensor entity_id is {entity_id}")
+            metrics.record(STAGE_TOPIC, perf_counter_ns() - received)
+            if device_name is None:
+                metrics.ignored_topics += 1
+                if debug:
+                    _LOGGER.debug(
+                        "Topic %s does not match %s", msg.topic, self.configured_topic
+                    )
+                return
+            if debug:
+                _LOGGER.debug(
+                    "sensor entity_id is %s", self.create_entity_id(device_name)
+                )
 
             (target_sensor, is_new) = self.get_sensor(device_name)
             if is_new:
-                async_add_entities([target_sensor], True)
-            try:
+                self._async_add_sensor(target_sensor)
+            # new sensor buffers message until it is added to Home Assistant
+            if self.queue_policy == QUEUE_POLICY_OFF:
                 target_sensor.process_message(msg)
-            except NoEntitySpecifiedError:
-                # ToDo:  async_write_ha_state() runs before async_add_entities, so entity have no entity_id yet
-                pass
-
-        async def subscribe_2022_03(
-            _hass: HomeAssistant, _state, _topic: dict
-        ) -> dict[str, EntitySubscription]:
-
-            result = subscription.async_prepare_subscribe_topics(
-                hass=_hass,
-                new_state=_state,
-                topics=_topic,
-            )
-            if result is not None:
-                await subscription.async_subscribe_topics(
-                    hass=self.hass,
-                    sub_state=result,
+            else:
+                self.get_queue(device_name, target_sensor).put(msg)
+            elapsed = perf_counter_ns() - received
+            metrics.record(STAGE_RECEIVE, elapsed)
+            if (trace_sampler := self.trace_sampler) and trace_sampler.sample():
+                _TRACE_LOGGER.info(
+                    "%s: %s %s processed in %d us",
+                    self.name,
+                    msg.topic,
+                    msg.payload,
+                    elapsed // 1000,
                 )
-            return result
 
-        async def subscribe_2021_07(
-            _hass: HomeAssistant, _state, _topic: dict
-        ) -> dict[str, EntitySubscription]:
-            return await subscription.async_subscribe_topics(
-                hass=_hass, new_state=_state, topics=_topic
-            )
+        old_unsubscribe = self._unsubscribe
+        # entries with the same or overlapping topics share one broker subscription
+        self._unsubscribe = await async_get_subscription_manager(
+            self.hass
+        ).async_subscribe(
+            self.topic_template, self.get_option("qos", DEFAULT_QOS), message_received
+        )
+        if old_unsubscribe is not None:
+            # old subscription is dropped after the new one is ready: no gap
+            await old_unsubscribe()
+        self.metrics.mark(STARTUP_SUBSCRIBED)
+        _LOGGER.debug("Subscribing to root topic is done!")
+
+    @callback
+    def async_update_alarms(self) -> None:
+        """Schedule alarms of the entry, replacing previously scheduled ones."""
+        async_get_alarm_scheduler(self.hass).async_set_alarms(
+            self._config_entry.entry_id,
+            self.get_option(CONF_ALARMS, []),
+            self.get_option(CONF_ALARM_TOPIC, DEFAULT_ALARM_TOPIC),
+            self.get_option("qos", DEFAULT_QOS),
+        )
 
-        topic = {
-            "state_topic": {
-                "topic": self.topic_template,
-                "msg_callback": message_received,
-                "qos": self._config_entry.data["qos"],
-            }
-        }
+    @callback
+    def async_set_add_entities(
+        self, async_add_entities: Callable, platform: Platform = Platform.SENSOR
+    ) -> None:
+        """Add entities of platform with its callback from now on.
 
-        if self._ha_version is None:
-            await self._get_version()
-        if self._ha_version >= AwesomeVersion("2022.3.0"):
-            self._subscription_state = await subscribe_2022_03(
-                self.hass,
-                self._subscription_state,
-                topic,
-            )
-        else:
-            self._subscription_state = await subscribe_2021_07(
-                self.hass,
-                self._subscription_state,
-                topic,
-            )
+        Entities created before platform was set up are added in one batch.
+        """
+        self._add_entities[platform] = async_add_entities
+        if unadded := self._unadded.pop(platform, None):
+            async_add_entities(unadded)
 
-        if self._subscription_state is not None:
-            _LOGGER.debug("Subscribing to root topic is done!")
-        else:
-            _LOGGER.critical(f"Could not subscribe to topic {self.topic_template}")
+    @callback
+    def _async_add_sensor(self, sensor: SleepAsAndroidSensor) -> None:
+        """Add new sensor with entities derived from it to Home Assistant.
+
+        Entities are kept until their platform is set up.
+        """
+        entities: dict[Platform, list[Entity]] = {
+            Platform.SENSOR: [sensor, SleepAsAndroidSessionSensor(sensor)],
+            Platform.BINARY_SENSOR: [
+                SleepAsAndroidBinarySensor(sensor, key) for key in BINARY_SENSORS
+            ],
+        }
+        for platform, platform_entities in entities.items():
+            async_add_entities = self._add_entities.get(platform)
+            if async_add_entities is None:
+                self._unadded.setdefault(platform, []).extend(platform_entities)
+            else:
+                async_add_entities(platform_entities, True)
+
+    @callback
+    def async_restore_sensors(self, names: list[str]) -> None:
+        """Create sensors for devices known from entity registry."""
+        for name in names:
+            (sensor, is_new) = self.get_sensor(name)
+            if is_new:
+                self._restoring.add(name)
+                self._async_add_sensor(sensor)
+        self.metrics.mark(STARTUP_REGISTRY_SCANNED)
+        if not self._restoring:
+            self.metrics.mark(STARTUP_SENSORS_RESTORED)
+
+    @callback
+    def async_sensor_restored(self, name: str) -> None:
+        """Track sensors restored from entity registry with their last states."""
+        self._restoring.discard(name)
+        if not self._restoring and STARTUP_REGISTRY_SCANNED in self.metrics.startup:
+            self.metrics.mark(STARTUP_SENSORS_RESTORED)
 
     def get_sensor(self, sensor_name: str) -> (SleepAsAndroidSensor, bool):
         """Get sensor by it's name.
@@ -306,9 +693,3 @@ class SleepAsAndroidInstance:
             )
             self.__sensors[sensor_name] = new_sensor
             return new_sensor, True
-
-    async def _get_version(self) -> None:
-        ha_version = HaVersion()
-        await ha_version.get_version()
-        ha_version_cleaned = re.sub(r"[ab][0-9]+$", "", ha_version.version)
-        self._ha_version = AwesomeVersion(ha_version_cleaned)
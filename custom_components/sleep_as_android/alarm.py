@@ -0,0 +1,320 @@
+"""Alarms configured in options flow."""
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, time, timedelta, tzinfo
+import heapq
+from itertools import count
+import json
+import logging
+from typing import Any, Callable, Iterable
+
+from homeassistant.components import mqtt
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+import homeassistant.util.dt as dt_util
+
+from .const import (
+    ALARM_EVENT,
+    CONF_ALARM_DATE,
+    CONF_ALARM_LABEL,
+    CONF_ALARM_REPEAT,
+    CONF_ALARM_TIME,
+    DATA_ALARM_SCHEDULER,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+"""Weekday names used by options flow, in order of date.weekday()."""
+
+
+class Alarm:
+    """Alarm at local time, once at date or on weekdays starting from date."""
+
+    __slots__ = (
+        "owner",
+        "label",
+        "time",
+        "date",
+        "weekdays",
+        "tz",
+        "cancelled",
+        "scheduled",
+    )
+
+    def __init__(
+        self,
+        owner: str,
+        label: str,
+        at: time,
+        start: date,
+        weekdays: Iterable[int] = (),
+        tz: tzinfo | None = None,
+    ) -> None:
+        """Initialize alarm.
+
+        :param owner: id of config entry with the alarm
+        :param label: alarm label
+        :param at: local time of alarm
+        :param start: date of alarm or of its first repetition
+        :param weekdays: weekdays of repetitions, 0 is Monday; empty for one-time alarm
+        :param tz: time zone of alarm, defaults to time zone of Home Assistant
+        """
+        self.owner = owner
+        self.label = label
+        self.time = at
+        self.date = start
+        self.weekdays = frozenset(weekdays)
+        self.tz = tz or dt_util.DEFAULT_TIME_ZONE
+        self.cancelled = False
+        self.scheduled = False
+
+    @classmethod
+    def from_config(
+        cls, owner: str, config: dict[str, Any], tz: tzinfo | None = None
+    ) -> Alarm:
+        """Create alarm from options flow data.
+
+        Values are objects right after options flow and strings after restart.
+
+        :raises ValueError: if time, date or repeat days are invalid
+        """
+        at = config[CONF_ALARM_TIME]
+        if isinstance(at, str):
+            at = time.fromisoformat(at)
+        start = config[CONF_ALARM_DATE]
+        if isinstance(start, str):
+            start = date.fromisoformat(start)
+        return cls(
+            owner,
+            config.get(CONF_ALARM_LABEL, ""),
+            at,
+            start,
+            (WEEKDAYS.index(day) for day in config.get(CONF_ALARM_REPEAT, [])),
+            tz,
+        )
+
+    def next_after(self, moment: datetime) -> datetime | None:
+        """First time of alarm later than moment.
+
+        Repeating alarms check at most a week of days from the later of start date
+        and moment, so computing the next repetition after firing is cheap.
+
+        :param moment: timezone aware time
+        :returns: timezone aware time or None if alarm will not fire anymore
+        """
+        if not self.weekdays:
+            at = datetime.combine(self.date, self.time, tzinfo=self.tz)
+            return at if at > moment else None
+
+        day = max(self.date, moment.astimezone(self.tz).date())
+        for _ in range(8):
+            if day.weekday() in self.weekdays:
+                at = datetime.combine(day, self.time, tzinfo=self.tz)
+                if at > moment:
+                    return at
+            day += timedelta(days=1)
+        return None
+
+    def __repr__(self) -> str:
+        """Return representation of alarm."""
+        return (
+            f"Alarm(owner={self.owner!r}, label={self.label!r}, time={self.time}, "
+            f"date={self.date}, weekdays={sorted(self.weekdays)})"
+        )
+
+
+class AlarmSchedule:
+    """Alarms of all config entries in a heap ordered by next fire time.
+
+    Replaced alarms are only marked as cancelled and skipped when they reach the
+    top; the heap is rebuilt when cancelled entries make up most of it.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty schedule."""
+        self._heap: list[tuple[datetime, int, Alarm]] = []
+        self._ids = count()
+        self._alarms: dict[str, list[Alarm]] = {}
+        self._cancelled = 0
+
+    def set_alarms(self, owner: str, alarms: Iterable[Alarm], now: datetime) -> None:
+        """Replace alarms of owner.
+
+        :param owner: id of config entry
+        :param alarms: new alarms of owner
+        :param now: current time, alarms are scheduled after it
+        """
+        for alarm in self._alarms.pop(owner, []):
+            alarm.cancelled = True
+            if alarm.scheduled:
+                self._cancelled += 1
+
+        alarms = list(alarms)
+        if alarms:
+            self._alarms[owner] = alarms
+        for alarm in alarms:
+            self._push(alarm, now)
+
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _push(self, alarm: Alarm, after: datetime) -> None:
+        at = alarm.next_after(after)
+        alarm.scheduled = at is not None
+        if at is not None:
+            heapq.heappush(self._heap, (at, next(self._ids), alarm))
+
+    def _drop_cancelled(self) -> None:
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+
+    @property
+    def next_time(self) -> datetime | None:
+        """Time of the earliest alarm."""
+        self._drop_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list[tuple[Alarm, datetime]]:
+        """Take alarms that are due and schedule their next repetitions.
+
+        :param now: current time
+        :returns: due alarms with their scheduled times, earliest first
+        """
+        due = []
+        heap = self._heap
+        while True:
+            self._drop_cancelled()
+            if not heap or heap[0][0] > now:
+                return due
+            at, _, alarm = heapq.heappop(heap)
+            due.append((alarm, at))
+            # repetitions missed while timer was late are skipped, not fired in a row
+            self._push(alarm, now)
+
+    def __len__(self) -> int:
+        """Return number of scheduled alarms."""
+        return len(self._heap) - self._cancelled
+
+
+class AlarmScheduler:
+    """Fire alarms of all config entries with a single timer.
+
+    Due alarms fire ALARM_EVENT and, if entry has alarm topic, are published to MQTT.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        clock: Callable[[], datetime] = dt_util.utcnow,
+    ) -> None:
+        """Initialize scheduler.
+
+        :param clock: current time, replaced in tests
+        """
+        self.hass = hass
+        self._clock = clock
+        self.schedule = AlarmSchedule()
+        self._topics: dict[str, tuple[str, int]] = {}
+        self._armed_at: datetime | None = None
+        self._unsub_timer: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_set_alarms(
+        self,
+        entry_id: str,
+        alarms: Iterable[dict[str, Any]],
+        topic: str = "",
+        qos: int = 0,
+    ) -> None:
+        """Replace alarms of config entry.
+
+        :param entry_id: id of config entry
+        :param alarms: alarms from options flow
+        :param topic: MQTT topic for publishing due alarms, empty to disable
+        :param qos: quality of service for publishing
+        """
+        parsed = []
+        for config in alarms:
+            try:
+                parsed.append(Alarm.from_config(entry_id, config))
+            except (KeyError, ValueError, TypeError) as err:
+                _LOGGER.warning("Ignoring invalid alarm %s: %s", config, err)
+
+        if topic and parsed:
+            self._topics[entry_id] = (topic, qos)
+        else:
+            self._topics.pop(entry_id, None)
+        self.schedule.set_alarms(entry_id, parsed, self._clock())
+        self._async_arm()
+
+    @callback
+    def _async_arm(self) -> None:
+        """Arm timer for the earliest alarm, if it is not armed for it already."""
+        next_time = self.schedule.next_time
+        if next_time == self._armed_at:
+            return
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._armed_at = next_time
+        if next_time is not None:
+            self._unsub_timer = async_track_point_in_utc_time(
+                self.hass, self._async_timer_fired, next_time
+            )
+
+    @callback
+    def _async_timer_fired(self, _now: datetime) -> None:
+        """Fire due alarms and arm timer for the next one."""
+        self._unsub_timer = None
+        self._armed_at = None
+        for alarm, at in self.schedule.pop_due(self._clock()):
+            self._async_fire(alarm, at)
+        self._async_arm()
+
+    @callback
+    def _async_fire(self, alarm: Alarm, at: datetime) -> None:
+        data = {
+            "entry_id": alarm.owner,
+            "label": alarm.label,
+            "time": at.isoformat(),
+        }
+        _LOGGER.debug("Alarm is due: %s", data)
+        self.hass.bus.async_fire(ALARM_EVENT, data)
+        if (target := self._topics.get(alarm.owner)) is not None:
+            topic, qos = target
+            result = mqtt.async_publish(self.hass, topic, json.dumps(data), qos)
+            # async_publish is a coroutine since Home Assistant 2022.3
+            if asyncio.iscoroutine(result):
+                self.hass.async_create_task(result)
+
+    @callback
+    def async_stop(self) -> None:
+        """Cancel timer."""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._armed_at = None
+
+
+@callback
+def async_get_alarm_scheduler(hass: HomeAssistant) -> AlarmScheduler:
+    """Get alarm scheduler of the integration."""
+    try:
+        return hass.data[DATA_ALARM_SCHEDULER]
+    except KeyError:
+        scheduler = hass.data[DATA_ALARM_SCHEDULER] = AlarmScheduler(hass)
+        return scheduler
@@ -0,0 +1,99 @@
+"""Binary sensors derived from Sleep As Android events."""
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import STATE_OFF, STATE_ON, Platform
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.restore_state import RestoreEntity
+
+from .const import DOMAIN
+
+if TYPE_CHECKING:
+    from . import SleepAsAndroidInstance
+    from .sensor import SleepAsAndroidSensor
+
+_LOGGER = logging.getLogger(__name__)
+
+BINARY_SENSORS: dict[str, tuple[str, str, BinarySensorDeviceClass | None]] = {
+    "tracking": ("sleep tracking", "mdi:sleep", BinarySensorDeviceClass.RUNNING),
+    "sleeping": ("sleeping", "mdi:power-sleep", None),
+    "alarm_ringing": ("alarm ringing", "mdi:alarm", BinarySensorDeviceClass.SOUND),
+    "smart_period": ("smart period", "mdi:alarm-snooze", None),
+    "lullaby": ("lullaby", "mdi:music", BinarySensorDeviceClass.SOUND),
+}
+"""Binary sensors: key of derived state -> (name suffix, icon, device class)."""
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities
+):
+    """Set up the binary sensor entry.
+
+    Binary sensors are created by the instance together with sensors of devices.
+    """
+    instance: SleepAsAndroidInstance = hass.data[DOMAIN][config_entry.entry_id]
+    instance.async_set_add_entities(async_add_entities, Platform.BINARY_SENSOR)
+    return True
+
+
+class SleepAsAndroidBinarySensor(BinarySensorEntity, RestoreEntity):
+    """Derived state of a device, e.g. "sleeping" or "alarm ringing".
+
+    State machines of the device sensor compute the state; the entity is written
+    only when the state changes.
+    """
+
+    _attr_should_poll = False
+
+    def __init__(self, sensor: SleepAsAndroidSensor, key: str):
+        """Initialize entry.
+
+        :param sensor: sensor of device that receives events
+        :param key: key of derived state
+        """
+        self._sensor = sensor
+        self._key = key
+        self._values = sensor.derived.values
+        suffix, self._attr_icon, self._attr_device_class = BINARY_SENSORS[key]
+        self._suffix = suffix
+
+    async def async_added_to_hass(self):
+        """Restore state and start following events of the device."""
+        await super().async_added_to_hass()
+        if (
+            self._values[self._key] is None
+            and (old_state := await self.async_get_last_state()) is not None
+            and old_state.state in (STATE_ON, STATE_OFF)
+        ):
+            self._values[self._key] = old_state.state == STATE_ON
+        self.async_on_remove(
+            self._sensor.async_add_listener(self._key, self.async_write_ha_state)
+        )
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._sensor.name} {self._suffix}"
+
+    @property
+    def unique_id(self) -> str:
+        """Return a unique ID."""
+        return f"{self._sensor.unique_id}_{self._key}"
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return device info of the sensor the state is derived from."""
+        return self._sensor.device_info
+
+    @property
+    def is_on(self) -> bool | None:
+        """Return derived state, None until the first event that sets it."""
+        return self._values[self._key]
@@ -0,0 +1,136 @@
+"""Bounded per-instance caches."""
+from __future__ import annotations
+
+from collections import OrderedDict
+from types import MethodType
+from typing import Any, Callable, Hashable
+
+from .const import INSTANCE_CACHE_SIZE
+
+_CACHES_ATTRIBUTE = "_lru_caches"
+_MISSING = object()
+
+
+class LRUCache:
+    """Least recently used cache with a size cap and hit/miss counters."""
+
+    __slots__ = ("maxsize", "hits", "misses", "_data")
+
+    def __init__(self, maxsize: int = INSTANCE_CACHE_SIZE) -> None:
+        """Initialize cache.
+
+        :param maxsize: maximum number of kept values
+        """
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value and mark it as recently used."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store value, evicting the least recently used one if cache is full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all values and reset counters."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict[str, int]:
+        """Return cache statistics."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self) -> int:
+        """Return number of cached values."""
+        return len(self._data)
+
+
+class _LRUCachedMethod:
+    """Method descriptor keeping results in an LRUCache of the bound instance."""
+
+    def __init__(self, func: Callable, maxsize: int) -> None:
+        self.func = func
+        self.maxsize = maxsize
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self.__wrapped__ = func
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Any, owner: type | None = None):
+        if instance is None:
+            return self
+        return MethodType(self._call, instance)
+
+    def _call(self, instance: Any, *args: Hashable) -> Any:
+        caches: dict[str, LRUCache] = instance.__dict__.setdefault(
+            _CACHES_ATTRIBUTE, {}
+        )
+        try:
+            cache = caches[self.name]
+        except KeyError:
+            cache = caches[self.name] = LRUCache(self.maxsize)
+
+        value = cache.get(args, _MISSING)
+        if value is _MISSING:
+            value = self.func(instance, *args)
+            cache.put(args, value)
+        return value
+
+
+def lru_cache_method(maxsize: int = INSTANCE_CACHE_SIZE) -> Callable:
+    """Cache method results per instance.
+
+    Unlike functools.cache on a method, the cache is stored in the instance, so it does
+    not keep the instance alive and is bounded by maxsize.
+
+    :param maxsize: maximum number of results cached for each instance
+    """
+
+    def decorator(func: Callable) -> _LRUCachedMethod:
+        return _LRUCachedMethod(func, maxsize)
+
+    return decorator
+
+
+def clear_caches(instance: Any, *names: str) -> None:
+    """Drop method caches of instance.
+
+    :param names: names of methods, all caches are dropped if omitted
+    """
+    if not names:
+        for cache in instance.__dict__.pop(_CACHES_ATTRIBUTE, {}).values():
+            cache.clear()
+        return
+    caches = instance.__dict__.get(_CACHES_ATTRIBUTE, {})
+    for name in names:
+        if (cache := caches.pop(name, None)) is not None:
+            cache.clear()
+
+
+def caches_info(instance: Any) -> dict[str, dict[str, int]]:
+    """Return statistics for all method caches of instance."""
+    return {
+        name: cache.info()
+        for name, cache in instance.__dict__.get(_CACHES_ATTRIBUTE, {}).items()
+    }
@@ -0,0 +1,154 @@
+"""Recording and replaying of raw MQTT messages.
+
+Captured messages are stored in an append-only file: a header followed by records
+of receive time, topic and payload bytes.
+
+The module uses only the standard library, so mqtt_replay.py can load it without
+Home Assistant.
+"""
+from __future__ import annotations
+
+import asyncio
+import struct
+import time
+from typing import Any, Awaitable, Callable, Iterable, Iterator, NamedTuple
+
+MAGIC = b"SAAMQTT1"
+_RECORD = struct.Struct("<dHI")  # receive time, topic length, payload length
+
+
+class CapturedMessage(NamedTuple):
+    """Message read from capture file."""
+
+    time: float
+    topic: str
+    payload: bytes
+
+
+class ReplayedMessage(NamedTuple):
+    """Message passed to callback by replay, looks like MQTT message."""
+
+    topic: str
+    payload: Any
+    qos: int = 0
+    retain: bool = False
+
+
+class MessageRecorder:
+    """Buffer messages in memory and append them to capture file.
+
+    record is cheap and is called from the event loop; write does file IO and
+    should be called from executor.
+    """
+
+    def __init__(self, path: str, flush_size: int) -> None:
+        """Initialize recorder.
+
+        :param path: path of capture file
+        :param flush_size: buffer size in bytes that requires flushing
+        """
+        self.path = path
+        self.flush_size = flush_size
+        self.recorded: int = 0
+        self._buffer = bytearray()
+
+    def record(
+        self, topic: str, payload: str | bytes, received: float | None = None
+    ) -> bool:
+        """Add message to buffer.
+
+        :param topic: topic of message
+        :param payload: payload of message
+        :param received: receive time, defaults to current time
+        :returns: True if buffer should be flushed
+        """
+        topic_bytes = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._buffer += _RECORD.pack(
+            time.time() if received is None else received,
+            len(topic_bytes),
+            len(payload),
+        )
+        self._buffer += topic_bytes
+        self._buffer += payload
+        self.recorded += 1
+        return len(self._buffer) >= self.flush_size
+
+    @property
+    def buffered(self) -> int:
+        """Return size of buffered records in bytes."""
+        return len(self._buffer)
+
+    def take(self) -> bytes:
+        """Take buffered records, leaving buffer empty."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    def write(self, data: bytes) -> None:
+        """Append records to capture file."""
+        with open(self.path, "ab") as file:
+            if file.tell() == 0:
+                file.write(MAGIC)
+            file.write(data)
+
+    def flush(self) -> None:
+        """Write all buffered records to capture file."""
+        if data := self.take():
+            self.write(data)
+
+
+def read_messages(path: str) -> Iterator[CapturedMessage]:
+    """Read messages from capture file.
+
+    :param path: path of capture file
+    :raises ValueError: if file is not a capture file
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while header := file.read(_RECORD.size):
+            if len(header) < _RECORD.size:
+                # record was not fully written
+                return
+            received, topic_length, payload_length = _RECORD.unpack(header)
+            topic = file.read(topic_length)
+            payload = file.read(payload_length)
+            if len(payload) < payload_length:
+                return
+            yield CapturedMessage(received, topic.decode(), payload)
+
+
+async def replay(
+    messages: Iterable[CapturedMessage],
+    callback: Callable[[ReplayedMessage], Any],
+    speed: float | None = 1.0,
+    encoding: str | None = "utf-8",
+    sleep: Callable[[float], Awaitable] = asyncio.sleep,
+) -> int:
+    """Feed captured messages to callback.
+
+    :param messages: captured messages
+    :param callback: message callback, like message_received of the integration
+    :param speed: 1 for real time, N for N times faster, None for maximum speed
+    :param encoding: payload encoding, None passes payload bytes as is
+    :param sleep: coroutine used for waiting
+    :returns: number of replayed messages
+    """
+    count = 0
+    first: float | None = None
+    started = time.monotonic()
+    for message in messages:
+        if speed:
+            if first is None:
+                first = message.time
+            delay = (message.time - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await sleep(delay)
+        payload = message.payload
+        if encoding is not None:
+            payload = payload.decode(encoding, errors="replace")
+        callback(ReplayedMessage(message.topic, payload))
+        count += 1
+    return count
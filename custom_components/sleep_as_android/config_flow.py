@@ -11,7 +11,13 @@ import voluptuous as vol
 
 from .const import DEFAULT_NAME, DEFAULT_QOS, DEFAULT_TOPIC_TEMPLATE, DOMAIN, CONF_ALARMS, \
     DEFAULT_ALARM_LABEL, CONF_ALARM_TIME_FMT, CONF_ALARM_DATE_FMT, CONF_ALARM_LABEL, \
-    CONF_ALARM_TIME, CONF_ALARM_DATE, CONF_ALARM_REPEAT, CONF_ALARM_ADD_ANOTHER
+    CONF_ALARM_TIME, CONF_ALARM_DATE, CONF_ALARM_REPEAT, CONF_ALARM_ADD_ANOTHER, \
+    CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW, CONF_VOLATILE_ATTRIBUTES, \
+    DEFAULT_VOLATILE_ATTRIBUTES, SENSOR_ATTRIBUTES, CONF_CAPTURE_FILE, DEFAULT_CAPTURE_FILE, \
+    CONF_EVENT_MODE, DEFAULT_EVENT_MODE, EVENT_MODES, CONF_QUEUE_POLICY, DEFAULT_QUEUE_POLICY, \
+    QUEUE_POLICIES, CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE, CONF_DIAGNOSTIC_SENSORS, \
+    DEFAULT_DIAGNOSTIC_SENSORS, CONF_TRACE_SAMPLE_RATE, DEFAULT_TRACE_SAMPLE_RATE, \
+    CONF_ALARM_TOPIC, DEFAULT_ALARM_TOPIC
 
 
 def get_value(config_entry: config_entries | None, param: str, default=None):
@@ -66,6 +72,83 @@ def create_schema(
                 ): int,
             }
         )
+        if step == "init":
+            schema = schema.extend(
+                {
+                    vol.Optional(
+                        CONF_COALESCE_WINDOW,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_COALESCE_WINDOW,
+                            default=DEFAULT_COALESCE_WINDOW,
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Optional(
+                        CONF_VOLATILE_ATTRIBUTES,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_VOLATILE_ATTRIBUTES,
+                            default=DEFAULT_VOLATILE_ATTRIBUTES,
+                        ),
+                    ): cv.multi_select({a: a for a in SENSOR_ATTRIBUTES}),
+                    vol.Optional(
+                        CONF_CAPTURE_FILE,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_CAPTURE_FILE,
+                            default=DEFAULT_CAPTURE_FILE,
+                        ),
+                    ): cv.string,
+                    vol.Optional(
+                        CONF_EVENT_MODE,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_EVENT_MODE,
+                            default=DEFAULT_EVENT_MODE,
+                        ),
+                    ): vol.In(EVENT_MODES),
+                    vol.Optional(
+                        CONF_QUEUE_POLICY,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_QUEUE_POLICY,
+                            default=DEFAULT_QUEUE_POLICY,
+                        ),
+                    ): vol.In(QUEUE_POLICIES),
+                    vol.Optional(
+                        CONF_QUEUE_SIZE,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_QUEUE_SIZE,
+                            default=DEFAULT_QUEUE_SIZE,
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Optional(
+                        CONF_DIAGNOSTIC_SENSORS,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_DIAGNOSTIC_SENSORS,
+                            default=DEFAULT_DIAGNOSTIC_SENSORS,
+                        ),
+                    ): cv.boolean,
+                    vol.Optional(
+                        CONF_TRACE_SAMPLE_RATE,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_TRACE_SAMPLE_RATE,
+                            default=DEFAULT_TRACE_SAMPLE_RATE,
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                    vol.Optional(
+                        CONF_ALARM_TOPIC,
+                        default=get_value(
+                            config_entry=config_entry,
+                            param=CONF_ALARM_TOPIC,
+                            default=DEFAULT_ALARM_TOPIC,
+                        ),
+                    ): cv.string,
+                }
+            )
     else:
         schema = schema.extend(
             {
@@ -147,8 +230,9 @@ class SleepAsAndroidOptionsFlow(config_entries.OptionsFlow):
             try:
                 self.data[CONF_ALARMS].append({
                     "label": user_input.get(CONF_ALARM_LABEL, ""),
-                    "time": user_input[CONF_ALARM_TIME],
-                    "date": user_input[CONF_ALARM_DATE],
+                    # options are stored as JSON: keep ISO strings
+                    "time": str(user_input[CONF_ALARM_TIME]),
+                    "date": str(user_input[CONF_ALARM_DATE]),
                     "repeat": user_input.get(CONF_ALARM_REPEAT, []),
                 })
             except Exception as err:
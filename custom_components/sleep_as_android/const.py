@@ -2,11 +2,56 @@
 
 DOMAIN = "sleep_as_android"
 DEVICE_MACRO: str = "%%%device%%%"
+DEVICE_TRIGGER_EVENT = f"{DOMAIN}_event"
+DATA_TRIGGER_DISPATCHER = f"{DOMAIN}_trigger_dispatcher"
+DATA_SUBSCRIPTIONS = f"{DOMAIN}_subscriptions"
+DATA_ALARM_SCHEDULER = f"{DOMAIN}_alarm_scheduler"
+DATA_TRIGGER_CACHE = f"{DOMAIN}_trigger_cache"
+ALARM_EVENT = f"{DOMAIN}_alarm"
+
+ATTR_TIMESTAMP = "timestamp"
+ATTR_LABEL = "label"
+ATTR_VALUE3 = "value3"
+SENSOR_ATTRIBUTES = (ATTR_TIMESTAMP, ATTR_LABEL, ATTR_VALUE3)
+
+EVENT_MODE_DEVICE = "device"
+EVENT_MODE_DOMAIN = "domain"
+EVENT_MODE_BOTH = "both"
+EVENT_MODES = (EVENT_MODE_DEVICE, EVENT_MODE_DOMAIN, EVENT_MODE_BOTH)
+
+QUEUE_POLICY_OFF = "off"
+QUEUE_POLICY_DROP_OLDEST = "drop_oldest"
+QUEUE_POLICY_COALESCE = "coalesce"
+QUEUE_POLICY_BLOCK = "block"
+QUEUE_POLICIES = (
+    QUEUE_POLICY_OFF,
+    QUEUE_POLICY_DROP_OLDEST,
+    QUEUE_POLICY_COALESCE,
+    QUEUE_POLICY_BLOCK,
+)
 
 DEFAULT_NAME = "SleepAsAndroid"
 DEFAULT_TOPIC_TEMPLATE = "SleepAsAndroid/%s" % DEVICE_MACRO
 DEFAULT_QOS = 0
 DEFAULT_ALARM_LABEL = ""
+DEFAULT_COALESCE_WINDOW = 0
+DEFAULT_VOLATILE_ATTRIBUTES = [ATTR_TIMESTAMP]
+DEFAULT_CAPTURE_FILE = ""
+DEFAULT_EVENT_MODE = EVENT_MODE_BOTH
+DEFAULT_QUEUE_POLICY = QUEUE_POLICY_OFF
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_DIAGNOSTIC_SENSORS = False
+DEFAULT_TRACE_SAMPLE_RATE = 0
+DEFAULT_ALARM_TOPIC = ""
+
+CONF_COALESCE_WINDOW = "coalesce_window"
+CONF_VOLATILE_ATTRIBUTES = "volatile_attributes"
+CONF_CAPTURE_FILE = "capture_file"
+CONF_EVENT_MODE = "event_mode"
+CONF_QUEUE_POLICY = "queue_policy"
+CONF_QUEUE_SIZE = "queue_size"
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+CONF_TRACE_SAMPLE_RATE = "trace_sample_rate"
 
 CONF_ALARMS = "alarms"
 CONF_ALARM_TIME_FMT = "%H:%M"
@@ -16,3 +61,21 @@ CONF_ALARM_TIME = "time"
 CONF_ALARM_DATE = "date"
 CONF_ALARM_REPEAT = "repeat"
 CONF_ALARM_ADD_ANOTHER = "add_another"
+CONF_ALARM_TOPIC = "alarm_topic"
+
+TOPIC_ROUTER_CACHE_SIZE = 1024
+INSTANCE_CACHE_SIZE = 256
+PENDING_MESSAGES_LIMIT = 32
+DEDUPE_WINDOW = 64
+# seconds in which a non-retained message with a seen event is a redelivery
+DEDUPE_INTERVAL = 2
+CAPTURE_FLUSH_SIZE = 64 * 1024
+# seconds after which buffered messages are written to capture file
+CAPTURE_FLUSH_INTERVAL = 10
+QUEUE_BATCH_SIZE = 20
+LOG_RATE_LIMIT_INTERVAL = 60
+LOG_RATE_LIMIT_KEYS = 256
+
+# unique id of session sensor is unique id of device sensor with this suffix: device
+# names are MQTT topic levels, so "/" can not collide with a device named "*_session"
+SESSION_UNIQUE_ID_SUFFIX = "/session"
@@ -0,0 +1,114 @@
+"""Decoder for Sleep As Android MQTT payloads."""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import json
+from typing import Any
+
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+def loads(payload: str | bytes) -> Any:
+    """Parse JSON payload with the standard library.
+
+    Compact payloads are parsed by the scanner directly, skipping the whitespace
+    checks of json.loads; anything else is left to json.loads.
+
+    :param payload: JSON document
+    :returns: parsed document
+    :raises ValueError: if payload is not a JSON document
+    """
+    try:
+        data, end = _raw_decode(payload)
+        if end == len(payload):
+            return data
+    except (TypeError, ValueError):
+        pass
+    return json.loads(payload)
+
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    # orjson is not installed with every supported Home Assistant release
+    json_loads = loads
+
+_UNPARSED = object()
+
+# config entries sharing a subscription get the same payload object: decode it once
+_last_payload: str | bytes | None = None
+_last_event: SleepEvent | None = None
+
+
+class PayloadDecodeError(ValueError):
+    """Payload is not a Sleep As Android event."""
+
+
+class SleepEvent:
+    """Event from Sleep As Android.
+
+    Fields follow https://docs.sleep.urbandroid.org/services/automation.html#events
+    """
+
+    __slots__ = ("event", "value1", "value2", "value3", "_time")
+
+    def __init__(
+        self,
+        event: str | None = None,
+        value1: str | None = None,
+        value2: str | None = None,
+        value3: str | None = None,
+    ) -> None:
+        """Initialize event."""
+        self.event = event
+        self.value1 = value1
+        self.value2 = value2
+        self.value3 = value3
+        self._time = _UNPARSED
+
+    @property
+    def time(self) -> datetime | None:
+        """Time of event from value1, if value1 is a timestamp in milliseconds."""
+        if self._time is _UNPARSED:
+            try:
+                self._time = datetime.fromtimestamp(
+                    int(self.value1) / 1000, tz=timezone.utc
+                )
+            except (TypeError, ValueError, OverflowError, OSError):
+                self._time = None
+        return self._time
+
+    def __repr__(self) -> str:
+        """Return representation of event."""
+        return (
+            f"SleepEvent(event={self.event!r}, value1={self.value1!r}, "
+            f"value2={self.value2!r}, value3={self.value3!r})"
+        )
+
+
+def decode(payload: str | bytes) -> SleepEvent:
+    """Decode MQTT payload.
+
+    :param payload: JSON payload from MQTT message
+    :returns: decoded event
+    :raises PayloadDecodeError: if payload is not a JSON object
+    """
+    global _last_payload, _last_event  # pylint: disable=global-statement
+
+    if payload is _last_payload:
+        return _last_event
+
+    try:
+        data = json_loads(payload)
+    except ValueError as err:
+        raise PayloadDecodeError(f"expected JSON payload. got '{payload}'") from err
+
+    if not isinstance(data, dict):
+        raise PayloadDecodeError(f"expected JSON object. got '{payload}'")
+
+    get = data.get
+    event = SleepEvent(get("event"), get("value1"), get("value2"), get("value3"))
+    if isinstance(payload, (str, bytes)):
+        # mutable payloads can not be recognized by identity
+        _last_payload, _last_event = payload, event
+    return event
@@ -0,0 +1,89 @@
+"""Binary states derived from Sleep As Android events."""
+from __future__ import annotations
+
+from typing import Sequence
+
+DERIVED_STATES: dict[str, dict[str, bool]] = {
+    "tracking": {
+        "sleep_tracking_started": True,
+        "sleep_tracking_resumed": True,
+        "sleep_tracking_paused": False,
+        "sleep_tracking_stopped": False,
+    },
+    "sleeping": {
+        "light_sleep": True,
+        "deep_sleep": True,
+        "rem": True,
+        "not_awake": True,
+        "awake": False,
+        "sleep_tracking_started": False,
+        "sleep_tracking_paused": False,
+        "sleep_tracking_stopped": False,
+    },
+    "alarm_ringing": {
+        "alarm_alert_start": True,
+        "alarm_alert_dismiss": False,
+        "alarm_snooze_clicked": False,
+        "sleep_tracking_stopped": False,
+    },
+    "smart_period": {
+        "smart_period": True,
+        "alarm_alert_start": False,
+        "alarm_alert_dismiss": False,
+        "alarm_skip_next": False,
+        "sleep_tracking_stopped": False,
+    },
+    "lullaby": {
+        "lullaby_start": True,
+        "lullaby_stop": False,
+    },
+}
+"""State machines: key of derived state -> {event: state after the event}.
+
+Events that are not listed keep the state.
+"""
+
+
+def compile_transitions(
+    states: dict[str, dict[str, bool]]
+) -> dict[str, tuple[tuple[str, bool], ...]]:
+    """Index state machines by event.
+
+    :param states: state machines in DERIVED_STATES format
+    :returns: event -> ((key of derived state, state after the event), ...)
+    """
+    transitions: dict[str, list[tuple[str, bool]]] = {}
+    for key, machine in states.items():
+        for event, value in machine.items():
+            transitions.setdefault(event, []).append((key, value))
+    return {event: tuple(pairs) for event, pairs in transitions.items()}
+
+
+TRANSITIONS = compile_transitions(DERIVED_STATES)
+
+
+class DerivedStates:
+    """Current derived states of a device, updated with one lookup per event."""
+
+    __slots__ = ("values",)
+
+    def __init__(self) -> None:
+        """Initialize states, all unknown."""
+        self.values: dict[str, bool | None] = dict.fromkeys(DERIVED_STATES)
+
+    def update(self, event: str) -> Sequence[str]:
+        """Apply event to state machines.
+
+        :param event: event type
+        :returns: keys of derived states that changed
+        """
+        transitions = TRANSITIONS.get(event)
+        if transitions is None:
+            return ()
+        values = self.values
+        changed = []
+        for key, value in transitions:
+            if values[key] is not value:
+                values[key] = value
+                changed.append(key)
+        return changed
@@ -1,65 +1,85 @@
 """Triggers for Sleep As Android."""
+from __future__ import annotations
+
+from itertools import count
 import logging
+from typing import Any, Callable, Hashable
 
 from homeassistant.components.device_automation import (
     DEVICE_TRIGGER_BASE_SCHEMA as HA_TRIGGER_BASE_SCHEMA,
 )
-from homeassistant.components.homeassistant.triggers import event as event_trigger
 from homeassistant.const import CONF_DEVICE_ID, CONF_DOMAIN, CONF_PLATFORM, CONF_TYPE
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, Event, HassJob, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
 import voluptuous as vol
 
-from .const import DOMAIN
+from .const import (
+    DATA_TRIGGER_CACHE,
+    DATA_TRIGGER_DISPATCHER,
+    DEVICE_TRIGGER_EVENT,
+    DOMAIN,
+)
+from .events import CATEGORY_TRIGGERS, EVENT_CATEGORIES, EVENT_CATEGORY_TRIGGERS
 
 _LOGGER = logging.getLogger(__name__)
 
-# available at https://docs.sleep.urbandroid.org/services/automation.html#events
-TRIGGERS = [
-    "sleep_tracking_started",
-    "sleep_tracking_stopped",
-    "sleep_tracking_paused",
-    "sleep_tracking_resumed",
-    "alarm_snooze_clicked",
-    "alarm_snooze_canceled",
-    "time_to_bed_alarm_alert",
-    "alarm_alert_start",
-    "alarm_alert_dismiss",
-    "alarm_skip_next",
-    "show_skip_next_alarm",
-    "rem",
-    "smart_period",
-    "before_smart_period",
-    "lullaby_start",
-    "lullaby_stop",
-    "lullaby_volume_down",
-    "deep_sleep",
-    "light_sleep",
-    "awake",
-    "not_awake",
-    "apnea_alarm",
-    "antisnoring",
-    "sound_event_snore",
-    "sound_event_talk",
-    "sound_event_cough",
-    "sound_event_baby",
-    "sound_event_laugh",
-    "before_alarm",
-]
+TRIGGERS = list(EVENT_CATEGORIES)
+"""Trigger types for single events."""
 
 TRIGGER_SCHEMA = HA_TRIGGER_BASE_SCHEMA.extend(
     {
-        vol.Required(CONF_TYPE): vol.In(TRIGGERS),
+        vol.Required(CONF_TYPE): vol.In([*TRIGGERS, *CATEGORY_TRIGGERS]),
     }
 )
 
 
 async def async_get_triggers(hass, device_id):
     """Return a list of triggers."""
+    # copies of cached descriptors: callers may change what they get
+    return [
+        dict(trigger)
+        for trigger in async_get_trigger_cache(hass).async_get_triggers(device_id)
+    ]
+
+
+async def async_validate_trigger_config(hass, config):
+    """Validate config."""
+    return async_get_trigger_cache(hass).async_validate(config)
+
+
+def _freeze(value: Any) -> Hashable:
+    """Hashable equivalent of config value."""
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class TriggerCache:
+    """Trigger descriptors and validated trigger configs of devices.
 
-    triggers = []
+    Automation editor asks for triggers of a device and every automation reload
+    attaches its triggers again: descriptors are built once per device and every
+    trigger config is validated once. Callers get copies of cached values. Entries
+    of removed devices are dropped.
+    """
 
-    for t in TRIGGERS:
-        triggers.append(
+    def __init__(self, hass: HomeAssistant):
+        """Initialize cache."""
+        self.hass = hass
+        self._triggers: dict[str, tuple[dict[str, str], ...]] = {}
+        self._validated: dict[str, dict[Hashable, dict[str, Any]]] = {}
+        self._unsub_device_registry: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_get_triggers(self, device_id: str) -> tuple[dict[str, str], ...]:
+        """Get trigger descriptors of device."""
+        try:
+            return self._triggers[device_id]
+        except KeyError:
+            pass
+        triggers = self._triggers[device_id] = tuple(
             {
                 # Required fields of TRIGGER_BASE_SCHEMA
                 CONF_PLATFORM: "device",
@@ -68,26 +88,168 @@ async def async_get_triggers(hass, device_id):
                 # Required fields of TRIGGER_SCHEMA
                 CONF_TYPE: t,
             }
+            for t in (*TRIGGERS, *CATEGORY_TRIGGERS)
+        )
+        self._async_listen_device_registry()
+        return triggers
+
+    @callback
+    def async_validate(self, config: dict[str, Any]) -> dict[str, Any]:
+        """Validate trigger config, unless the same config was validated before.
+
+        :returns: copy of normalized config
+        :raises vol.Invalid: if config is invalid
+        """
+        try:
+            key = _freeze(config)
+            cached = self._validated.get(config.get(CONF_DEVICE_ID), {}).get(key)
+        except TypeError:
+            # config with values that can not be hashed is not cached
+            return TRIGGER_SCHEMA(config)
+        if cached is None:
+            cached = TRIGGER_SCHEMA(config)
+            self._validated.setdefault(cached[CONF_DEVICE_ID], {})[key] = cached
+            self._async_listen_device_registry()
+        return dict(cached)
+
+    @callback
+    def _async_listen_device_registry(self) -> None:
+        if self._unsub_device_registry is None:
+            self._unsub_device_registry = self.hass.bus.async_listen(
+                dr.EVENT_DEVICE_REGISTRY_UPDATED, self._async_device_registry_updated
+            )
+
+    @callback
+    def _async_device_registry_updated(self, event: Event) -> None:
+        """Drop cached entries of removed device."""
+        if event.data.get("action") != "remove":
+            return
+        device_id = event.data.get("device_id")
+        self._triggers.pop(device_id, None)
+        self._validated.pop(device_id, None)
+
+    def __len__(self) -> int:
+        """Return number of devices with cached entries."""
+        return len(self._triggers.keys() | self._validated.keys())
+
+
+@callback
+def async_get_trigger_cache(hass: HomeAssistant) -> TriggerCache:
+    """Get trigger cache of the integration."""
+    try:
+        return hass.data[DATA_TRIGGER_CACHE]
+    except KeyError:
+        cache = hass.data[DATA_TRIGGER_CACHE] = TriggerCache(hass)
+        return cache
+
+
+class TriggerDispatcher:
+    """Single listener for DEVICE_TRIGGER_EVENT shared by all attached triggers.
+
+    Actions are indexed by (device_id, type), so an event calls only matching actions
+    instead of being matched against one bus listener per attached trigger. Actions
+    of category triggers are indexed by category trigger type and get the concrete
+    event as "sleep_event" in trigger data.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize dispatcher."""
+        self.hass = hass
+        self._index: dict[tuple[str, str], dict[int, tuple[HassJob, dict]]] = {}
+        self._ids = count()
+        self._unsub_listener: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_attach(
+        self,
+        device_id: str,
+        trigger_type: str,
+        action: Callable,
+        trigger_data: dict[str, Any],
+    ) -> CALLBACK_TYPE:
+        """Attach action for device_id and trigger_type.
+
+        :returns: callback for detaching action
+        """
+        key = (device_id, trigger_type)
+        token = next(self._ids)
+        self._index.setdefault(key, {})[token] = (HassJob(action), trigger_data)
+        if self._unsub_listener is None:
+            self._unsub_listener = self.hass.bus.async_listen(
+                DEVICE_TRIGGER_EVENT, self._async_handle_event
+            )
+
+        @callback
+        def async_detach() -> None:
+            actions = self._index.get(key)
+            if actions is None or actions.pop(token, None) is None:
+                return
+            if not actions:
+                del self._index[key]
+            if not self._index and self._unsub_listener is not None:
+                self._unsub_listener()
+                self._unsub_listener = None
+
+        return async_detach
+
+    @callback
+    def _async_handle_event(self, event: Event) -> None:
+        """Run actions attached to device and type or category of event."""
+        device_id = event.data.get(CONF_DEVICE_ID)
+        sleep_event = event.data.get(CONF_TYPE)
+        actions = self._index.get((device_id, sleep_event))
+        category_actions = self._index.get(
+            (device_id, EVENT_CATEGORY_TRIGGERS.get(sleep_event))
         )
+        if actions:
+            self._async_run(actions, event, sleep_event)
+        if category_actions:
+            self._async_run(category_actions, event, sleep_event)
+
+    @callback
+    def _async_run(
+        self,
+        actions: dict[int, tuple[HassJob, dict]],
+        event: Event,
+        sleep_event: str,
+    ) -> None:
+        description = f"event '{event.event_type}'"
+        for job, trigger_data in list(actions.values()):
+            self.hass.async_run_hass_job(
+                job,
+                {
+                    "trigger": {
+                        **trigger_data,
+                        CONF_PLATFORM: "device",
+                        "event": event,
+                        "sleep_event": sleep_event,
+                        "description": description,
+                    }
+                },
+                event.context,
+            )
 
-    return triggers
+    def __len__(self) -> int:
+        """Return number of attached actions."""
+        return sum(len(actions) for actions in self._index.values())
+
+
+@callback
+def async_get_dispatcher(hass: HomeAssistant) -> TriggerDispatcher:
+    """Get trigger dispatcher of the integration."""
+    try:
+        return hass.data[DATA_TRIGGER_DISPATCHER]
+    except KeyError:
+        dispatcher = hass.data[DATA_TRIGGER_DISPATCHER] = TriggerDispatcher(hass)
+        return dispatcher
 
 
 async def async_attach_trigger(hass: HomeAssistant, config, action, automation_info):
     """Attach a trigger."""
-    config = TRIGGER_SCHEMA(config)
+    config = async_get_trigger_cache(hass).async_validate(config)
     _LOGGER.debug("Got subscription to trigger: %s", config)
-    event_config = event_trigger.TRIGGER_SCHEMA(
-        {
-            event_trigger.CONF_PLATFORM: "event",
-            event_trigger.CONF_EVENT_TYPE: DOMAIN + "_event",
-            event_trigger.CONF_EVENT_DATA: {
-                CONF_DEVICE_ID: config[CONF_DEVICE_ID],
-                CONF_TYPE: config[CONF_TYPE],
-            },
-        }
-    )
+    trigger_data = automation_info["trigger_data"] if automation_info else {}
 
-    return await event_trigger.async_attach_trigger(
-        hass, event_config, action, automation_info, platform_type="device"
+    return async_get_dispatcher(hass).async_attach(
+        config[CONF_DEVICE_ID], config[CONF_TYPE], action, trigger_data
     )
@@ -0,0 +1,23 @@
+"""Diagnostics support for Sleep As Android."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    instance = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": {"data": dict(entry.data), "options": dict(entry.options)},
+        "metrics": instance.metrics.as_dict(),
+        "caches": instance.cache_info(),
+        "queues": instance.queue_stats(),
+        "sensors": {name: sensor.stats() for name, sensor in instance.sensors.items()},
+    }
@@ -0,0 +1,65 @@
+"""Taxonomy of Sleep As Android events."""
+from __future__ import annotations
+
+CATEGORY_TRACKING = "tracking"
+CATEGORY_ALARM = "alarm"
+CATEGORY_SLEEP_STAGE = "sleep_stage"
+CATEGORY_SOUND = "sound"
+CATEGORY_LULLABY = "lullaby"
+
+# available at https://docs.sleep.urbandroid.org/services/automation.html#events
+EVENT_CATEGORIES: dict[str, str] = {
+    "sleep_tracking_started": CATEGORY_TRACKING,
+    "sleep_tracking_stopped": CATEGORY_TRACKING,
+    "sleep_tracking_paused": CATEGORY_TRACKING,
+    "sleep_tracking_resumed": CATEGORY_TRACKING,
+    "alarm_snooze_clicked": CATEGORY_ALARM,
+    "alarm_snooze_canceled": CATEGORY_ALARM,
+    "time_to_bed_alarm_alert": CATEGORY_ALARM,
+    "alarm_alert_start": CATEGORY_ALARM,
+    "alarm_alert_dismiss": CATEGORY_ALARM,
+    "alarm_skip_next": CATEGORY_ALARM,
+    "show_skip_next_alarm": CATEGORY_ALARM,
+    "rem": CATEGORY_SLEEP_STAGE,
+    "smart_period": CATEGORY_ALARM,
+    "before_smart_period": CATEGORY_ALARM,
+    "lullaby_start": CATEGORY_LULLABY,
+    "lullaby_stop": CATEGORY_LULLABY,
+    "lullaby_volume_down": CATEGORY_LULLABY,
+    "deep_sleep": CATEGORY_SLEEP_STAGE,
+    "light_sleep": CATEGORY_SLEEP_STAGE,
+    "awake": CATEGORY_SLEEP_STAGE,
+    "not_awake": CATEGORY_SLEEP_STAGE,
+    "apnea_alarm": CATEGORY_SOUND,
+    "antisnoring": CATEGORY_SOUND,
+    "sound_event_snore": CATEGORY_SOUND,
+    "sound_event_talk": CATEGORY_SOUND,
+    "sound_event_cough": CATEGORY_SOUND,
+    "sound_event_baby": CATEGORY_SOUND,
+    "sound_event_laugh": CATEGORY_SOUND,
+    "before_alarm": CATEGORY_ALARM,
+}
+"""Known events with their categories, in order of Sleep As Android documentation."""
+
+EVENTS: frozenset[str] = frozenset(EVENT_CATEGORIES)
+"""Known events, for membership tests on every message."""
+
+CATEGORY_EVENTS: dict[str, frozenset[str]] = {
+    category: frozenset(
+        event
+        for event, event_category in EVENT_CATEGORIES.items()
+        if event_category == category
+    )
+    for category in dict.fromkeys(EVENT_CATEGORIES.values())
+}
+"""Events of every category."""
+
+CATEGORY_TRIGGERS: dict[str, str] = {
+    f"any_{category}": category for category in CATEGORY_EVENTS
+}
+"""Device trigger types for any event of a category, e.g. "any_sleep_stage"."""
+
+EVENT_CATEGORY_TRIGGERS: dict[str, str] = {
+    event: f"any_{category}" for event, category in EVENT_CATEGORIES.items()
+}
+"""Event -> type of category trigger fired by the event."""
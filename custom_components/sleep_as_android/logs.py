@@ -0,0 +1,85 @@
+"""Logging helpers for the message path."""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable, Hashable
+
+from .cache import LRUCache
+from .const import LOG_RATE_LIMIT_INTERVAL, LOG_RATE_LIMIT_KEYS
+
+
+class RateLimitedLogger:
+    """Logger that emits each kind of message at most once per interval.
+
+    Messages are grouped by key, e.g. (device, event). Repeated messages within the
+    interval are counted and the count is reported with the next emitted message.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        interval: float = LOG_RATE_LIMIT_INTERVAL,
+        maxsize: int = LOG_RATE_LIMIT_KEYS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize logger.
+
+        :param logger: logger for emitted messages
+        :param interval: seconds between messages with the same key
+        :param maxsize: maximum number of remembered keys
+        :param clock: monotonic clock
+        """
+        self.logger = logger
+        self.interval = interval
+        self._clock = clock
+        self._keys = LRUCache(maxsize)
+
+    def log(self, level: int, key: Hashable, msg: str, *args) -> bool:
+        """Log message unless message with the same key was logged recently.
+
+        :returns: True if message was emitted
+        """
+        if not self.logger.isEnabledFor(level):
+            return False
+        now = self._clock()
+        entry = self._keys.get(key)
+        if entry is not None and now - entry[0] < self.interval:
+            entry[1] += 1
+            return False
+        if entry is not None and entry[1]:
+            msg += " (%d similar messages suppressed)"
+            args = (*args, entry[1])
+        self._keys.put(key, [now, 0])
+        self.logger.log(level, msg, *args)
+        return True
+
+    def warning(self, key: Hashable, msg: str, *args) -> bool:
+        """Log warning unless warning with the same key was logged recently."""
+        return self.log(logging.WARNING, key, msg, *args)
+
+
+class TraceSampler:
+    """Select every N-th message for tracing."""
+
+    __slots__ = ("every", "_countdown")
+
+    def __init__(self, every: int) -> None:
+        """Initialize sampler.
+
+        :param every: trace every N-th message, 0 disables tracing
+        """
+        self.every = every
+        self._countdown = every
+
+    def __bool__(self) -> bool:
+        """Is tracing enabled."""
+        return self.every > 0
+
+    def sample(self) -> bool:
+        """Count message and tell if it should be traced."""
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+        self._countdown = self.every
+        return True
@@ -0,0 +1,115 @@
+"""Counters and latency histograms for the message path."""
+from __future__ import annotations
+
+import time
+
+STAGE_RECEIVE = "receive"
+STAGE_TOPIC = "topic"
+STAGE_DECODE = "decode"
+STAGE_STATE_WRITE = "state_write"
+STAGE_BUS_FIRE = "bus_fire"
+STAGES = (STAGE_RECEIVE, STAGE_TOPIC, STAGE_DECODE, STAGE_STATE_WRITE, STAGE_BUS_FIRE)
+
+# startup milestones, seconds since instance creation
+STARTUP_SUBSCRIBED = "subscribed"
+STARTUP_REGISTRY_SCANNED = "registry_scanned"
+STARTUP_SENSORS_RESTORED = "sensors_restored"
+STARTUP_FIRST_EVENT = "first_event"
+
+_BUCKETS = 40  # 2**40 ns is about 18 minutes
+
+
+class LatencyHistogram:
+    """Histogram of durations with power of two buckets.
+
+    Recording is an int.bit_length and two additions, percentiles are estimated with
+    bucket precision.
+    """
+
+    __slots__ = ("buckets", "count", "total_ns", "max_ns")
+
+    def __init__(self) -> None:
+        """Initialize histogram."""
+        self.buckets: list[int] = [0] * _BUCKETS
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.max_ns: int = 0
+
+    def record(self, duration_ns: int) -> None:
+        """Add duration in nanoseconds."""
+        self.buckets[min(duration_ns.bit_length(), _BUCKETS - 1)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, percent: float) -> int:
+        """Upper bound of the bucket with given percentile, in nanoseconds."""
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100
+        seen = 0
+        for index, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= rank and index < _BUCKETS - 1:
+                return min(1 << index, self.max_ns)
+        return self.max_ns
+
+    def as_dict(self) -> dict[str, float]:
+        """Return summary in microseconds."""
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1000 if self.count else 0,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max_ns / 1000,
+        }
+
+
+class Metrics:
+    """Metrics of one integration instance."""
+
+    def __init__(self) -> None:
+        """Initialize metrics."""
+        self.messages: int = 0
+        self.ignored_topics: int = 0
+        self.decode_errors: int = 0
+        self.unknown_events: int = 0
+        self.histograms: dict[str, LatencyHistogram] = {
+            stage: LatencyHistogram() for stage in STAGES
+        }
+        self.started: float = time.monotonic()
+        self.startup: dict[str, float] = {}
+        self._rate_checkpoint: tuple[float, int] = (self.started, 0)
+
+    def record(self, stage: str, duration_ns: int) -> None:
+        """Add duration of stage in nanoseconds."""
+        self.histograms[stage].record(duration_ns)
+
+    def mark(self, milestone: str) -> None:
+        """Remember time of reaching startup milestone, only the first time."""
+        if milestone not in self.startup:
+            self.startup[milestone] = time.monotonic() - self.started
+
+    def messages_rate(self) -> float:
+        """Messages per second since previous call."""
+        now = time.monotonic()
+        checkpoint, messages = self._rate_checkpoint
+        self._rate_checkpoint = (now, self.messages)
+        elapsed = now - checkpoint
+        return (self.messages - messages) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        """Return all metrics."""
+        return {
+            "uptime_s": time.monotonic() - self.started,
+            "messages": self.messages,
+            "ignored_topics": self.ignored_topics,
+            "decode_errors": self.decode_errors,
+            "unknown_events": self.unknown_events,
+            "startup_s": dict(self.startup),
+            "latency": {
+                stage: histogram.as_dict()
+                for stage, histogram in self.histograms.items()
+            },
+        }
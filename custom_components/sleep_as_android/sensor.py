@@ -1,54 +1,111 @@
 """Sensor for Sleep as android states."""
 
-import json
+from collections import deque
 import logging
-from typing import TYPE_CHECKING
+from time import monotonic, perf_counter_ns, time
+from typing import TYPE_CHECKING, Callable
 
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers import device_registry as dr
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN, Platform
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 from homeassistant.helpers.entity_registry import async_entries_for_config_entry
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.restore_state import RestoreEntity
 
-from .const import DOMAIN
-from .device_trigger import TRIGGERS
+from .cache import LRUCache
+from .const import (
+    ATTR_LABEL,
+    ATTR_TIMESTAMP,
+    ATTR_VALUE3,
+    DEDUPE_INTERVAL,
+    DEDUPE_WINDOW,
+    DEVICE_TRIGGER_EVENT,
+    DOMAIN,
+    EVENT_MODE_DEVICE,
+    EVENT_MODE_DOMAIN,
+    PENDING_MESSAGES_LIMIT,
+    SESSION_UNIQUE_ID_SUFFIX,
+)
+from .decoder import PayloadDecodeError, SleepEvent, decode
+from .derived import DerivedStates
+from .events import EVENTS
+from .logs import RateLimitedLogger
+from .metrics import (
+    STAGE_BUS_FIRE,
+    STAGE_DECODE,
+    STAGE_RECEIVE,
+    STAGE_STATE_WRITE,
+    STARTUP_FIRST_EVENT,
+    Metrics,
+)
+from .session import SESSION_KEY, SleepSession
 
 if TYPE_CHECKING:
     from . import SleepAsAndroidInstance
 
 _LOGGER = logging.getLogger(__name__)
 
+DIAGNOSTIC_SENSORS: "dict[str, tuple[str, str | None, Callable[[Metrics], float]]]" = {
+    "messages_rate": (
+        "messages rate",
+        "msg/s",
+        lambda m: round(m.messages_rate(), 2),
+    ),
+    "latency_p99": (
+        "latency p99",
+        "µs",
+        lambda m: m.histograms[STAGE_RECEIVE].percentile(99) / 1000,
+    ),
+    "unknown_events": ("unknown events", None, lambda m: m.unknown_events),
+}
+"""Diagnostic sensors: key -> (name suffix, unit, value from instance metrics)."""
+
 
 async def async_setup_entry(
     hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities
 ):
     """Set up the sensor entry."""
 
-    async def add_configured_entities():
-        """Scan entity registry and add previously created entities to Home Assistant."""
+    @callback
+    def add_configured_entities():
+        """Scan entity registry and add previously created entities to Home Assistant.
+
+        Instance is already subscribed: sensors created for incoming messages are
+        added together with the configured ones.
+        """
 
-        entities = async_entries_for_config_entry(
+        names: list[str] = []
+        for entity in async_entries_for_config_entry(
             instance.entity_registry, config_entry.entry_id
-        )
-        sensors: list[SleepAsAndroidSensor] = []
-        for entity in entities:
+        ):
+            # binary, diagnostic and session sensors are not devices
+            if (
+                entity.domain != Platform.SENSOR
+                or entity.entity_category is not None
+                or entity.unique_id.endswith(SESSION_UNIQUE_ID_SUFFIX)
+            ):
+                continue
 
             device_name = instance.device_name_from_entity_id(entity.unique_id)
             _LOGGER.debug(
-                f"add_configured_entities: creating sensor with name {device_name}"
+                "add_configured_entities: creating sensor with name %s", device_name
             )
-            (sensor, _) = instance.get_sensor(device_name)
-            sensors.append(sensor)
+            names.append(device_name)
 
-        async_add_entities(sensors)
+        instance.async_restore_sensors(names)
+        instance.async_set_add_entities(async_add_entities)
 
     instance: SleepAsAndroidInstance = hass.data[DOMAIN][config_entry.entry_id]
-    await add_configured_entities()
-    _LOGGER.debug("async_setup_entry: adding configured entities is finished.")
-    _LOGGER.debug("Going to subscribe to root topic.")
-    await instance.subscribe_root_topic(async_add_entities)
+    add_configured_entities()
+    if instance.diagnostic_sensors:
+        async_add_entities(
+            [
+                SleepAsAndroidDiagnosticSensor(instance, config_entry, key)
+                for key in DIAGNOSTIC_SENSORS
+            ]
+        )
     _LOGGER.debug("async_setup_entry is finished")
     return True
 
@@ -57,8 +114,9 @@ class SleepAsAndroidSensor(SensorEntity, RestoreEntity):
     """Sensor for the integration."""
 
     __additional_attributes: dict[str, str] = {
-        "value1": "timestamp",
-        "value2": "label",
+        "value1": ATTR_TIMESTAMP,
+        "value2": ATTR_LABEL,
+        "value3": ATTR_VALUE3,
     }
     """Mapping for value*.
 
@@ -81,11 +139,28 @@ class SleepAsAndroidSensor(SensorEntity, RestoreEntity):
         self._name: str = name
         self._state: str = STATE_UNKNOWN
         self._device_id: str = "unknown"
+        self._ready: bool = False
+        self._pending: deque = deque()
+        self.dropped_messages: int = 0
+        self.writes_saved: int = 0
+        self._write_pending: bool = False
+        self._unsub_write = None
+        self._written: tuple | None = None
+        self._recent_payloads = LRUCache(DEDUPE_WINDOW)
+        self._recent_events = LRUCache(DEDUPE_WINDOW)
+        self.duplicates_suppressed: int = 0
+        # unknown events and bad payloads repeat with every message from a
+        # misbehaving phone
+        self._warnings = RateLimitedLogger(_LOGGER)
+        self._device_info: DeviceInfo | None = None
+        self.session = SleepSession()
+        self.derived = DerivedStates()
+        self._listeners: dict[str, list[Callable[[], None]]] = {}
         self._attr_extra_state_attributes = {}
         self._set_attributes(
-            {}
+            SleepEvent()
         )  # initiate _attr_extra_state_attributes with empty values
-        _LOGGER.debug(f"Creating sensor with name {name}")
+        _LOGGER.debug("Creating sensor with name %s", name)
 
     async def async_added_to_hass(self):
         """When sensor added to Home Assistant.
@@ -93,25 +168,32 @@ class SleepAsAndroidSensor(SensorEntity, RestoreEntity):
         Should create device for sensor here
         """
         await super().async_added_to_hass()
-        device_registry = await dr.async_get_registry(self.hass)
-        device = device_registry.async_get_device(
-            identifiers=self.device_info["identifiers"], connections=set()
-        )
-        _LOGGER.debug("My device id is %s", device.id)
-        self._device_id = device.id
+        device_id = self._instance.async_get_device_id(self.unique_id)
+        if device_id is None:
+            _LOGGER.warning("Could not find device of %s", self.name)
+        else:
+            _LOGGER.debug("My device id is %s", device_id)
+            self._device_id = device_id
 
         if (old_state := await self.async_get_last_state()) is not None:
             self._state = old_state.state
+            # retained message with the restored event must not be processed again
+            if (timestamp := old_state.attributes.get(ATTR_TIMESTAMP)) is not None:
+                self._recent_events.put((timestamp, old_state.state), monotonic())
             _LOGGER.debug(
-                f"async_added_to_hass: restored previous state for {self.name}: {self.state}"
+                "async_added_to_hass: restored previous state for %s: %s",
+                self.name,
+                self.state,
             )
         else:
             # No previous state. It is fine, but it would be nice to report
             _LOGGER.debug(
-                f"async_added_to_hass: no previously saved state for {self.name}"
+                "async_added_to_hass: no previously saved state for %s", self.name
             )
 
-        self.async_write_ha_state()
+        self._async_write_state()
+        self._flush_pending()
+        self._instance.async_sensor_restored(self._name)
 
     async def async_will_remove_from_hass(self):
         """When sensor is removed from Home Assistant.
@@ -119,31 +201,148 @@ class SleepAsAndroidSensor(SensorEntity, RestoreEntity):
         Should remove device here
         """
         # ToDo: should we remove device?
-        pass
+        self._ready = False
+        if self._unsub_write is not None:
+            self._unsub_write()
+            self._unsub_write = None
 
     def process_message(self, msg):
         """Process new MQTT messages.
 
-        Set sensor state, attributes and fire events.
+        Messages that arrive before sensor is added to Home Assistant are buffered
+        and processed by _flush_pending.
 
         :param msg: MQTT message
         """
-        _LOGGER.debug(f"Processing message {msg}")
+        if not self._ready:
+            if len(self._pending) >= PENDING_MESSAGES_LIMIT:
+                self._pending.popleft()
+                self.dropped_messages += 1
+                self._warnings.warning(
+                    "pending",
+                    "Too many messages for %s before it was added: dropping oldest",
+                    self._name,
+                )
+            self._pending.append(msg)
+            return
+
+        self._process_message(msg)
+
+    def _flush_pending(self):
+        """Mark sensor as ready and process buffered messages in order."""
+        self._ready = True
+        while self._pending:
+            self._process_message(self._pending.popleft())
+
+    def _process_message(self, msg):
+        """Set sensor state, attributes and fire events.
+
+        :param msg: MQTT message
+        """
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Processing message %s", msg)
+        metrics = self._instance.metrics
+        started = perf_counter_ns()
+        raw_payload = msg.payload
+        now = monotonic()
+        if self._is_redelivery(msg, self._recent_payloads.get(raw_payload), now):
+            self._suppress_duplicate(raw_payload)
+            return
+
         try:
+            event = decode(raw_payload)
+        except PayloadDecodeError:
+            metrics.decode_errors += 1
+            self._warnings.warning(
+                "decode",
+                "expected JSON payload. got '%s' instead",
+                msg.payload,
+            )
+            return
+        decoded = perf_counter_ns()
+        metrics.record(STAGE_DECODE, decoded - started)
+        if STARTUP_FIRST_EVENT not in metrics.startup:
+            metrics.mark(STARTUP_FIRST_EVENT)
+
+        new_state = event.event
+        if new_state is None:
             new_state = STATE_UNKNOWN
-            payload = json.loads(msg.payload)
-            try:
-                new_state = payload["event"]
-            except KeyError:
-                _LOGGER.warning("Got unexpected payload: '%s'", payload)
+            self._warnings.warning(
+                "payload", "Got unexpected payload: '%s'", raw_payload
+            )
+        if new_state not in EVENTS:
+            metrics.unknown_events += 1
+
+        if event.value1 is not None:
+            # events without timestamp can not be told apart from repeated ones
+            key = (event.value1, new_state)
+            if self._is_redelivery(msg, self._recent_events.get(key), now):
+                self._suppress_duplicate(raw_payload)
+                return
+            self._recent_events.put(key, now)
+            self._recent_payloads.put(raw_payload, now)
+
+        self._set_attributes(event)
+        self.state = new_state
+        for key in self.derived.update(new_state):
+            self._notify(key)
+        event_time = event.time
+        if self.session.update(
+            new_state, time() if event_time is None else event_time.timestamp()
+        ):
+            self._notify(SESSION_KEY)
+        written = perf_counter_ns()
+        metrics.record(STAGE_STATE_WRITE, written - decoded)
+        self._emit(self.state)
+        metrics.record(STAGE_BUS_FIRE, perf_counter_ns() - written)
+
+    @callback
+    def async_add_listener(
+        self, key: str, update_callback: Callable[[], None]
+    ) -> CALLBACK_TYPE:
+        """Call update_callback every time derived state or session changes.
+
+        :param key: key of derived state or SESSION_KEY
+        :returns: callback for removing listener
+        """
+        listeners = self._listeners.setdefault(key, [])
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            listeners.remove(update_callback)
+
+        return remove_listener
+
+    def _notify(self, key: str):
+        for listener in self._listeners.get(key, ()):
+            listener()
+
+    def stats(self) -> dict[str, int]:
+        """Counters of the sensor."""
+        return {
+            "pending": len(self._pending),
+            "dropped_messages": self.dropped_messages,
+            "duplicates_suppressed": self.duplicates_suppressed,
+            "writes_saved": self.writes_saved,
+        }
 
-            self._set_attributes(payload)
-            self.state = new_state
-            self._fire_event(self.state)
-            self._fire_trigger(self.state)
+    @staticmethod
+    def _is_redelivery(msg, seen_at: "float | None", now: float) -> bool:
+        """Check if message with an already seen event is delivered again.
 
-        except json.decoder.JSONDecodeError:
-            _LOGGER.warning("expected JSON payload. got '%s' instead", msg.payload)
+        Sleep As Android repeats events of an alarm, e.g. every snooze, with the same
+        timestamp: only retained messages and messages delivered again right away
+        are duplicates.
+        """
+        return seen_at is not None and (
+            msg.retain is True or now - seen_at < DEDUPE_INTERVAL
+        )
+
+    def _suppress_duplicate(self, payload):
+        """Count duplicated or redelivered message."""
+        self.duplicates_suppressed += 1
+        _LOGGER.debug("Ignoring duplicated message for %s: %s", self._name, payload)
 
     @property
     def name(self):
@@ -157,17 +356,60 @@ class SleepAsAndroidSensor(SensorEntity, RestoreEntity):
 
     @state.setter
     def state(self, new_state: str):
-        """Set new state and fire events if needed.
-
-        Events will be fired if state changed and new state is not STATE_UNKNOWN.
+        """Set new state and write it if state or tracked attributes changed.
 
         :param new_state: str: new sensor state
         """
-        if self._state != new_state:
-            self._state = new_state
-            self.async_write_ha_state()
+        self._state = new_state
+        if self._snapshot() != self._written:
+            self._async_schedule_write()
+        else:
+            _LOGGER.debug("Will not update state because nothing has changed")
+
+    def _snapshot(self) -> tuple:
+        """State and tracked attributes, used for detecting changes."""
+        attributes = self._attr_extra_state_attributes
+        return (
+            self._state,
+            *(attributes.get(a) for a in self._instance.tracked_attributes),
+        )
+
+    @callback
+    def _async_write_state(self):
+        """Write state to Home Assistant and remember what was written."""
+        self._written = self._snapshot()
+        self.async_write_ha_state()
+
+    @callback
+    def _async_schedule_write(self):
+        """Write state now or batch it with other changes within coalesce window.
+
+        First change is written immediately and opens the window; changes inside the
+        window are written once when it closes.
+        """
+        window = self._instance.coalesce_window
+        if not window:
+            self._async_write_state()
+            return
+
+        if self._unsub_write is None:
+            self._async_write_state()
+            self._unsub_write = async_call_later(
+                self.hass, window, self._async_write_coalesced
+            )
+        elif self._write_pending:
+            self.writes_saved += 1
         else:
-            _LOGGER.debug("Will not update state because old state == new_state")
+            self._write_pending = True
+
+    @callback
+    def _async_write_coalesced(self, _now):
+        """Write batched state when coalesce window closes."""
+        self._unsub_write = None
+        if self._write_pending:
+            self._write_pending = False
+            if self._snapshot() != self._written:
+                self._async_schedule_write()
 
     @property
     def unique_id(self) -> str:
@@ -185,46 +427,150 @@ class SleepAsAndroidSensor(SensorEntity, RestoreEntity):
         return self._device_id
 
     @property
-    def device_info(self):
-        """Device info for sensor."""
-        _LOGGER.debug("My identifiers is %s", {(DOMAIN, self.unique_id)})
-        info = {
-            "identifiers": {(DOMAIN, self.unique_id)},
-            "name": self.name,
-            "manufacturer": "SleepAsAndroid",
-            "type": None,
-            "model": "MQTT",
-        }
+    def device_info(self) -> DeviceInfo:
+        """Device info for sensor, built once for current unique id."""
+        identifier = (DOMAIN, self.unique_id)
+        info = self._device_info
+        if info is None or identifier not in info["identifiers"]:
+            _LOGGER.debug("My identifiers is %s", {identifier})
+            info = self._device_info = {
+                "identifiers": {identifier},
+                "name": self.name,
+                "manufacturer": "SleepAsAndroid",
+                "type": None,
+                "model": "MQTT",
+            }
         return info
 
+    @callback
+    def _emit(self, new_state: str):
+        """Fire events selected by event mode of the instance.
+
+        :param new_state: new sensor state
+        """
+        mode = self._instance.event_mode
+        if mode != EVENT_MODE_DOMAIN:
+            self._fire_event(new_state)
+        if mode != EVENT_MODE_DEVICE:
+            self._fire_trigger(new_state)
+
+    @callback
     def _fire_event(self, event_payload: str):
         """Fire event with payload {'event': event_payload}.
 
         :param event_payload: payload for event
         """
+        # listeners get event data itself: every event needs its own payload
         payload = {"event": event_payload}
-        _LOGGER.debug("Firing '%s' with payload: '%s'", self.name, payload)
-        self.hass.bus.fire(self.name, payload)
+        name = self.name
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Firing '%s' with payload: '%s'", name, payload)
+        self.hass.bus.async_fire(name, payload)
 
+    @callback
     def _fire_trigger(self, new_state: str):
         """Fire trigger based on new state.
 
         :param new_state: type of trigger to fire
         """
-        if new_state in TRIGGERS:
+        if new_state in EVENTS:
             self.hass.bus.async_fire(
-                DOMAIN + "_event", {"device_id": self.device_id, "type": new_state}
+                DEVICE_TRIGGER_EVENT, {"device_id": self._device_id, "type": new_state}
             )
         else:
-            _LOGGER.warning(
-                "Got %s event, but it is not in TRIGGERS list: will not fire this event for "
-                "trigger!",
+            self._warnings.warning(
+                ("trigger", new_state),
+                "Got %s event from %s, but it is not in TRIGGERS list: will not fire "
+                "this event for trigger!",
                 new_state,
+                self._name,
             )
 
-    def _set_attributes(self, payload: dict):
+    def _set_attributes(self, event: SleepEvent):
         new_attributes = {}
         for k, v in self.__additional_attributes.items():
-            new_attributes[v] = payload.get(k, STATE_UNAVAILABLE)
-        _LOGGER.debug(f"New attributes is {new_attributes}")
-        return self._attr_extra_state_attributes.update(new_attributes)
+            value = getattr(event, k)
+            new_attributes[v] = STATE_UNAVAILABLE if value is None else value
+        _LOGGER.debug("New attributes is %s", new_attributes)
+        # replace instead of updating in place: written state keeps its own dict
+        self._attr_extra_state_attributes = new_attributes
+
+
+class SleepAsAndroidSessionSensor(SensorEntity, RestoreEntity):
+    """Current sleep tracking session of a device.
+
+    State is time asleep in minutes, attributes are stage durations and event
+    counts. State is written only when an event changes the session.
+    """
+
+    _attr_icon = "mdi:bed-clock"
+    _attr_should_poll = False
+    _attr_native_unit_of_measurement = "min"
+
+    def __init__(self, sensor: SleepAsAndroidSensor):
+        """Initialize entry.
+
+        :param sensor: sensor of device that receives events
+        """
+        self._sensor = sensor
+        self._session = sensor.session
+
+    async def async_added_to_hass(self):
+        """Restore session and start following events of the device."""
+        await super().async_added_to_hass()
+        if (
+            self._session.started is None
+            and (old_state := await self.async_get_last_state()) is not None
+        ):
+            self._session.restore(old_state.attributes)
+        self.async_on_remove(
+            self._sensor.async_add_listener(SESSION_KEY, self.async_write_ha_state)
+        )
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._sensor.name} session"
+
+    @property
+    def unique_id(self) -> str:
+        """Return a unique ID."""
+        return self._sensor.unique_id + SESSION_UNIQUE_ID_SUFFIX
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Session belongs to the device of the sensor."""
+        return self._sensor.device_info
+
+    @property
+    def native_value(self) -> "float | None":
+        """Time asleep in the session, in minutes."""
+        if self._session.started is None:
+            return None
+        return round(self._session.sleep_seconds / 60, 1)
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Stage durations and event counts."""
+        return self._session.as_dict()
+
+
+class SleepAsAndroidDiagnosticSensor(SensorEntity):
+    """Diagnostic sensor with metrics of the integration instance."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:chart-line"
+
+    def __init__(
+        self, instance: "SleepAsAndroidInstance", config_entry: ConfigEntry, key: str
+    ):
+        """Initialize entry."""
+        self._instance = instance
+        suffix, unit, self._value = DIAGNOSTIC_SENSORS[key]
+        self._attr_name = f"{instance.name} {suffix}"
+        self._attr_unique_id = f"{config_entry.entry_id}_{key}"
+        self._attr_native_unit_of_measurement = unit
+
+    async def async_update(self):
+        """Read current value from metrics."""
+        self._attr_native_value = self._value(self._instance.metrics)
@@ -0,0 +1,146 @@
+"""Incremental aggregation of sleep tracking sessions."""
+from __future__ import annotations
+
+from typing import Any
+
+SESSION_STAGES = ("deep_sleep", "light_sleep", "rem", "awake")
+SESSION_SOUNDS = (
+    "sound_event_snore",
+    "sound_event_talk",
+    "sound_event_cough",
+    "sound_event_baby",
+    "sound_event_laugh",
+)
+SLEEP_STAGES = ("deep_sleep", "light_sleep", "rem")
+SESSION_KEY = "session"
+"""Listener key for changes of the session."""
+
+_STARTED = "sleep_tracking_started"
+_STOPPED = "sleep_tracking_stopped"
+_PAUSED = "sleep_tracking_paused"
+_RESUMED = "sleep_tracking_resumed"
+_NOT_AWAKE = "not_awake"
+_SNOOZE = "alarm_snooze_clicked"
+
+
+class SleepSession:
+    """Stage durations and event counts of the current sleep tracking session.
+
+    Every event updates a few counters: time since the previous stage event is
+    added to that stage, so no history has to be scanned. Time spent in the
+    current stage is added when the next stage event, pause or stop arrives.
+    """
+
+    __slots__ = (
+        "started",
+        "stopped",
+        "tracking",
+        "paused",
+        "stage",
+        "stage_since",
+        "durations",
+        "counts",
+        "snoozes",
+    )
+
+    def __init__(self) -> None:
+        """Initialize session that is not started yet."""
+        self.started: float | None = None
+        self.stopped: float | None = None
+        self.tracking: bool = False
+        self.paused: bool = False
+        self.stage: str | None = None
+        self.stage_since: float | None = None
+        self.durations: dict[str, float] = dict.fromkeys(SESSION_STAGES, 0.0)
+        self.counts: dict[str, int] = dict.fromkeys(SESSION_SOUNDS, 0)
+        self.snoozes: int = 0
+
+    def update(self, event: str, timestamp: float) -> bool:
+        """Account event of sensor.
+
+        :param event: event type
+        :param timestamp: time of event in seconds since epoch
+        :returns: True if session changed
+        """
+        if event == _STARTED:
+            self.__init__()
+            self.started = timestamp
+            self.tracking = True
+            return True
+        if self.started is None:
+            # events before first tracked session are not a part of any session
+            return False
+
+        if event in self.durations or event == _NOT_AWAKE:
+            if not self.tracking:
+                return False
+            self._close_stage(timestamp)
+            self.stage = event if event != _NOT_AWAKE else None
+            return True
+        if event in self.counts:
+            self.counts[event] += 1
+            return True
+        if event == _SNOOZE:
+            self.snoozes += 1
+            return True
+        if event == _PAUSED and self.tracking and not self.paused:
+            self._close_stage(timestamp)
+            self.paused = True
+            return True
+        if event == _RESUMED and self.paused:
+            self.paused = False
+            self.stage_since = timestamp
+            return True
+        if event == _STOPPED and self.tracking:
+            self._close_stage(timestamp)
+            self.tracking = False
+            self.paused = False
+            self.stage = None
+            self.stopped = timestamp
+            return True
+        return False
+
+    def _close_stage(self, timestamp: float) -> None:
+        """Add time since the previous stage event to the current stage."""
+        if self.stage is not None and self.stage_since is not None and not self.paused:
+            # out of order events must not make durations negative
+            self.durations[self.stage] += max(0.0, timestamp - self.stage_since)
+        self.stage_since = timestamp
+
+    @property
+    def sleep_seconds(self) -> float:
+        """Time in sleep stages."""
+        durations = self.durations
+        return sum(durations[stage] for stage in SLEEP_STAGES)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return session values, suitable for state attributes."""
+        return {
+            "started": self.started,
+            "stopped": self.stopped,
+            "tracking": self.tracking,
+            "stage": self.stage,
+            **{
+                f"{stage}_minutes": round(d / 60, 1)
+                for stage, d in self.durations.items()
+            },
+            **{sound[len("sound_event_") :]: n for sound, n in self.counts.items()},
+            "snoozes": self.snoozes,
+        }
+
+    def restore(self, attributes: dict[str, Any]) -> None:
+        """Restore session from attributes made by as_dict.
+
+        Session that was tracking continues from restore time: time between last
+        event and restart is not accounted.
+        """
+        self.started = attributes.get("started")
+        self.stopped = attributes.get("stopped")
+        self.tracking = bool(attributes.get("tracking"))
+        self.stage = attributes.get("stage")
+        self.stage_since = None
+        for stage in self.durations:
+            self.durations[stage] = float(attributes.get(f"{stage}_minutes") or 0) * 60
+        for sound in self.counts:
+            self.counts[sound] = int(attributes.get(sound[len("sound_event_") :]) or 0)
+        self.snoozes = int(attributes.get("snoozes") or 0)
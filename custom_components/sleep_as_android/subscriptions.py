@@ -0,0 +1,182 @@
+"""MQTT subscriptions shared by all config entries of the integration."""
+from __future__ import annotations
+
+import asyncio
+from itertools import count
+import logging
+from typing import Awaitable, Callable
+
+from homeassistant.components.mqtt import subscription
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DATA_SUBSCRIPTIONS
+from .topic import TopicFilterIndex, filter_covers
+
+_LOGGER = logging.getLogger(__name__)
+
+# Home Assistant 2022.3 split subscribing into prepare/subscribe steps and made
+# async_unsubscribe_topics synchronous. Probe the running core once instead of
+# looking its version up on every (un)subscribe.
+PREPARE_SUBSCRIBE_TOPICS: bool = hasattr(subscription, "async_prepare_subscribe_topics")
+
+
+class _BrokerSubscription:
+    """Broker subscription for one topic filter and callbacks it feeds."""
+
+    __slots__ = ("topic_filter", "qos", "exact", "narrower")
+
+    def __init__(self, topic_filter: str) -> None:
+        self.topic_filter = topic_filter
+        self.qos = 0
+        # callbacks registered for this very filter get every message
+        self.exact: list[Callable] = []
+        # callbacks of covered narrower filters get only matching messages
+        self.narrower: TopicFilterIndex | None = None
+
+
+class SubscriptionManager:
+    """Single broker subscription per topic filter, fanned out to config entries.
+
+    Identical filters are subscribed once and filters covered by a wider one (e.g.
+    "SleepAsAndroid/phone" by "SleepAsAndroid/+") are not subscribed at all: their
+    messages come through the wider subscription and are routed by a topic filter
+    index. Broker subscriptions are removed together with the last registration
+    using them.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize manager."""
+        self.hass = hass
+        self._registrations: dict[int, tuple[str, int, Callable]] = {}
+        self._ids = count()
+        self._subscriptions: dict[str, _BrokerSubscription] = {}
+        self._sub_state = None
+        self._lock = asyncio.Lock()
+
+    async def async_subscribe(
+        self, topic_filter: str, qos: int, msg_callback: Callable
+    ) -> Callable[[], Awaitable[None]]:
+        """Register callback for messages matching topic filter.
+
+        :param topic_filter: MQTT topic filter
+        :param qos: quality of service for the filter
+        :param msg_callback: callback for MQTT messages
+        :returns: coroutine function for unregistering callback
+        """
+        token = next(self._ids)
+        self._registrations[token] = (topic_filter, qos, msg_callback)
+        await self._async_update()
+
+        async def async_unsubscribe() -> None:
+            if self._registrations.pop(token, None) is not None:
+                await self._async_update()
+
+        return async_unsubscribe
+
+    def _plan(self) -> dict[str, _BrokerSubscription]:
+        """Group registrations by the broker subscriptions that deliver them."""
+        filters = sorted({reg[0] for reg in self._registrations.values()})
+        widest = [
+            topic_filter
+            for topic_filter in filters
+            if not any(
+                other != topic_filter and filter_covers(other, topic_filter)
+                for other in filters
+            )
+        ]
+        subscriptions = {
+            topic_filter: _BrokerSubscription(topic_filter) for topic_filter in widest
+        }
+        for topic_filter, qos, msg_callback in self._registrations.values():
+            sub = subscriptions.get(topic_filter)
+            if sub is not None:
+                sub.exact.append(msg_callback)
+            else:
+                sub = subscriptions[
+                    next(wide for wide in widest if filter_covers(wide, topic_filter))
+                ]
+                if sub.narrower is None:
+                    sub.narrower = TopicFilterIndex()
+                sub.narrower.add(topic_filter, msg_callback)
+            sub.qos = max(sub.qos, qos)
+        return subscriptions
+
+    async def _async_update(self) -> None:
+        """Bring broker subscriptions in line with registrations."""
+        async with self._lock:
+            self._subscriptions = self._plan()
+            topics = {
+                topic_filter: {
+                    "topic": topic_filter,
+                    "msg_callback": self._make_handler(topic_filter),
+                    "qos": sub.qos,
+                }
+                for topic_filter, sub in self._subscriptions.items()
+            }
+            _LOGGER.debug(
+                "%d registrations share %d subscriptions: %s",
+                len(self._registrations),
+                len(topics),
+                list(topics),
+            )
+            if PREPARE_SUBSCRIBE_TOPICS:
+                self._sub_state = subscription.async_prepare_subscribe_topics(
+                    hass=self.hass, new_state=self._sub_state, topics=topics
+                )
+                if self._sub_state is not None:
+                    await subscription.async_subscribe_topics(
+                        hass=self.hass, sub_state=self._sub_state
+                    )
+            else:
+                self._sub_state = await subscription.async_subscribe_topics(
+                    hass=self.hass, new_state=self._sub_state, topics=topics
+                )
+
+    def _make_handler(self, topic_filter: str) -> Callable:
+        """Create callback for broker subscription of topic filter.
+
+        Subscription helper keeps the first callback of an unchanged subscription,
+        so the handler looks up current callbacks on every message.
+        """
+
+        @callback
+        def message_received(msg) -> None:
+            sub = self._subscriptions.get(topic_filter)
+            if sub is None:
+                return
+            for msg_callback in sub.exact:
+                self._run(msg_callback, msg)
+            if sub.narrower is not None:
+                for msg_callback in sub.narrower.match(msg.topic):
+                    self._run(msg_callback, msg)
+
+        return message_received
+
+    @staticmethod
+    def _run(msg_callback: Callable, msg) -> None:
+        try:
+            msg_callback(msg)
+        except Exception:  # pylint: disable=broad-except
+            # one failing config entry must not starve the others
+            _LOGGER.exception("Error handling message on %s", msg.topic)
+
+    @property
+    def topic_filters(self) -> dict[str, int]:
+        """Return subscribed topic filters with their QoS."""
+        return {
+            topic_filter: sub.qos for topic_filter, sub in self._subscriptions.items()
+        }
+
+    def __len__(self) -> int:
+        """Return number of registrations."""
+        return len(self._registrations)
+
+
+@callback
+def async_get_subscription_manager(hass: HomeAssistant) -> SubscriptionManager:
+    """Get subscription manager of the integration."""
+    try:
+        return hass.data[DATA_SUBSCRIPTIONS]
+    except KeyError:
+        manager = hass.data[DATA_SUBSCRIPTIONS] = SubscriptionManager(hass)
+        return manager
@@ -0,0 +1,182 @@
+"""MQTT topic routing for Sleep As Android messages."""
+from __future__ import annotations
+
+from .const import DEVICE_MACRO, TOPIC_ROUTER_CACHE_SIZE
+
+
+class TopicRouter:
+    """Precompiled matcher for the configured MQTT topic.
+
+    The configured topic is parsed once: the segment with DEVICE_MACRO is located and
+    split into a constant head and tail, so extracting a device name from an incoming
+    topic is a bounded split plus two slices. Resolved names are kept in a bounded
+    intern table, so a publisher that sprays distinct topics can not grow memory.
+    """
+
+    __slots__ = (
+        "configured_topic",
+        "subscription_topic",
+        "device_position",
+        "_has_macro",
+        "_head",
+        "_tail",
+        "_names",
+        "_max_size",
+    )
+
+    def __init__(
+        self, configured_topic: str, max_size: int = TOPIC_ROUTER_CACHE_SIZE
+    ) -> None:
+        """Compile router for configured_topic.
+
+        :param configured_topic: topic from configuration, may contain DEVICE_MACRO
+        :param max_size: maximum number of topics kept in the intern table
+        :raises ValueError: if multi-level wildcard is not the last topic segment
+        """
+        segments = configured_topic.split("/")
+        if "#" in segments[:-1]:
+            raise ValueError(
+                f"Multi-level wildcard must be the last segment of '{configured_topic}'"
+            )
+
+        self.configured_topic: str = configured_topic
+        self._names: dict[str, str | None] = {}
+        self._max_size: int = max_size
+        self._head: str = ""
+        self._tail: str = ""
+        self._has_macro: bool = False
+        # If we have no DEVICE_MACRO in configured_topic,
+        # then the last segment of topic is used as device name
+        self.device_position: int = len(segments)
+
+        for position, segment in enumerate(segments):
+            if DEVICE_MACRO in segment:
+                self._has_macro = True
+                self.device_position = position
+                self._head, self._tail = segment.split(DEVICE_MACRO, 1)
+                segments[position] = "+"
+                break
+
+        self.subscription_topic: str = "/".join(segments)
+
+    def device_name(self, topic: str) -> str | None:
+        """Get device name from full topic.
+
+        :param topic: full topic from MQTT message
+        :returns: device name or None if topic does not match configured topic
+        """
+        try:
+            return self._names[topic]
+        except KeyError:
+            pass
+
+        name = self._extract(topic)
+        if len(self._names) >= self._max_size:
+            # dicts keep insertion order: drop the oldest topic
+            del self._names[next(iter(self._names))]
+        self._names[topic] = name
+        return name
+
+    def _extract(self, topic: str) -> str | None:
+        if not self._has_macro:
+            return topic.rsplit("/", 1)[-1]
+
+        position = self.device_position
+        parts = topic.split("/", position + 1)
+        if position >= len(parts):
+            return None
+
+        segment = parts[position]
+        head, tail = self._head, self._tail
+        if len(segment) <= len(head) + len(tail):
+            return None
+        if not (segment.startswith(head) and segment.endswith(tail)):
+            return None
+
+        return segment[len(head) : len(segment) - len(tail)]
+
+    def clear(self) -> None:
+        """Forget all resolved topics."""
+        self._names.clear()
+
+    def __len__(self) -> int:
+        """Return number of topics in the intern table."""
+        return len(self._names)
+
+
+def filter_covers(wide: str, narrow: str) -> bool:
+    """Check if every topic matched by filter narrow is matched by filter wide.
+
+    :param wide: MQTT topic filter
+    :param narrow: MQTT topic filter
+    """
+    wide_segments = wide.split("/")
+    narrow_segments = narrow.split("/")
+    for position, segment in enumerate(wide_segments):
+        if segment == "#":
+            return True
+        if position >= len(narrow_segments):
+            return False
+        other = narrow_segments[position]
+        if other == "#" or (segment != "+" and segment != other):
+            return False
+    return len(wide_segments) == len(narrow_segments)
+
+
+class TopicFilterIndex:
+    """Trie of MQTT topic filters for finding filters that match a topic.
+
+    Matching walks one trie level per topic segment following the literal segment,
+    "+" and "#" children, so its cost does not depend on the number of filters.
+    Results are kept in a bounded table, the index is meant to be rebuilt on change.
+    """
+
+    __slots__ = ("_root", "_matches", "_max_size")
+
+    def __init__(self, max_size: int = TOPIC_ROUTER_CACHE_SIZE) -> None:
+        """Initialize empty index.
+
+        :param max_size: maximum number of topics kept in the result table
+        """
+        # node is (children by segment, values of filters ending at node)
+        self._root: tuple[dict, list] = ({}, [])
+        self._matches: dict[str, tuple] = {}
+        self._max_size = max_size
+
+    def add(self, topic_filter: str, value) -> None:
+        """Add value for topic filter."""
+        node = self._root
+        for segment in topic_filter.split("/"):
+            node = node[0].setdefault(segment, ({}, []))
+        node[1].append(value)
+        self._matches.clear()
+
+    def match(self, topic: str) -> tuple:
+        """Get values of all filters matching topic."""
+        try:
+            return self._matches[topic]
+        except KeyError:
+            pass
+
+        found: list = []
+        self._walk(self._root, topic.split("/"), 0, found)
+        result = tuple(found)
+        if len(self._matches) >= self._max_size:
+            del self._matches[next(iter(self._matches))]
+        self._matches[topic] = result
+        return result
+
+    def _walk(
+        self, node: tuple[dict, list], segments: list[str], position: int, found: list
+    ) -> None:
+        children = node[0]
+        if (rest := children.get("#")) is not None:
+            # "a/#" matches "a" as well as everything below it
+            found.extend(rest[1])
+        if position == len(segments):
+            found.extend(node[1])
+            return
+        if (child := children.get(segments[position])) is not None:
+            self._walk(child, segments, position + 1, found)
+        if (child := children.get("+")) is not None:
+            self._walk(child, segments, position + 1, found)
@@ -0,0 +1,168 @@
+"""Bounded per-device queue of MQTT messages."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import logging
+import re
+from typing import Any, Callable, Coroutine, Hashable
+
+from .const import (
+    QUEUE_BATCH_SIZE,
+    QUEUE_POLICY_BLOCK,
+    QUEUE_POLICY_COALESCE,
+    QUEUE_POLICY_DROP_OLDEST,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_EVENT_FIELD = r'"event"\s*:\s*"((?:[^"\\]|\\.)*)"'
+_EVENT_FIELD_STR = re.compile(_EVENT_FIELD)
+_EVENT_FIELD_BYTES = re.compile(_EVENT_FIELD.encode())
+
+
+def event_type(msg) -> Hashable | None:
+    """Event type of MQTT message, used for coalescing.
+
+    Only the event field is looked up: payload is decoded when message is processed.
+    """
+    payload = msg.payload
+    if isinstance(payload, str):
+        match = _EVENT_FIELD_STR.search(payload)
+    elif isinstance(payload, bytes):
+        match = _EVENT_FIELD_BYTES.search(payload)
+    else:
+        return None
+    return None if match is None else match.group(1)
+
+
+class DeviceQueue:
+    """Queue of messages from one device drained by a worker task.
+
+    Policies:
+    - drop_oldest: if queue is full, oldest queued message is dropped;
+    - coalesce: if queue is full, the latest queued message of the same event type is
+      removed and the new message is queued at the end; if there is no such message,
+      oldest queued message is dropped;
+    - block: if queue is full, oldest queued message is processed right away by the
+      caller, so nothing is dropped and the publisher is slowed down to processing
+      speed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[Any], None],
+        create_task: Callable[[Coroutine], asyncio.Task],
+        policy: str = QUEUE_POLICY_DROP_OLDEST,
+        maxsize: int = 100,
+    ) -> None:
+        """Initialize queue.
+
+        :param name: device name, used for logging
+        :param process: callback for processing message
+        :param create_task: function for starting worker task
+        :param policy: what to do with new message if queue is full
+        :param maxsize: maximum number of queued messages
+        """
+        self.name = name
+        self.policy = policy
+        self.maxsize = maxsize
+        self._process = process
+        self._create_task = create_task
+        # (event type, sequence number) -> message, in arrival order
+        self._queue: OrderedDict[tuple[Hashable, int], Any] = OrderedDict()
+        # event type -> sequence number of the latest queued message of the type
+        self._latest: dict[Hashable, int] = {}
+        self._sequence: int = 0
+        self._task: asyncio.Task | None = None
+
+        self.max_depth: int = 0
+        self.processed: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+
+    @property
+    def depth(self) -> int:
+        """Return number of queued messages."""
+        return len(self._queue)
+
+    def put(self, msg) -> None:
+        """Queue message and make sure that worker is running."""
+        key = event_type(msg) if self.policy == QUEUE_POLICY_COALESCE else None
+
+        if len(self._queue) >= self.maxsize:
+            if key is not None and key in self._latest:
+                # superseded message leaves the queue, new one keeps arrival order
+                del self._queue[(key, self._latest[key])]
+                self.coalesced += 1
+            elif self.policy == QUEUE_POLICY_BLOCK:
+                self._process_next()
+            else:
+                self._pop()
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % self.maxsize == 0:
+                    _LOGGER.warning(
+                        "Queue for %s is full: dropped %d messages so far",
+                        self.name,
+                        self.dropped,
+                    )
+
+        sequence = self._sequence
+        self._sequence += 1
+        self._queue[(key, sequence)] = msg
+        if key is not None:
+            self._latest[key] = sequence
+        self.max_depth = max(self.max_depth, len(self._queue))
+
+        if self._task is None:
+            self._task = self._create_task(self._async_drain())
+
+    def _pop(self):
+        (key, sequence), msg = self._queue.popitem(last=False)
+        if key is not None and self._latest[key] == sequence:
+            del self._latest[key]
+        return msg
+
+    def _process_next(self) -> None:
+        self._process(self._pop())
+        self.processed += 1
+
+    def _process_queued(self, count: int) -> None:
+        """Process oldest queued messages, one failing message does not stop others."""
+        for _ in range(count):
+            try:
+                self._process_next()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error processing message for %s", self.name)
+
+    async def _async_drain(self) -> None:
+        """Process queued messages, yielding to event loop between batches."""
+        try:
+            while self._queue:
+                self._process_queued(min(QUEUE_BATCH_SIZE, len(self._queue)))
+                await asyncio.sleep(0)
+        finally:
+            self._task = None
+
+    def flush(self) -> None:
+        """Process all queued messages right away, in arrival order."""
+        self._process_queued(len(self._queue))
+
+    def stop(self) -> None:
+        """Stop worker and forget queued messages."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._queue.clear()
+        self._latest.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return queue statistics."""
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
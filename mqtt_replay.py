@@ -0,0 +1,69 @@
+"""Replay captured Sleep As Android MQTT messages to a broker.
+
+Usage: python mqtt_replay.py capture.bin --host localhost --speed 10
+"""
+import argparse
+import asyncio
+import importlib.util
+from pathlib import Path
+import sys
+
+import paho.mqtt.client as mqtt
+
+
+def load_capture():
+    """Load capture module of the integration without importing Home Assistant."""
+    path = Path(__file__).parent / "custom_components/sleep_as_android/capture.py"
+    spec = importlib.util.spec_from_file_location("sleep_as_android_capture", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="capture file recorded by the integration")
+    parser.add_argument("--host", default="localhost", help="MQTT broker host")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("--username", help="MQTT username")
+    parser.add_argument("--password", help="MQTT password")
+    parser.add_argument("--qos", type=int, default=0, help="QoS for published messages")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="1 for real time, N for N times faster, 0 for maximum speed",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    capture = load_capture()
+    client = mqtt.Client()
+    if args.username:
+        client.username_pw_set(args.username, args.password)
+    client.connect(args.host, args.port)
+    client.loop_start()
+
+    def publish(msg):
+        client.publish(msg.topic, msg.payload, qos=args.qos)
+
+    try:
+        count = asyncio.run(
+            capture.replay(
+                capture.read_messages(args.capture),
+                publish,
+                speed=args.speed or None,
+                encoding=None,
+            )
+        )
+        print(f"Replayed {count} messages")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
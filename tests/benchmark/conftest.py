@@ -0,0 +1,29 @@
+"""Benchmark settings: opt-in marker and regression thresholds."""
+import os
+
+import pytest
+
+BENCHMARK_VARIABLE = "SAA_BENCHMARK"
+"""Benchmarks run only when this environment variable is set."""
+
+
+def pytest_configure(config):
+    """Register benchmark marker."""
+    config.addinivalue_line(
+        "markers", f"benchmark: timing benchmark, runs when {BENCHMARK_VARIABLE} is set"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip benchmarks unless they are enabled explicitly."""
+    if os.environ.get(BENCHMARK_VARIABLE):
+        return
+    skip = pytest.mark.skip(reason=f"set {BENCHMARK_VARIABLE}=1 to run benchmarks")
+    for item in items:
+        if item.get_closest_marker("benchmark") is not None:
+            item.add_marker(skip)
+
+
+def threshold(name: str, default: float) -> float:
+    """Regression threshold, may be overridden by SAA_BENCH_<NAME> variable."""
+    return float(os.environ.get(f"SAA_BENCH_{name.upper()}", default))
@@ -0,0 +1,62 @@
+"""Micro-benchmark for payload decoding."""
+
+import json
+import timeit
+from unittest.mock import patch
+
+from homeassistant.const import STATE_UNAVAILABLE
+import pytest
+
+from custom_components.sleep_as_android import decoder
+from custom_components.sleep_as_android.decoder import decode
+
+PAYLOADS = [
+    json.dumps({"event": event, "value1": str(1582719660934 + i), "value2": "label"})
+    for i, event in enumerate(
+        ["light_sleep", "deep_sleep", "awake", "rem", "sound_event_snore"] * 200
+    )
+]
+ATTRIBUTES = {"value1": "timestamp", "value2": "label"}
+
+pytestmark = pytest.mark.benchmark
+
+
+def legacy_decode(payload: str) -> dict:
+    """Decode payload the way sensor did it before typed decoder."""
+    data = json.loads(payload)
+    attributes = {}
+    for k, v in ATTRIBUTES.items():
+        attributes[v] = data.get(k, STATE_UNAVAILABLE)
+    return {"event": data["event"], **attributes}
+
+
+def typed_decode(payload: str):
+    """Decode payload with typed decoder and read all values."""
+    event = decode(payload)
+    return event.event, event.value1, event.value2, event.value3
+
+
+def _messages_per_second(func) -> float:
+    def run():
+        for payload in PAYLOADS:
+            func(payload)
+
+    best = min(timeit.repeat(run, number=5, repeat=5))
+    return len(PAYLOADS) * 5 / best
+
+
+@pytest.mark.parametrize("parser", ["json", "orjson"])
+def test_decoder_throughput(parser):
+    """Typed decoder keeps at least 80% of throughput of generic json.loads path.
+
+    The margin absorbs timing noise of shared test machines.
+    """
+    if parser == "orjson":
+        json_loads = pytest.importorskip("orjson").loads
+    else:
+        json_loads = decoder.loads
+    legacy = _messages_per_second(legacy_decode)
+    with patch.object(decoder, "json_loads", json_loads):
+        typed = _messages_per_second(typed_decode)
+    print(f"\n{parser}: legacy: {legacy:,.0f} msg/s, typed: {typed:,.0f} msg/s")
+    assert typed >= legacy * 0.8
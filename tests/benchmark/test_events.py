@@ -0,0 +1,77 @@
+"""Benchmark of event bus overhead per message."""
+
+import time
+from unittest.mock import MagicMock, patch
+
+from homeassistant.core import callback
+import pytest
+
+from custom_components.sleep_as_android.const import (
+    DEVICE_TRIGGER_EVENT,
+    DOMAIN,
+    EVENT_MODE_BOTH,
+    EVENT_MODE_DEVICE,
+    EVENT_MODE_DOMAIN,
+)
+from custom_components.sleep_as_android.sensor import SleepAsAndroidSensor
+
+MESSAGES = 5000
+EVENTS = ["light_sleep", "deep_sleep", "awake", "rem"]
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.fixture
+def sensor(hass):
+    """Sensor with real event bus."""
+    entry = MagicMock()
+    entry.entry_id = "benchmark"
+    instance = MagicMock()
+    instance.create_entity_id.side_effect = lambda name: "benchmark_" + name
+    hass.data[DOMAIN] = {entry.entry_id: instance}
+    with patch.object(SleepAsAndroidSensor, "async_write_ha_state"):
+        yield SleepAsAndroidSensor(hass, entry, "phone")
+
+
+async def _us_per_message(hass, emit) -> float:
+    started = time.perf_counter()
+    for i in range(MESSAGES):
+        emit(EVENTS[i % len(EVENTS)])
+    await hass.async_block_till_done()
+    return (time.perf_counter() - started) / MESSAGES * 1e6
+
+
+async def test_bus_overhead(hass, sensor):
+    """Report bus cost of event modes and of firing with the thread-safe API.
+
+    Numbers depend on the machine, so only firing one event instead of two is
+    checked.
+    """
+
+    def legacy(state):
+        hass.bus.fire(sensor.name, {"event": state})
+        hass.bus.async_fire(DEVICE_TRIGGER_EVENT, {"device_id": "id", "type": state})
+
+    def mode(event_mode):
+        def emit(state):
+            sensor._instance.event_mode = event_mode
+            sensor._emit(state)
+
+        return emit
+
+    # listeners make bus do the same work as with automations attached
+    hass.bus.async_listen(sensor.name, callback(lambda event: None))
+    hass.bus.async_listen(DEVICE_TRIGGER_EVENT, callback(lambda event: None))
+
+    results = {
+        "legacy": await _us_per_message(hass, legacy),
+        EVENT_MODE_BOTH: await _us_per_message(hass, mode(EVENT_MODE_BOTH)),
+        EVENT_MODE_DEVICE: await _us_per_message(hass, mode(EVENT_MODE_DEVICE)),
+        EVENT_MODE_DOMAIN: await _us_per_message(hass, mode(EVENT_MODE_DOMAIN)),
+    }
+    print(
+        "\n"
+        + ", ".join(f"{name}: {value:.1f} us/msg" for name, value in results.items())
+    )
+
+    assert results[EVENT_MODE_DOMAIN] < results[EVENT_MODE_BOTH]
@@ -0,0 +1,86 @@
+"""Benchmarks for MQTT message ingestion."""
+
+import gc
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+from ..ingestion import synthetic_messages
+from .conftest import threshold
+
+MESSAGES = 20000
+
+pytestmark = pytest.mark.benchmark
+
+
+def _percentile(samples: list[int], percent: int) -> float:
+    return statistics.quantiles(samples, n=100)[percent - 1]
+
+
+@pytest.mark.parametrize("devices", [1, 10, 100, 1000, 10000])
+async def test_ingestion(ingestion_factory, devices):
+    """Drive message callback and check throughput, latency and memory."""
+    ingestion = await ingestion_factory()
+    callback = ingestion.message_received
+
+    # create sensors for all devices before measuring
+    for msg in synthetic_messages(devices, devices, seed=0):
+        callback(msg)
+    messages = synthetic_messages(devices, MESSAGES)
+
+    gc.collect()
+    gc.disable()
+    try:
+        blocks_before = sys.getallocatedblocks()
+        latencies = []
+        started = time.perf_counter()
+        for msg in messages:
+            t = time.perf_counter_ns()
+            callback(msg)
+            latencies.append(time.perf_counter_ns() - t)
+        elapsed = time.perf_counter() - started
+        blocks_per_message = (
+            sys.getallocatedblocks() - blocks_before - len(latencies)
+        ) / MESSAGES
+    finally:
+        gc.enable()
+
+    rate = MESSAGES / elapsed
+    p50 = _percentile(latencies, 50) / 1000
+    p99 = _percentile(latencies, 99) / 1000
+    print(
+        f"\n{devices} devices: {rate:,.0f} msg/s, p50 {p50:.1f} us, p99 {p99:.1f} us, "
+        f"{blocks_per_message:.2f} retained blocks/msg"
+    )
+
+    assert len(ingestion.sensors) == devices
+    assert rate >= threshold("min_rate", 2000)
+    assert p99 <= threshold("max_p99_us", 5000)
+    assert blocks_per_message <= threshold("max_blocks_per_message", 8)
+
+
+@pytest.mark.parametrize("devices", [100, 1000])
+async def test_memory_per_sensor(ingestion_factory, devices):
+    """Memory used by every new device."""
+    ingestion = await ingestion_factory()
+    messages = synthetic_messages(devices, devices)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for msg in messages:
+            ingestion.message_received(msg)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    per_sensor = (after - before) / devices
+    print(f"\n{devices} devices: {per_sensor / 1024:.1f} KiB per sensor")
+
+    assert len(ingestion.sensors) == devices
+    assert per_sensor <= threshold("max_bytes_per_sensor", 64 * 1024)
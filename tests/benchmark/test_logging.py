@@ -0,0 +1,52 @@
+"""Benchmarks for logging overhead on the ingestion path."""
+
+import gc
+import logging
+import time
+
+import pytest
+
+from ..ingestion import CountingMessage, synthetic_messages
+from .conftest import threshold
+
+MESSAGES = 20000
+
+
+def _run(callback, messages) -> float:
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter_ns()
+        for msg in messages:
+            callback(msg)
+        return (time.perf_counter_ns() - started) / len(messages)
+    finally:
+        gc.enable()
+
+
+@pytest.mark.benchmark
+async def test_debug_disabled_overhead(ingestion_factory, log_level):
+    """Per-message cost of logging calls when DEBUG is disabled."""
+    ingestion = await ingestion_factory()
+    callback = ingestion.message_received
+    for msg in synthetic_messages(100, 100, seed=0):
+        callback(msg)
+    messages = [
+        CountingMessage(msg.topic, msg.payload)
+        for msg in synthetic_messages(100, MESSAGES)
+    ]
+
+    logging.disable(logging.CRITICAL)
+    _run(callback, messages)  # warm up
+    silent = min(_run(callback, messages) for _ in range(3))
+    logging.disable(logging.NOTSET)
+
+    log_level(logging.INFO)
+    enabled = min(_run(callback, messages) for _ in range(3))
+    overhead = enabled - silent
+    print(
+        f"\nlogging disabled {silent / 1000:.2f} us/msg, "
+        f"INFO level {enabled / 1000:.2f} us/msg, overhead {overhead:.0f} ns/msg"
+    )
+
+    assert overhead <= threshold("max_log_overhead_ns", 1000)
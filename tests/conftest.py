@@ -4,7 +4,7 @@ from unittest.mock import AsyncMock, patch
 import pytest
 from pytest_homeassistant_custom_component.common import async_mock_service
 
-pytest_plugins = "pytest_homeassistant_custom_component"
+pytest_plugins = ["pytest_homeassistant_custom_component", "tests.ingestion"]
 
 
 @pytest.fixture(autouse=True)
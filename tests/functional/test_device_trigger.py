@@ -0,0 +1,142 @@
+"""Test device triggers dispatching."""
+from unittest.mock import patch
+
+from homeassistant.core import callback
+from homeassistant.helpers.device_registry import EVENT_DEVICE_REGISTRY_UPDATED
+import pytest
+import voluptuous as vol
+
+from custom_components.sleep_as_android.const import DEVICE_TRIGGER_EVENT, DOMAIN
+from custom_components.sleep_as_android.device_trigger import (
+    TRIGGER_SCHEMA,
+    TRIGGERS,
+    async_attach_trigger,
+    async_get_dispatcher,
+    async_get_trigger_cache,
+    async_get_triggers,
+    async_validate_trigger_config,
+)
+from custom_components.sleep_as_android.events import CATEGORY_TRIGGERS
+
+
+def _config(device_id: str, trigger_type: str) -> dict:
+    return {
+        "platform": "device",
+        "domain": DOMAIN,
+        "device_id": device_id,
+        "type": trigger_type,
+    }
+
+
+async def test_single_listener_for_all_triggers(hass):
+    """All attached triggers share one bus listener and only matching ones run."""
+    calls = []
+
+    @callback
+    def action(run_variables, context=None):
+        calls.append(run_variables["trigger"])
+
+    detach = []
+    for device_id in ("first", "second"):
+        for trigger_type in ("sleep_tracking_started", "awake", "rem"):
+            detach.append(
+                await async_attach_trigger(
+                    hass,
+                    _config(device_id, trigger_type),
+                    action,
+                    {"trigger_data": {"id": f"{device_id}_{trigger_type}"}},
+                )
+            )
+
+    assert hass.bus.async_listeners()[DEVICE_TRIGGER_EVENT] == 1
+    assert len(async_get_dispatcher(hass)) == 6
+
+    hass.bus.async_fire(DEVICE_TRIGGER_EVENT, {"device_id": "second", "type": "awake"})
+    await hass.async_block_till_done()
+
+    assert len(calls) == 1
+    assert calls[0]["id"] == "second_awake"
+    assert calls[0]["platform"] == "device"
+    assert calls[0]["event"].data["type"] == "awake"
+
+    for d in detach:
+        d()
+        d()  # detaching twice is harmless
+
+    assert len(async_get_dispatcher(hass)) == 0
+    assert DEVICE_TRIGGER_EVENT not in hass.bus.async_listeners()
+
+
+async def test_category_trigger(hass):
+    """Category trigger runs for every event of the category with concrete event."""
+    calls = []
+
+    @callback
+    def action(run_variables, context=None):
+        calls.append(run_variables["trigger"])
+
+    detach = await async_attach_trigger(
+        hass, _config("device", "any_sleep_stage"), action, {"trigger_data": {}}
+    )
+
+    for trigger_type in ("deep_sleep", "sound_event_snore", "rem"):
+        hass.bus.async_fire(
+            DEVICE_TRIGGER_EVENT, {"device_id": "device", "type": trigger_type}
+        )
+    await hass.async_block_till_done()
+
+    assert [call["sleep_event"] for call in calls] == ["deep_sleep", "rem"]
+    detach()
+
+
+async def test_get_triggers(hass):
+    """Device has triggers for every event and every category."""
+    triggers = await async_get_triggers(hass, "device")
+    types = [trigger["type"] for trigger in triggers]
+    assert types[: len(TRIGGERS)] == TRIGGERS
+    assert set(types[len(TRIGGERS) :]) == set(CATEGORY_TRIGGERS)
+
+
+async def test_triggers_are_cached(hass):
+    """Descriptors are built once per device and dropped with the device."""
+    first = await async_get_triggers(hass, "device")
+    first[0]["type"] = "changed"
+    second = await async_get_triggers(hass, "device")
+    assert second[0]["type"] == TRIGGERS[0]
+    assert len(async_get_trigger_cache(hass)) == 1
+
+    hass.bus.async_fire(
+        EVENT_DEVICE_REGISTRY_UPDATED, {"action": "remove", "device_id": "device"}
+    )
+    await hass.async_block_till_done()
+    assert len(async_get_trigger_cache(hass)) == 0
+
+
+async def test_trigger_config_is_validated_once(hass):
+    """Reattaching trigger with the same config skips validation."""
+    with patch(
+        "custom_components.sleep_as_android.device_trigger.TRIGGER_SCHEMA",
+        wraps=TRIGGER_SCHEMA,
+    ) as schema:
+        for _ in range(3):
+            detach = await async_attach_trigger(
+                hass, _config("device", "awake"), lambda *_: None, None
+            )
+            detach()
+        assert schema.call_count == 1
+
+        # same type with other options is validated on its own
+        config = {**_config("device", "awake"), "id": "morning"}
+        assert (await async_validate_trigger_config(hass, config))["id"] == "morning"
+        assert schema.call_count == 2
+
+        # callers get copies of validated config
+        validated = await async_validate_trigger_config(hass, config)
+        validated["type"] = "changed"
+        assert (await async_validate_trigger_config(hass, config))["type"] == "awake"
+        assert schema.call_count == 2
+
+        with pytest.raises(vol.Invalid):
+            await async_attach_trigger(
+                hass, _config("device", "unknown"), lambda *_: None, None
+            )
@@ -0,0 +1,200 @@
+"""Fake Home Assistant driving the ingestion path of the integration.
+
+Shared by unit tests and benchmarks, registered as plugin in tests/conftest.py.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import random
+from typing import Callable
+from unittest.mock import patch
+
+from homeassistant.const import Platform
+import pytest
+
+from custom_components.sleep_as_android import SleepAsAndroidInstance
+from custom_components.sleep_as_android.const import DOMAIN
+from custom_components.sleep_as_android.sensor import SleepAsAndroidSensor
+
+LOGGER = "custom_components.sleep_as_android"
+
+# relative weights of events during a typical night
+EVENT_MIX: dict[str, int] = {
+    "light_sleep": 30,
+    "deep_sleep": 20,
+    "awake": 15,
+    "rem": 10,
+    "not_awake": 5,
+    "sound_event_snore": 10,
+    "sound_event_talk": 3,
+    "sound_event_cough": 2,
+    "sleep_tracking_started": 1,
+    "sleep_tracking_stopped": 1,
+    "alarm_alert_start": 1,
+    "alarm_alert_dismiss": 1,
+    "unknown_event": 1,
+}
+
+
+class FakeBus:
+    """Event bus that drops events."""
+
+    def __init__(self):
+        """Initialize bus."""
+        self.fired = 0
+
+    def fire(self, event_type, event_data=None, *args, **kwargs):
+        """Fire event from any thread."""
+        self.fired += 1
+
+    def async_fire(self, event_type, event_data=None, *args, **kwargs):
+        """Fire event from event loop."""
+        self.fired += 1
+
+
+class FakeHass:
+    """Minimal Home Assistant replacement for the ingestion path."""
+
+    def __init__(self):
+        """Initialize hass."""
+        self.data = {}
+        self.bus = FakeBus()
+
+
+class FakeConfigEntry:
+    """Config entry of the integration."""
+
+    def __init__(self, entry_id: str = "benchmark", **options):
+        """Initialize entry."""
+        self.entry_id = entry_id
+        self.options = {
+            "name": "SleepAsAndroid",
+            "topic_template": "SleepAsAndroid/%%%device%%%",
+            **options,
+        }
+        self.data = {"qos": 0}
+
+
+class FakeMessage:
+    """MQTT message."""
+
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic: str, payload: str):
+        """Initialize message."""
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+
+
+def synthetic_messages(devices: int, count: int, seed: int = 42) -> list[FakeMessage]:
+    """Generate messages with realistic event mix spread over devices."""
+    rnd = random.Random(seed)
+    events = rnd.choices(list(EVENT_MIX), weights=list(EVENT_MIX.values()), k=count)
+    return [
+        FakeMessage(
+            f"SleepAsAndroid/device{i % devices}",
+            json.dumps(
+                {"event": event, "value1": str(1582719660934 + i), "value2": ""}
+            ),
+        )
+        for i, event in enumerate(events)
+    ]
+
+
+class Ingestion:
+    """Integration instance with captured MQTT callback."""
+
+    def __init__(self, instance: SleepAsAndroidInstance):
+        """Initialize ingestion."""
+        self.instance = instance
+        self.message_received: Callable | None = None
+        self.sensors: list[SleepAsAndroidSensor] = []
+        self.entities: list = []
+
+    def add_entities(self, entities, update_before_add=False):
+        """Add entities to Home Assistant immediately."""
+        for entity in entities:
+            self.entities.append(entity)
+            if isinstance(entity, SleepAsAndroidSensor):
+                self.sensors.append(entity)
+                entity._flush_pending()
+
+
+@pytest.fixture
+def ingestion_factory():
+    """Return factory of integration instances with captured MQTT callback."""
+
+    async def factory(**options) -> Ingestion:
+        hass = FakeHass()
+        entry = FakeConfigEntry(**options)
+        instance = SleepAsAndroidInstance(hass, entry, None)
+        hass.data[DOMAIN] = {entry.entry_id: instance}
+        captured = {}
+
+        def prepare(hass, new_state, topics):
+            (captured["topic"],) = topics.values()
+            return {}
+
+        async def subscribe(hass, sub_state=None, new_state=None, topics=None):
+            # Home Assistant before 2022.3 subscribes without prepare step
+            return sub_state if topics is None else prepare(hass, new_state, topics)
+
+        ingestion = Ingestion(instance)
+        with patch(
+            "custom_components.sleep_as_android.subscriptions.subscription."
+            "async_prepare_subscribe_topics",
+            side_effect=prepare,
+            create=True,
+        ), patch(
+            "custom_components.sleep_as_android.subscriptions.subscription."
+            "async_subscribe_topics",
+            side_effect=subscribe,
+        ):
+            await instance.subscribe_root_topic(ingestion.add_entities)
+        instance.async_set_add_entities(ingestion.add_entities, Platform.BINARY_SENSOR)
+
+        ingestion.message_received = captured["topic"]["msg_callback"]
+        return ingestion
+
+    # debug records captured by the test run must not be measured
+    logger = logging.getLogger(LOGGER)
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with patch.object(
+            SleepAsAndroidSensor, "async_write_ha_state", lambda self: None
+        ):
+            yield factory
+    finally:
+        logger.setLevel(level)
+
+
+class CountingMessage(FakeMessage):
+    """Message that counts how many times it was formatted for logging."""
+
+    __slots__ = ()
+    formatted = 0
+
+    def __repr__(self):
+        """Return representation, counting the call."""
+        CountingMessage.formatted += 1
+        return f"CountingMessage({self.topic!r}, {self.payload!r})"
+
+    __str__ = __repr__
+
+
+@pytest.fixture
+def log_level():
+    """Set level of integration logger, restoring it afterwards."""
+    logger = logging.getLogger(LOGGER)
+    level = logger.level
+
+    def set_level(new_level: int):
+        logger.setLevel(new_level)
+
+    yield set_level
+    logger.setLevel(level)
+    logging.disable(logging.NOTSET)
@@ -0,0 +1,184 @@
+"""Tests for alarms."""
+from datetime import date, datetime, time, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from custom_components.sleep_as_android.alarm import (
+    Alarm,
+    AlarmSchedule,
+    AlarmScheduler,
+)
+from custom_components.sleep_as_android.const import ALARM_EVENT
+
+TZ = timezone(timedelta(hours=3))
+# Wednesday
+NOW = datetime(2022, 3, 2, 12, 0, tzinfo=TZ)
+
+
+def _alarm(at: str, start: date = NOW.date(), repeat=(), label="", owner="entry"):
+    return Alarm.from_config(
+        owner,
+        {"label": label, "time": at, "date": str(start), "repeat": list(repeat)},
+        tz=TZ,
+    )
+
+
+class TestAlarm:
+    """Tests for next occurrence of alarm."""
+
+    def test_once(self):
+        """One-time alarm fires once."""
+        alarm = _alarm("13:00")
+        assert alarm.next_after(NOW) == datetime(2022, 3, 2, 13, 0, tzinfo=TZ)
+        assert alarm.next_after(NOW + timedelta(hours=1)) is None
+
+    def test_repeat(self):
+        """Repeating alarm fires on selected weekdays."""
+        alarm = _alarm("07:30", repeat=["Monday", "Friday"])
+        first = alarm.next_after(NOW)
+        assert first == datetime(2022, 3, 4, 7, 30, tzinfo=TZ)
+        assert alarm.next_after(first) == datetime(2022, 3, 7, 7, 30, tzinfo=TZ)
+
+    def test_repeat_starts_at_date(self):
+        """Repetitions start at alarm date."""
+        alarm = _alarm("07:30", start=date(2022, 3, 20), repeat=["Wednesday"])
+        assert alarm.next_after(NOW) == datetime(2022, 3, 23, 7, 30, tzinfo=TZ)
+
+    def test_objects_from_options_flow(self):
+        """Time and date objects are accepted too."""
+        alarm = Alarm.from_config(
+            "entry", {"time": time(13, 0), "date": NOW.date(), "repeat": []}, tz=TZ
+        )
+        assert alarm.next_after(NOW) == datetime(2022, 3, 2, 13, 0, tzinfo=TZ)
+
+    def test_invalid(self):
+        """Invalid repeat day is rejected."""
+        with pytest.raises(ValueError):
+            _alarm("07:30", repeat=["Caturday"])
+
+
+class TestAlarmSchedule:
+    """Tests for alarm heap."""
+
+    def test_earliest_first(self):
+        """Alarms of all owners are due in time order."""
+        schedule = AlarmSchedule()
+        schedule.set_alarms("a", [_alarm("15:00", owner="a")], NOW)
+        schedule.set_alarms(
+            "b", [_alarm("13:00", owner="b"), _alarm("14:00", owner="b")], NOW
+        )
+        assert schedule.next_time == datetime(2022, 3, 2, 13, 0, tzinfo=TZ)
+
+        due = schedule.pop_due(datetime(2022, 3, 2, 14, 30, tzinfo=TZ))
+        assert [at.hour for _, at in due] == [13, 14]
+        assert len(schedule) == 1
+
+    def test_replace(self):
+        """Replaced alarms do not fire."""
+        schedule = AlarmSchedule()
+        schedule.set_alarms("a", [_alarm("13:00", owner="a")], NOW)
+        schedule.set_alarms("a", [_alarm("14:00", owner="a")], NOW)
+        assert schedule.next_time.hour == 14
+        assert len(schedule) == 1
+
+        schedule.set_alarms("a", [], NOW)
+        assert schedule.next_time is None
+        assert len(schedule) == 0
+
+    def test_repetitions(self):
+        """Repeating alarm is rescheduled after firing, missed ones are skipped."""
+        schedule = AlarmSchedule()
+        schedule.set_alarms("a", [_alarm("07:30", repeat=["Thursday"])], NOW)
+
+        late = datetime(2022, 3, 17, 9, 0, tzinfo=TZ)
+        (due,) = schedule.pop_due(late)
+        assert due[1] == datetime(2022, 3, 3, 7, 30, tzinfo=TZ)
+        assert schedule.next_time == datetime(2022, 3, 24, 7, 30, tzinfo=TZ)
+
+    def test_many_alarms(self):
+        """Hundreds of alarms are kept in one heap."""
+        schedule = AlarmSchedule()
+        for owner in range(10):
+            schedule.set_alarms(
+                str(owner),
+                [
+                    _alarm(f"{hour:02}:{minute:02}", repeat=["Monday"])
+                    for hour in range(24)
+                    for minute in (0, 30)
+                ],
+                NOW,
+            )
+        for owner in range(5):
+            schedule.set_alarms(str(owner), [], NOW)
+        assert len(schedule) == 5 * 48
+        assert len(schedule._heap) <= 2 * 5 * 48
+
+
+class TestAlarmScheduler:
+    """Tests for firing alarms with a single timer."""
+
+    @pytest.fixture
+    def clock(self):
+        """Frozen clock in time zone of alarms."""
+        with patch(
+            "custom_components.sleep_as_android.alarm.dt_util.DEFAULT_TIME_ZONE", TZ
+        ):
+            yield MagicMock(return_value=NOW)
+
+    @patch(
+        "custom_components.sleep_as_android.alarm.mqtt.async_publish",
+        new_callable=AsyncMock,
+    )
+    @patch("custom_components.sleep_as_android.alarm.async_track_point_in_utc_time")
+    async def test_single_timer(self, mocked_track, mocked_publish, clock):
+        """Only the earliest alarm has a timer."""
+        hass = MagicMock()
+        scheduler = AlarmScheduler(hass, clock)
+        alarms = [
+            {
+                "label": str(i),
+                "time": f"{13 + i // 60:02}:{i % 60:02}",
+                "date": "2022-03-02",
+            }
+            for i in range(200)
+        ]
+        scheduler.async_set_alarms("entry", alarms, topic="saa/alarm")
+
+        mocked_track.assert_called_once()
+        fire, at = mocked_track.call_args.args[1:]
+        assert at == datetime(2022, 3, 2, 13, 0, tzinfo=TZ)
+
+        clock.return_value = at
+        fire(at)
+        hass.bus.async_fire.assert_called_once()
+        assert hass.bus.async_fire.call_args.args[0] == ALARM_EVENT
+        assert hass.bus.async_fire.call_args.args[1]["label"] == "0"
+        # publishing is scheduled as a task
+        await hass.async_create_task.call_args.args[0]
+        mocked_publish.assert_awaited_once()
+        assert mocked_publish.call_args.args[1] == "saa/alarm"
+        # timer is armed again for the next alarm
+        assert mocked_track.call_count == 2
+        assert mocked_track.call_args.args[2] == datetime(2022, 3, 2, 13, 1, tzinfo=TZ)
+
+    @patch("custom_components.sleep_as_android.alarm.async_track_point_in_utc_time")
+    def test_invalid_alarm_is_ignored(self, mocked_track, clock):
+        """Invalid alarm does not prevent scheduling of others."""
+        scheduler = AlarmScheduler(MagicMock(), clock)
+        scheduler.async_set_alarms(
+            "entry",
+            [
+                {"time": "25:00", "date": "2022-03-02"},
+                {"time": "13:00", "date": "2022-03-02"},
+            ],
+        )
+        assert len(scheduler.schedule) == 1
+
+    @patch("custom_components.sleep_as_android.alarm.async_track_point_in_utc_time")
+    def test_timer_is_cancelled(self, mocked_track, clock):
+        """Timer is cancelled when alarms are removed."""
+        scheduler = AlarmScheduler(MagicMock(), clock)
+        scheduler.async_set_alarms("entry", [{"time": "13:00", "date": "2022-03-02"}])
+        scheduler.async_set_alarms("entry", [])
+        mocked_track.return_value.assert_called_once()
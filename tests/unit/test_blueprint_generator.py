@@ -0,0 +1,73 @@
+"""Tests for blueprint generator."""
+import pytest
+import ruamel.yaml
+
+import blueprint_generator
+from custom_components.sleep_as_android.device_trigger import TRIGGERS
+from custom_components.sleep_as_android.events import CATEGORY_EVENTS
+
+
+def _load(blueprint: dict) -> dict:
+    """Load generated YAML back, as Home Assistant would import it."""
+    return ruamel.yaml.YAML().load(blueprint_generator.dump(blueprint))
+
+
+def _event_inputs(loaded: dict) -> list[str]:
+    return [
+        name
+        for name in loaded["blueprint"]["input"]
+        if name not in ("device", "person", "state")
+    ]
+
+
+def test_full():
+    """Full blueprint attaches a trigger per event."""
+    loaded = _load(blueprint_generator.build_blueprint())
+    assert len(loaded["trigger"]) == len(TRIGGERS)
+    assert len(loaded["action"][0]["choose"]) == len(TRIGGERS)
+    assert _event_inputs(loaded) == TRIGGERS
+
+
+def test_compact():
+    """Compact blueprint attaches a single event trigger for the device."""
+    loaded = _load(blueprint_generator.build_blueprint(compact=True))
+    (trigger,) = loaded["trigger"]
+    assert trigger["platform"] == "event"
+    assert trigger["event_data"]["device_id"].tag.value == "!input"
+    assert _event_inputs(loaded) == TRIGGERS
+    assert (
+        loaded["action"][0]["choose"][0]["conditions"]
+        == "{{ trigger.event.data.type == 'sleep_tracking_started' }}"
+    )
+
+
+@pytest.mark.parametrize("category", list(CATEGORY_EVENTS))
+def test_category(category):
+    """Category blueprint attaches a single category trigger."""
+    loaded = _load(blueprint_generator.build_blueprint(category=category))
+    (trigger,) = loaded["trigger"]
+    assert trigger["type"] == f"any_{category}"
+    assert set(_event_inputs(loaded)) == CATEGORY_EVENTS[category]
+    assert len(loaded["action"][0]["choose"]) == len(CATEGORY_EVENTS[category])
+
+
+def test_selected_events():
+    """Only selected events get inputs and branches."""
+    loaded = _load(
+        blueprint_generator.build_blueprint(
+            category="sleep_stage", events=["awake", "rem", "lullaby_start"]
+        )
+    )
+    assert _event_inputs(loaded) == ["awake", "rem"]
+
+    with pytest.raises(ValueError):
+        blueprint_generator.build_blueprint(events=["unknown"])
+
+
+def test_all_categories(tmp_path, monkeypatch):
+    """Variant is written for every category."""
+    monkeypatch.chdir(tmp_path)
+    blueprint_generator.main(["--all-categories"])
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"blueprint_{category}.yaml" for category in CATEGORY_EVENTS
+    )
@@ -0,0 +1,102 @@
+"""Tests for per-instance caches."""
+
+import gc
+import weakref
+
+from custom_components.sleep_as_android.cache import (
+    LRUCache,
+    caches_info,
+    clear_caches,
+    lru_cache_method,
+)
+
+
+class Dummy:
+    """Class with cached method."""
+
+    def __init__(self):
+        """Initialize dummy."""
+        self.calls = 0
+
+    @lru_cache_method(maxsize=2)
+    def double(self, value: int) -> int:
+        """Return doubled value."""
+        self.calls += 1
+        return value * 2
+
+
+class TestLRUCache:
+    """Tests for LRUCache."""
+
+    def test_eviction(self):
+        """Least recently used value is evicted first."""
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_counters(self):
+        """Hits and misses are counted."""
+        cache = LRUCache(maxsize=2)
+        cache.get("a")
+        cache.put("a", 1)
+        cache.get("a")
+        assert cache.info() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 2}
+
+        cache.clear()
+        assert cache.info() == {"hits": 0, "misses": 0, "size": 0, "maxsize": 2}
+
+
+class TestLRUCacheMethod:
+    """Tests for lru_cache_method decorator."""
+
+    def test_cached_per_instance(self):
+        """Each instance has own cache."""
+        first, second = Dummy(), Dummy()
+        assert first.double(1) == 2
+        assert first.double(1) == 2
+        assert second.double(1) == 2
+        assert first.calls == 1
+        assert second.calls == 1
+        assert caches_info(first)["double"]["hits"] == 1
+
+    def test_bounded(self):
+        """Cache size is limited."""
+        dummy = Dummy()
+        for i in range(100):
+            dummy.double(i)
+        assert caches_info(dummy)["double"]["size"] == 2
+
+    def test_clear(self):
+        """Cleared cache calls method again."""
+        dummy = Dummy()
+        dummy.double(1)
+        clear_caches(dummy)
+        dummy.double(1)
+        assert dummy.calls == 2
+        assert caches_info(dummy)["double"]["misses"] == 1
+
+    def test_clear_by_name(self):
+        """Only named caches are dropped."""
+        dummy = Dummy()
+        dummy.double(1)
+        clear_caches(dummy, "other")
+        dummy.double(1)
+        assert dummy.calls == 1
+        clear_caches(dummy, "double")
+        dummy.double(1)
+        assert dummy.calls == 2
+
+    def test_does_not_keep_instance_alive(self):
+        """Cache must not pin instances like functools.cache does."""
+        dummy = Dummy()
+        dummy.double(1)
+        ref = weakref.ref(dummy)
+        del dummy
+        gc.collect()
+        assert ref() is None
@@ -0,0 +1,100 @@
+"""Tests for recording and replaying of MQTT messages."""
+
+import subprocess
+import sys
+
+import pytest
+
+from custom_components.sleep_as_android import capture
+from custom_components.sleep_as_android.capture import (
+    CapturedMessage,
+    MessageRecorder,
+    read_messages,
+    replay,
+)
+
+MESSAGES = [
+    CapturedMessage(100.0, "SleepAsAndroid/phone", b'{"event": "awake"}'),
+    CapturedMessage(100.5, "SleepAsAndroid/phone", b'{"event": "rem"}'),
+    CapturedMessage(102.5, "SleepAsAndroid/телефон", "не json".encode()),
+]
+
+
+@pytest.fixture
+def capture_file(tmp_path):
+    """Capture file with MESSAGES."""
+    path = str(tmp_path / "capture.bin")
+    recorder = MessageRecorder(path, flush_size=1)
+    for i, message in enumerate(MESSAGES):
+        payload = message.payload.decode() if i % 2 else message.payload
+        assert recorder.record(message.topic, payload, message.time) is True
+        # every flush appends to file, header must be written only once
+        recorder.flush()
+    assert recorder.recorded == len(MESSAGES)
+    return path
+
+
+def test_record_and_read(capture_file):
+    """Recorded messages are read back in order."""
+    assert list(read_messages(capture_file)) == MESSAGES
+
+
+def test_truncated_record(capture_file):
+    """Partially written last record is ignored."""
+    with open(capture_file, "rb+") as file:
+        file.truncate(file.seek(0, 2) - 3)
+    assert list(read_messages(capture_file)) == MESSAGES[:-1]
+
+
+def test_not_a_capture_file(tmp_path):
+    """Files without header are rejected."""
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"garbage")
+    with pytest.raises(ValueError):
+        list(read_messages(str(path)))
+
+
+@pytest.mark.parametrize(
+    "speed, delays", [(1, [0.5, 2.5]), (10, [0.05, 0.25]), (None, [])]
+)
+async def test_replay(capture_file, speed, delays):
+    """Messages are replayed with original timing scaled by speed.
+
+    Delays are counted from the start of replay, and fake sleep does not advance time.
+    """
+    received = []
+    waited = []
+
+    async def fake_sleep(delay):
+        waited.append(delay)
+
+    count = await replay(
+        read_messages(capture_file), received.append, speed=speed, sleep=fake_sleep
+    )
+
+    assert count == len(MESSAGES)
+    assert [m.topic for m in received] == [m.topic for m in MESSAGES]
+    assert received[0].payload == '{"event": "awake"}'
+    assert len(waited) == len(delays)
+    for actual, expected in zip(waited, delays):
+        assert actual == pytest.approx(expected, abs=0.01)
+
+
+async def test_replay_bytes(capture_file):
+    """Payload may be passed without decoding."""
+    received = []
+    await replay(
+        read_messages(capture_file), received.append, speed=None, encoding=None
+    )
+    assert [m.payload for m in received] == [m.payload for m in MESSAGES]
+
+
+def test_loads_without_home_assistant():
+    """Module is loaded from its path by mqtt_replay.py, without the integration."""
+    code = (
+        "import importlib.util, sys\n"
+        "sys.modules['homeassistant'] = None\n"
+        f"spec = importlib.util.spec_from_file_location('capture', {capture.__file__!r})\n"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
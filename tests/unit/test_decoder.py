@@ -0,0 +1,68 @@
+"""Tests for payload decoder."""
+
+from datetime import datetime, timezone
+import json
+
+import pytest
+
+from custom_components.sleep_as_android.decoder import PayloadDecodeError, decode, loads
+
+
+class TestDecode:
+    """Tests for decode."""
+
+    def test_all_values(self):
+        """All values of the event are decoded."""
+        event = decode(
+            '{"event": "alarm_alert_start", "value1": "1582719660934", '
+            '"value2": "label", "value3": "extra"}'
+        )
+        assert event.event == "alarm_alert_start"
+        assert event.value1 == "1582719660934"
+        assert event.value2 == "label"
+        assert event.value3 == "extra"
+        assert event.time == datetime(
+            2020, 2, 26, 12, 21, 0, 934000, tzinfo=timezone.utc
+        )
+
+    def test_bytes(self):
+        """Bytes payload is decoded."""
+        event = decode(b'{"event": "awake"}')
+        assert event.event == "awake"
+        assert event.value1 is None
+        assert event.time is None
+
+    @pytest.mark.parametrize("value1", ["label", "", None])
+    def test_value1_is_not_a_timestamp(self, value1):
+        """Time is None when value1 is not a timestamp."""
+        assert decode(json.dumps({"event": "awake", "value1": value1})).time is None
+
+    @pytest.mark.parametrize("payload", ["not json", "[1, 2]", "1", ""])
+    def test_invalid(self, payload):
+        """Payloads that are not JSON objects are rejected."""
+        with pytest.raises(PayloadDecodeError):
+            decode(payload)
+
+    def test_same_payload_is_decoded_once(self):
+        """Payload shared by several config entries is decoded once."""
+        payload = json.dumps({"event": "awake", "value1": "1"})
+        assert decode(payload) is decode(payload)
+        assert decode(payload) is not decode(json.dumps({"event": "awake"}))
+
+
+class TestLoads:
+    """Tests for JSON parser used without orjson."""
+
+    @pytest.mark.parametrize(
+        "payload",
+        ['{"event": "awake"}', ' {"event": "awake"}\n', b'{"event": "awake"}'],
+    )
+    def test_loads(self, payload):
+        """Payload is parsed like json.loads does."""
+        assert loads(payload) == {"event": "awake"}
+
+    @pytest.mark.parametrize("payload", ['{"event": "awake"} x', "not json", ""])
+    def test_invalid(self, payload):
+        """Invalid documents are rejected."""
+        with pytest.raises(ValueError):
+            loads(payload)
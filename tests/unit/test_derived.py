@@ -0,0 +1,71 @@
+"""Tests for derived binary states."""
+import pytest
+
+from custom_components.sleep_as_android.derived import (
+    DERIVED_STATES,
+    TRANSITIONS,
+    DerivedStates,
+    compile_transitions,
+)
+from custom_components.sleep_as_android.events import EVENTS
+
+
+def test_transitions_use_known_events():
+    """State machines are driven by known events."""
+    assert set(TRANSITIONS) <= EVENTS
+
+
+def test_compile_transitions():
+    """Transitions are indexed by event."""
+    transitions = compile_transitions(
+        {"a": {"start": True, "stop": False}, "b": {"start": False}}
+    )
+    assert transitions == {
+        "start": (("a", True), ("b", False)),
+        "stop": (("a", False),),
+    }
+
+
+class TestDerivedStates:
+    """Tests for state machines of a device."""
+
+    def test_unknown_until_set(self):
+        """States are unknown until an event sets them."""
+        states = DerivedStates()
+        assert states.values == dict.fromkeys(DERIVED_STATES)
+        assert states.update("sound_event_snore") == ()
+
+    @pytest.mark.parametrize(
+        "events,key,expected",
+        [
+            (["sleep_tracking_started"], "tracking", True),
+            (["sleep_tracking_started", "sleep_tracking_paused"], "tracking", False),
+            (["sleep_tracking_paused", "sleep_tracking_resumed"], "tracking", True),
+            (["sleep_tracking_started", "deep_sleep"], "sleeping", True),
+            (["deep_sleep", "awake"], "sleeping", False),
+            (["awake", "not_awake"], "sleeping", True),
+            (["alarm_alert_start"], "alarm_ringing", True),
+            (["alarm_alert_start", "alarm_snooze_clicked"], "alarm_ringing", False),
+            (["smart_period", "alarm_alert_start"], "smart_period", False),
+            (["lullaby_start", "lullaby_volume_down"], "lullaby", True),
+            (["lullaby_start", "lullaby_stop"], "lullaby", False),
+        ],
+    )
+    def test_state_machines(self, events, key, expected):
+        """Events switch derived states."""
+        states = DerivedStates()
+        for event in events:
+            states.update(event)
+        assert states.values[key] is expected
+
+    def test_changes_only(self):
+        """Only changed states are reported."""
+        states = DerivedStates()
+        assert states.update("light_sleep") == ["sleeping"]
+        assert states.update("deep_sleep") == []
+        assert sorted(states.update("sleep_tracking_stopped")) == [
+            "alarm_ringing",
+            "sleeping",
+            "smart_period",
+            "tracking",
+        ]
@@ -0,0 +1,36 @@
+"""Tests for event taxonomy."""
+from custom_components.sleep_as_android.events import (
+    CATEGORY_EVENTS,
+    CATEGORY_SLEEP_STAGE,
+    CATEGORY_TRIGGERS,
+    EVENT_CATEGORIES,
+    EVENT_CATEGORY_TRIGGERS,
+    EVENTS,
+)
+
+
+def test_categories_partition_events():
+    """Every event belongs to exactly one category."""
+    assert sum(len(events) for events in CATEGORY_EVENTS.values()) == len(EVENTS)
+    assert set().union(*CATEGORY_EVENTS.values()) == EVENTS
+    assert set(CATEGORY_EVENTS) == {
+        "tracking",
+        "alarm",
+        "sleep_stage",
+        "sound",
+        "lullaby",
+    }
+
+
+def test_category_triggers():
+    """Every event fires trigger of its category."""
+    assert CATEGORY_TRIGGERS["any_sleep_stage"] == CATEGORY_SLEEP_STAGE
+    for event, trigger_type in EVENT_CATEGORY_TRIGGERS.items():
+        assert CATEGORY_TRIGGERS[trigger_type] == EVENT_CATEGORIES[event]
+    assert CATEGORY_EVENTS[CATEGORY_SLEEP_STAGE] == {
+        "deep_sleep",
+        "light_sleep",
+        "rem",
+        "awake",
+        "not_awake",
+    }
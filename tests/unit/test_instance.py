@@ -1,15 +1,31 @@
 """Tests for instance component."""
 
+import asyncio
+import gc
+import logging
+import time
+import tracemalloc
 import unittest.mock as mock
-from unittest.mock import MagicMock, PropertyMock, patch
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, call, patch
 import uuid
+import weakref
 
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, Platform
 from homeassistant.helpers import entity_registry
 import pytest
 
 import custom_components.sleep_as_android
 from custom_components.sleep_as_android import SleepAsAndroidInstance
-from custom_components.sleep_as_android.const import DEVICE_MACRO, DOMAIN
+from custom_components.sleep_as_android.binary_sensor import BINARY_SENSORS
+from custom_components.sleep_as_android.const import (
+    DATA_ALARM_SCHEDULER,
+    DEFAULT_EVENT_MODE,
+    DEFAULT_QUEUE_POLICY,
+    DEVICE_MACRO,
+    DOMAIN,
+    QUEUE_POLICY_DROP_OLDEST,
+    QUEUE_POLICY_OFF,
+)
 
 SleepAsAndroidInstance_cache = SleepAsAndroidInstance
 hass = MagicMock()
@@ -17,6 +33,30 @@ config_entry = MagicMock()
 hass.data = {}
 
 
+class FakeSubscriptionManager:
+    """Subscription manager that does not keep callbacks."""
+
+    def __init__(self):
+        """Initialize manager."""
+        self.subscribed = 0
+
+    async def async_subscribe(self, topic_filter, qos, msg_callback):
+        """Count subscription."""
+        self.subscribed += 1
+        return AsyncMock()
+
+
+@pytest.fixture
+def subscription_manager():
+    """Patch subscription manager of the integration."""
+    manager = FakeSubscriptionManager()
+    with patch(
+        "custom_components.sleep_as_android.async_get_subscription_manager",
+        return_value=manager,
+    ):
+        yield manager
+
+
 @pytest.mark.skip
 class TestingSleepAsAndroidInstance(SleepAsAndroidInstance):
     """Dummy instance class for tests."""
@@ -29,21 +69,6 @@ class TestingSleepAsAndroidInstance(SleepAsAndroidInstance):
 class TestSleepAsAndroidInstance:
     """Tests for instance."""
 
-    @pytest.mark.parametrize(
-        "t, position, expect",
-        [
-            ("test", 1, "test"),
-            ("foo/bar/baz/moo", 2, "baz"),
-            ("foo/bar/baz/moo", 8, "moo"),
-        ],
-    )
-    def test_device_name_from_topic_and_position(self, t, position, expect):
-        """Check device name from topic and position."""
-        assert (
-            SleepAsAndroidInstance.device_name_from_topic_and_position(t, position)
-            == expect
-        )
-
     def test_device_position_in_topic(self):
         """Check for determination device name position in topic."""
         with patch(
@@ -62,7 +87,8 @@ class TestSleepAsAndroidInstance:
             ("foo/bar", 2, "foo/bar"),
             ("baz/%%%device%%%", 1, "baz/+"),
             ("foo/%%%device%%%/bar", 1, "foo/+/bar"),
-            ("foo/%%%device%%%baz/bar", 3, "foo/%%%device%%%baz/bar"),
+            ("foo/%%%device%%%baz/bar", 1, "foo/+/bar"),
+            ("foo/%%%device%%%/#", 1, "foo/+/#"),
         ],
     )
     @patch(
@@ -113,27 +139,28 @@ class TestSleepAsAndroidInstance:
         assert instance.name == "SleepAsAndroid"
 
     @pytest.mark.parametrize(
-        "t, position, expect",
+        "template, t, expect",
         [
-            ("test", 1, "test"),
-            ("foo/bar/baz/moo", 2, "baz"),
-            ("foo/bar/baz/moo", 8, "moo"),
+            ("test", "test", "test"),
+            ("foo/bar/%%%device%%%/moo", "foo/bar/baz/moo", "baz"),
+            ("foo/bar/baz/moo", "foo/bar/baz/moo", "moo"),
+            ("foo/%%%device%%%baz/#", "foo/moobaz/bar/baz", "moo"),
         ],
     )
     @patch(
-        __name__ + ".SleepAsAndroidInstance.device_position_in_topic",
+        __name__ + ".SleepAsAndroidInstance.configured_topic",
         new_callable=PropertyMock,
     )
     def test_device_name_from_topic(
         self,
-        mocked_device_position_in_topic,
+        mocked_configured_topic,
+        template,
         t,
-        position,
         expect,
     ):
         """Test for getting device name from topic."""
         instance = TestingSleepAsAndroidInstance(None, None, None)
-        mocked_device_position_in_topic.return_value = position
+        mocked_configured_topic.return_value = template
         assert instance.device_name_from_topic(t) == expect
 
     @pytest.mark.parametrize(
@@ -209,7 +236,10 @@ class TestAsyncSleepAsAndroidInstance:
     @patch("homeassistant.helpers.entity_registry.async_get_registry")
     @patch(__name__ + ".SleepAsAndroidInstance", spec=SleepAsAndroidInstance)
     async def test_async_setup_entry(
-        self, mocked_SleepAsAndroidInstance, mocked_entity_registry
+        self,
+        mocked_SleepAsAndroidInstance,
+        mocked_entity_registry,
+        subscription_manager,
     ):
         """Set up entry."""
         mocked_entry_id = PropertyMock(return_value=uuid.uuid4())
@@ -226,3 +256,398 @@ class TestAsyncSleepAsAndroidInstance:
             is True
         )
         assert ret is True
+        # subscribed before sensor platform is set up
+        assert subscription_manager.subscribed == 1
+
+    @patch("homeassistant.helpers.entity_registry.async_get_registry")
+    async def test_unload_stops_alarm_scheduler(
+        self, mocked_entity_registry, subscription_manager
+    ):
+        """Alarm scheduler is stopped when the last entry is unloaded."""
+        _hass = MagicMock()
+        _hass.data = {}
+        _hass.config_entries.async_unload_platforms = AsyncMock(return_value=True)
+        entries = []
+        for entry_id in ("first", "second"):
+            entry = MagicMock()
+            entry.entry_id = entry_id
+            entry.options = {"name": entry_id, "topic_template": "foo/%%%device%%%"}
+            entry.data = {"qos": 0}
+            await custom_components.sleep_as_android.async_setup_entry(_hass, entry)
+            entries.append(entry)
+        scheduler = _hass.data[DATA_ALARM_SCHEDULER]
+
+        with patch.object(scheduler, "async_stop") as async_stop:
+            await custom_components.sleep_as_android.async_unload_entry(
+                _hass, entries[0]
+            )
+            async_stop.assert_not_called()
+            await custom_components.sleep_as_android.async_unload_entry(
+                _hass, entries[1]
+            )
+            async_stop.assert_called_once()
+        assert DATA_ALARM_SCHEDULER not in _hass.data
+
+    @patch("homeassistant.helpers.entity_registry.async_get_registry")
+    async def test_reload_does_not_leak(
+        self, mocked_entity_registry, subscription_manager
+    ):
+        """Reloading an entry must not keep old instances or cached values alive."""
+        _hass = MagicMock()
+        _hass.data = {}
+        _hass.config_entries.async_unload_platforms = AsyncMock(return_value=True)
+        entry = MagicMock()
+        entry.entry_id = "reload"
+        entry.options = {"name": "foo", "topic_template": "foo/%%%device%%%"}
+        entry.data = {"qos": 0}
+        instances = weakref.WeakSet()
+
+        async def reload(iteration: int):
+            await custom_components.sleep_as_android.async_setup_entry(_hass, entry)
+            instance = _hass.data[DOMAIN][entry.entry_id]
+            instances.add(instance)
+            for device in range(10):
+                device_name = instance.device_name_from_topic(
+                    f"foo/device_{iteration}_{device}"
+                )
+                instance.device_name_from_entity_id(
+                    instance.create_entity_id(device_name)
+                )
+            assert await custom_components.sleep_as_android.async_unload_entry(
+                _hass, entry
+            )
+            assert instance.cache_info() == {"topic_router": {"size": 0}}
+            # mocks keep arguments of all calls
+            _hass.reset_mock()
+            entry.reset_mock()
+
+        # captured debug records are kept by the test run, not by the integration
+        logger = logging.getLogger("custom_components.sleep_as_android")
+        level = logger.level
+        logger.setLevel(logging.WARNING)
+        tracemalloc.start()
+        try:
+            for i in range(100):
+                await reload(i)
+            gc.collect()
+            baseline = tracemalloc.take_snapshot()
+            for i in range(100, 500):
+                await reload(i)
+            gc.collect()
+            current = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+            logger.setLevel(level)
+
+        assert len(instances) == 0
+
+        integration_filter = [tracemalloc.Filter(True, "*sleep_as_android*")]
+        growth = sum(
+            stat.size_diff
+            for stat in current.filter_traces(integration_filter).compare_to(
+                baseline.filter_traces(integration_filter), "filename"
+            )
+        )
+        assert growth < 16 * 1024
+
+    @pytest.mark.parametrize("prepare_api", [True, False])
+    async def test_subscribe_does_not_block_on_version(self, prepare_api):
+        """Subscribing must not wait for Home Assistant version lookup."""
+        entry = MagicMock()
+        entry.options = {"name": "foo", "topic_template": "foo/%%%device%%%"}
+        entry.data = {"qos": 0}
+        instance = SleepAsAndroidInstance(hass, entry, None)
+
+        prefix = "custom_components.sleep_as_android.subscriptions."
+        with patch(prefix + "PREPARE_SUBSCRIBE_TOPICS", prepare_api), patch(
+            prefix + "subscription.async_prepare_subscribe_topics", create=True
+        ) as mocked_prepare, patch(
+            prefix + "subscription.async_subscribe_topics", new_callable=AsyncMock
+        ) as mocked_subscribe:
+            started = time.perf_counter()
+            await asyncio.wait_for(
+                instance.subscribe_root_topic(MagicMock()), timeout=1
+            )
+            assert time.perf_counter() - started < 0.1
+
+        assert mocked_prepare.call_count == int(prepare_api)
+        mocked_subscribe.assert_awaited_once()
+        if not prepare_api:
+            assert "topics" in mocked_subscribe.await_args.kwargs
+
+
+class TestApplyOptions:
+    """Tests for applying changed options without reload."""
+
+    @pytest.fixture
+    def entry(self):
+        """Config entry with options."""
+        entry = MagicMock()
+        entry.entry_id = "options"
+        entry.data = {"name": "foo", "qos": 0}
+        entry.options = {"topic_template": "foo/%%%device%%%", "coalesce_window": 0}
+        return entry
+
+    @pytest.fixture
+    def instance_hass(self):
+        """Home Assistant with integration data."""
+        _hass = MagicMock()
+        _hass.data = {DOMAIN: {}}
+        return _hass
+
+    def _instance(self, _hass, entry, registry=None) -> SleepAsAndroidInstance:
+        instance = SleepAsAndroidInstance(_hass, entry, registry)
+        _hass.data[DOMAIN][entry.entry_id] = instance
+        return instance
+
+    @pytest.fixture
+    def manager(self):
+        """Subscription manager."""
+        manager = MagicMock()
+        manager.async_subscribe = AsyncMock(side_effect=lambda *args: AsyncMock())
+        with patch(
+            "custom_components.sleep_as_android.async_get_subscription_manager",
+            return_value=manager,
+        ):
+            yield manager
+
+    async def test_keeps_subscription(self, instance_hass, entry, manager):
+        """Options not related to topic are applied in place."""
+        instance = self._instance(instance_hass, entry)
+        await instance.subscribe_root_topic(MagicMock())
+        instance.get_sensor("phone")
+        assert instance.coalesce_window == 0
+
+        entry.options = {**entry.options, "coalesce_window": 5}
+        assert await instance.async_apply_options()
+
+        assert instance.coalesce_window == 5
+        assert "phone" in instance.sensors
+        manager.async_subscribe.assert_awaited_once()
+
+    async def test_options_are_resolved_once(self, instance_hass, entry, manager):
+        """Options used for every message are not looked up per message."""
+        instance = self._instance(instance_hass, entry)
+        with patch.object(instance, "get_from_config") as get_from_config:
+            assert instance.event_mode == DEFAULT_EVENT_MODE
+            assert instance.queue_policy == DEFAULT_QUEUE_POLICY
+            assert instance.coalesce_window == 0
+        get_from_config.assert_not_called()
+
+    async def test_queue_off_keeps_order(self, instance_hass, entry, manager):
+        """Queued messages are processed before messages arriving after queue off."""
+        entry.options = {**entry.options, "queue_policy": QUEUE_POLICY_DROP_OLDEST}
+        instance_hass.async_create_task.side_effect = asyncio.create_task
+        instance = self._instance(instance_hass, entry)
+        processed = []
+        sensor = MagicMock()
+        sensor.process_message.side_effect = processed.append
+        instance.get_queue("phone", sensor).put("queued")
+
+        entry.options = {**entry.options, "queue_policy": QUEUE_POLICY_OFF}
+        assert await instance.async_apply_options()
+
+        assert processed == ["queued"]
+        assert instance.queue_policy == QUEUE_POLICY_OFF
+
+    async def test_resubscribe_on_topic_change(self, instance_hass, entry, manager):
+        """New subscription is made before the old one is dropped."""
+        instance = self._instance(instance_hass, entry)
+        await instance.subscribe_root_topic(MagicMock())
+        old_unsubscribe = instance._unsubscribe
+
+        entry.options = {**entry.options, "topic_template": "bar/%%%device%%%"}
+        assert await instance.async_apply_options()
+
+        assert manager.async_subscribe.await_args.args[0] == "bar/+"
+        old_unsubscribe.assert_awaited_once()
+        assert instance.device_name_from_topic("bar/phone") == "phone"
+
+    async def test_reload_required(self, instance_hass, entry, manager):
+        """Options changing the set of entities require reload."""
+        _hass = instance_hass
+        _hass.config_entries.async_reload = AsyncMock()
+        instance = self._instance(_hass, entry)
+
+        entry.options = {**entry.options, "coalesce_window": 1}
+        await custom_components.sleep_as_android.async_update_options(_hass, entry)
+        _hass.config_entries.async_reload.assert_not_awaited()
+
+        entry.options = {**entry.options, "diagnostic_sensors": True}
+        assert not await instance.async_apply_options()
+        await custom_components.sleep_as_android.async_update_options(_hass, entry)
+        _hass.config_entries.async_reload.assert_awaited_once_with(entry.entry_id)
+
+    @patch("custom_components.sleep_as_android.dr.async_get")
+    async def test_rename(self, mocked_device_registry, instance_hass, entry, manager):
+        """Renaming changes unique ids of sensors and devices, not entity ids."""
+        registry = MagicMock()
+        registry.async_get_entity_id.side_effect = lambda _, __, unique_id: {
+            "foo_phone": "sensor.foo_phone",
+            "foo_phone/session": "sensor.foo_phone_session",
+        }.get(unique_id)
+        device = MagicMock()
+        device.id = "device"
+        mocked_device_registry.return_value.async_get_device.return_value = device
+        instance = self._instance(instance_hass, entry, registry)
+        instance.get_sensor("phone")
+
+        entry.options = {**entry.options, "name": "bar"}
+        assert await instance.async_apply_options()
+
+        assert instance.name == "bar"
+        assert instance.create_entity_id("phone") == "bar_phone"
+        assert registry.async_update_entity.call_args_list == [
+            call("sensor.foo_phone", new_unique_id="bar_phone"),
+            call("sensor.foo_phone_session", new_unique_id="bar_phone/session"),
+        ]
+        mocked_device_registry.return_value.async_update_device.assert_called_once_with(
+            "device", name="bar_phone", new_identifiers={(DOMAIN, "bar_phone")}
+        )
+
+
+class TestCapture:
+    """Tests for recording MQTT messages of the entry."""
+
+    @pytest.fixture
+    def instance(self, tmp_path, subscription_manager):
+        """Instance recording messages to capture file in tmp_path."""
+        _hass = MagicMock()
+        _hass.data = {DOMAIN: {}}
+        _hass.config.path.side_effect = lambda path: str(tmp_path / path)
+        _hass.async_create_task.side_effect = asyncio.create_task
+        _hass.async_add_executor_job = AsyncMock(
+            side_effect=lambda func, *args: func(*args)
+        )
+        entry = MagicMock()
+        entry.data = {"name": "foo", "qos": 0, "capture_file": "capture.bin"}
+        entry.options = {"topic_template": "foo/%%%device%%%"}
+        with patch(
+            "custom_components.sleep_as_android.async_track_time_interval"
+        ) as track:
+            instance = SleepAsAndroidInstance(_hass, entry, None)
+            instance._start_capture()
+            instance.interval = track.call_args.args[1]
+            instance.unsub_interval = track.return_value
+        return instance
+
+    async def test_periodic_flush(self, instance, tmp_path):
+        """Messages below flush size are written on the next interval."""
+        instance._recorder.record("foo/phone", "payload")
+        instance.interval(None)
+        await instance._capture_flush
+        assert (tmp_path / "capture.bin").read_bytes().endswith(b"foo/phonepayload")
+
+        instance.interval(None)
+        assert instance._capture_flush is None
+
+    async def test_flush_on_stop(self, instance, tmp_path):
+        """Remaining messages are written when Home Assistant stops."""
+        listen_once = instance.hass.bus.async_listen_once
+        event, on_stop = listen_once.call_args.args
+        assert event == EVENT_HOMEASSISTANT_STOP
+        instance._recorder.record("foo/phone", "payload")
+
+        await on_stop(MagicMock())
+
+        assert (tmp_path / "capture.bin").read_bytes().endswith(b"foo/phonepayload")
+        assert instance._recorder is None
+        instance.unsub_interval.assert_called_once()
+        # listen_once listener is gone after it was called
+        listen_once.return_value.assert_not_called()
+
+
+class TestStartup:
+    """Tests for subscribe-first startup."""
+
+    async def test_sensors_wait_for_platform(self):
+        """Sensors created before platform is set up are added in one batch."""
+        _hass = MagicMock()
+        _hass.data = {DOMAIN: {}}
+        entry = MagicMock()
+        entry.entry_id = "startup"
+        entry.options = {"name": "foo", "topic_template": "foo/%%%device%%%"}
+        entry.data = {"qos": 0}
+        instance = _hass.data[DOMAIN][entry.entry_id] = SleepAsAndroidInstance(
+            _hass, entry, None
+        )
+        manager = MagicMock()
+        manager.async_subscribe = AsyncMock()
+        with patch(
+            "custom_components.sleep_as_android.async_get_subscription_manager",
+            return_value=manager,
+        ):
+            await instance.subscribe_root_topic()
+        message_received = manager.async_subscribe.await_args.args[2]
+
+        msg = MagicMock()
+        msg.topic = "foo/phone"
+        msg.payload = '{"event": "awake", "value1": "1"}'
+        message_received(msg)
+        instance.async_restore_sensors(["phone", "tablet"])
+
+        add_entities = MagicMock()
+        instance.async_set_add_entities(add_entities)
+        (added,) = add_entities.call_args.args
+        assert [entity.unique_id for entity in added] == [
+            "foo_phone",
+            "foo_phone/session",
+            "foo_tablet",
+            "foo_tablet/session",
+        ]
+
+        # sensor keeps the message until it is added to Home Assistant
+        assert len(instance.sensors["phone"]._pending) == 1
+
+        add_binary_entities = MagicMock()
+        instance.async_set_add_entities(add_binary_entities, Platform.BINARY_SENSOR)
+        (added,) = add_binary_entities.call_args.args
+        assert len(added) == 2 * len(BINARY_SENSORS)
+        assert added[0].unique_id == "foo_phone_tracking"
+
+        instance.async_sensor_restored("tablet")
+        assert set(instance.metrics.startup) == {
+            "subscribed",
+            "registry_scanned",
+            "sensors_restored",
+        }
+
+
+class TestDeviceIndex:
+    """Tests for resolving device ids of sensors."""
+
+    @staticmethod
+    def _device(device_id: str, identifier: str) -> MagicMock:
+        device = MagicMock()
+        device.id = device_id
+        device.identifiers = {(DOMAIN, identifier), ("other", identifier)}
+        return device
+
+    @patch("custom_components.sleep_as_android.dr.async_entries_for_config_entry")
+    @patch("custom_components.sleep_as_android.dr.async_get")
+    def test_single_pass(self, mocked_device_registry, mocked_entries):
+        """Devices are indexed once, unknown devices are looked up."""
+        _hass = MagicMock()
+        mocked_entries.return_value = [
+            self._device(f"id_{i}", f"foo_device{i}") for i in range(100)
+        ]
+        registry = mocked_device_registry.return_value
+        registry.async_get_device.return_value = self._device("new", "foo_new")
+        instance = SleepAsAndroidInstance(_hass, MagicMock(), None)
+
+        for i in range(100):
+            assert instance.async_get_device_id(f"foo_device{i}") == f"id_{i}"
+        mocked_entries.assert_called_once()
+        registry.async_get_device.assert_not_called()
+
+        assert instance.async_get_device_id("foo_new") == "new"
+        assert instance.async_get_device_id("foo_new") == "new"
+        registry.async_get_device.assert_called_once()
+
+        # removed device is forgotten
+        (handler,) = [c.args[1] for c in _hass.bus.async_listen.call_args_list]
+        event = MagicMock()
+        event.data = {"action": "remove", "device_id": "id_1"}
+        handler(event)
+        registry.async_get_device.return_value = None
+        assert instance.async_get_device_id("foo_device1") is None
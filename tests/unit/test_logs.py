@@ -0,0 +1,121 @@
+"""Tests for logging helpers."""
+import logging
+from unittest.mock import MagicMock
+
+from custom_components.sleep_as_android.logs import RateLimitedLogger, TraceSampler
+
+from ..ingestion import LOGGER, CountingMessage, FakeMessage, synthetic_messages
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        """Initialize clock."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return current time."""
+        return self.now
+
+
+class TestRateLimitedLogger:
+    """Tests for RateLimitedLogger."""
+
+    def test_rate_limit(self):
+        """Repeated messages are suppressed and counted."""
+        logger = MagicMock()
+        logger.isEnabledFor.return_value = True
+        clock = FakeClock()
+        limited = RateLimitedLogger(logger, interval=60, clock=clock)
+
+        assert limited.warning(("phone", "x"), "Got %s", "x")
+        assert not limited.warning(("phone", "x"), "Got %s", "x")
+        assert not limited.warning(("phone", "x"), "Got %s", "x")
+        # other keys are not affected
+        assert limited.warning(("tablet", "x"), "Got %s", "x")
+
+        clock.now = 61
+        assert limited.warning(("phone", "x"), "Got %s", "x")
+        assert logger.log.call_args_list[-1].args == (
+            logging.WARNING,
+            "Got %s (%d similar messages suppressed)",
+            "x",
+            2,
+        )
+
+    def test_disabled_level(self):
+        """Nothing is done if level is disabled."""
+        logger = MagicMock()
+        logger.isEnabledFor.return_value = False
+        limited = RateLimitedLogger(logger)
+
+        assert not limited.warning("key", "message")
+        logger.log.assert_not_called()
+
+    def test_keys_are_bounded(self):
+        """Only maxsize keys are remembered."""
+        logger = MagicMock()
+        limited = RateLimitedLogger(logger, maxsize=2)
+        for key in range(10):
+            limited.warning(key, "message")
+        assert len(limited._keys) == 2
+
+
+class TestTraceSampler:
+    """Tests for TraceSampler."""
+
+    def test_every_nth(self):
+        """Every N-th message is sampled."""
+        sampler = TraceSampler(3)
+        assert sampler
+        assert [sampler.sample() for _ in range(6)] == [
+            False,
+            False,
+            True,
+            False,
+            False,
+            True,
+        ]
+
+    def test_disabled(self):
+        """Zero disables sampling."""
+        assert not TraceSampler(0)
+
+
+class TestIngestionLogging:
+    """Tests for logging on the ingestion path."""
+
+    async def test_messages_are_not_formatted(self, ingestion_factory, log_level):
+        """Messages are never formatted unless a message is really logged."""
+        log_level(logging.INFO)
+        ingestion = await ingestion_factory()
+        CountingMessage.formatted = 0
+        for msg in synthetic_messages(100, 1000):
+            ingestion.message_received(CountingMessage(msg.topic, msg.payload))
+        assert CountingMessage.formatted == 0
+
+    async def test_unknown_events_are_rate_limited(
+        self, ingestion_factory, log_level, caplog
+    ):
+        """Phone sending unknown events does not flood the log."""
+        log_level(logging.INFO)
+        ingestion = await ingestion_factory()
+        for i in range(1000):
+            ingestion.message_received(
+                FakeMessage(
+                    "SleepAsAndroid/phone",
+                    '{"event": "brand_new_event", "value1": "%d"}' % i,
+                )
+            )
+        warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+        assert len(warnings) == 1
+
+    async def test_trace_sampling(self, ingestion_factory, log_level, caplog):
+        """Trace mode logs one of N messages."""
+        log_level(logging.INFO)
+        ingestion = await ingestion_factory(trace_sample_rate=100)
+        for msg in synthetic_messages(10, 1000):
+            ingestion.message_received(msg)
+        traces = [r for r in caplog.records if r.name == f"{LOGGER}.trace"]
+        assert len(traces) == 10
@@ -0,0 +1,63 @@
+"""Tests for metrics."""
+from unittest.mock import patch
+
+from custom_components.sleep_as_android.metrics import (
+    STAGE_RECEIVE,
+    STAGES,
+    LatencyHistogram,
+    Metrics,
+)
+
+
+class TestLatencyHistogram:
+    """Tests for LatencyHistogram."""
+
+    def test_empty(self):
+        """Empty histogram reports zeros."""
+        histogram = LatencyHistogram()
+        assert histogram.percentile(99) == 0
+        assert histogram.as_dict()["mean_us"] == 0
+
+    def test_percentiles(self):
+        """Percentiles are estimated with bucket precision."""
+        histogram = LatencyHistogram()
+        for _ in range(99):
+            histogram.record(1000)
+        histogram.record(1_000_000)
+
+        assert 1000 <= histogram.percentile(50) < 2000
+        assert 1000 <= histogram.percentile(99) < 2000
+        assert histogram.percentile(100) == 1_000_000
+        assert histogram.as_dict()["max_us"] == 1000
+
+    def test_huge_duration(self):
+        """Durations beyond the last bucket are kept in it."""
+        histogram = LatencyHistogram()
+        histogram.record(1 << 60)
+        assert histogram.percentile(50) == 1 << 60
+
+
+class TestMetrics:
+    """Tests for Metrics."""
+
+    def test_as_dict(self):
+        """All stages are reported."""
+        metrics = Metrics()
+        metrics.record(STAGE_RECEIVE, 5000)
+        metrics.messages += 1
+
+        result = metrics.as_dict()
+        assert set(result["latency"]) == set(STAGES)
+        assert result["latency"][STAGE_RECEIVE]["count"] == 1
+        assert result["messages"] == 1
+
+    def test_messages_rate(self):
+        """Rate is measured since previous call."""
+        with patch(
+            "custom_components.sleep_as_android.metrics.time.monotonic",
+            side_effect=[100.0, 102.0, 104.0],
+        ):
+            metrics = Metrics()
+            metrics.messages = 10
+            assert metrics.messages_rate() == 5
+            assert metrics.messages_rate() == 0
@@ -0,0 +1,355 @@
+"""Tests for sensor component."""
+
+import json
+from unittest.mock import MagicMock, patch
+
+from homeassistant.helpers.entity import EntityCategory
+import pytest
+
+from custom_components.sleep_as_android.const import (
+    DEDUPE_INTERVAL,
+    DEVICE_TRIGGER_EVENT,
+    DOMAIN,
+    EVENT_MODE_BOTH,
+    EVENT_MODE_DEVICE,
+    EVENT_MODE_DOMAIN,
+    PENDING_MESSAGES_LIMIT,
+)
+from custom_components.sleep_as_android.metrics import STAGE_DECODE, Metrics
+from custom_components.sleep_as_android.sensor import (
+    SleepAsAndroidSensor,
+    async_setup_entry,
+)
+
+
+def _message(
+    event: str, timestamp: str = "1582719660934", label: str = ""
+) -> MagicMock:
+    msg = MagicMock()
+    msg.payload = json.dumps({"event": event, "value1": timestamp, "value2": label})
+    msg.retain = False
+    return msg
+
+
+@pytest.fixture
+def sensor():
+    """Sensor that is not added to Home Assistant yet."""
+    _hass = MagicMock()
+    entry = MagicMock()
+    entry.entry_id = "sensor"
+    instance = MagicMock()
+    instance.create_entity_id.side_effect = lambda name: "instance_" + name
+    instance.coalesce_window = 0
+    instance.tracked_attributes = ("label",)
+    instance.event_mode = EVENT_MODE_DOMAIN
+    instance.metrics = Metrics()
+    _hass.data = {DOMAIN: {entry.entry_id: instance}}
+    with patch.object(SleepAsAndroidSensor, "async_write_ha_state"):
+        yield SleepAsAndroidSensor(_hass, entry, "phone")
+
+
+@pytest.fixture
+def ready_sensor(sensor):
+    """Sensor that is added to Home Assistant."""
+    sensor._flush_pending()
+    return sensor
+
+
+class TestPendingMessages:
+    """Tests for messages received before sensor is added."""
+
+    def test_buffered_until_ready(self, sensor):
+        """Messages are processed in order after sensor is ready."""
+        sensor.process_message(_message("sleep_tracking_started"))
+        sensor.process_message(_message("light_sleep"))
+        assert sensor.state == "unknown"
+        sensor.hass.bus.async_fire.assert_not_called()
+
+        sensor._flush_pending()
+
+        assert sensor.state == "light_sleep"
+        fired = [c.args[1]["type"] for c in sensor.hass.bus.async_fire.call_args_list]
+        assert fired == ["sleep_tracking_started", "light_sleep"]
+
+        sensor.process_message(_message("deep_sleep"))
+        assert sensor.state == "deep_sleep"
+
+    def test_buffer_is_bounded(self, sensor):
+        """Oldest messages are dropped and counted."""
+        for i in range(PENDING_MESSAGES_LIMIT + 5):
+            sensor.process_message(_message("awake", str(i)))
+
+        assert sensor.dropped_messages == 5
+        sensor._flush_pending()
+        assert sensor.extra_state_attributes["timestamp"] == str(
+            PENDING_MESSAGES_LIMIT + 4
+        )
+        assert sensor.hass.bus.async_fire.call_count == PENDING_MESSAGES_LIMIT
+
+
+class TestCoalescedWrites:
+    """Tests for batching state writes."""
+
+    def test_disabled(self, ready_sensor):
+        """Every state change is written without coalesce window."""
+        for i, event in enumerate(("light_sleep", "deep_sleep", "light_sleep")):
+            ready_sensor.process_message(_message(event, str(i)))
+        assert ready_sensor.async_write_ha_state.call_count == 3
+        assert ready_sensor.writes_saved == 0
+
+    @patch("custom_components.sleep_as_android.sensor.async_call_later")
+    def test_window(self, mocked_call_later, ready_sensor):
+        """Changes inside window are written once when it closes."""
+        ready_sensor._instance.coalesce_window = 30
+        events = ("light_sleep", "deep_sleep", "rem", "awake")
+        for event in events:
+            ready_sensor.process_message(_message(event))
+
+        # first change is written immediately, triggers are not delayed
+        assert ready_sensor.async_write_ha_state.call_count == 1
+        assert ready_sensor.hass.bus.async_fire.call_count == len(events)
+        assert ready_sensor.writes_saved == 2
+        mocked_call_later.assert_called_once()
+
+        close_window = mocked_call_later.call_args.args[2]
+        close_window(None)
+        assert ready_sensor.async_write_ha_state.call_count == 2
+        assert ready_sensor.state == "awake"
+
+        # window is reopened by the trailing write and closes without changes
+        close_window = mocked_call_later.call_args.args[2]
+        close_window(None)
+        assert ready_sensor.async_write_ha_state.call_count == 2
+
+
+class TestAttributeDiffing:
+    """Tests for writing state only when something tracked changed."""
+
+    def test_volatile_attribute_does_not_write(self, ready_sensor):
+        """Timestamp only change keeps written state."""
+        ready_sensor.async_write_ha_state.reset_mock()
+        ready_sensor.process_message(_message("awake", "1"))
+        ready_sensor.process_message(_message("awake", "2"))
+        assert ready_sensor.async_write_ha_state.call_count == 1
+        assert ready_sensor.extra_state_attributes["timestamp"] == "2"
+        assert ready_sensor.hass.bus.async_fire.call_count == 2
+
+    def test_tracked_attribute_writes(self, ready_sensor):
+        """Change of tracked attribute is written even if state is the same."""
+        ready_sensor.async_write_ha_state.reset_mock()
+        ready_sensor.process_message(_message("alarm_alert_start", "1", "first"))
+        ready_sensor.process_message(_message("alarm_alert_start", "2", "second"))
+        assert ready_sensor.async_write_ha_state.call_count == 2
+
+    def test_attributes_are_not_mutated_in_place(self, ready_sensor):
+        """Previously exposed attributes dict is not changed by new message."""
+        ready_sensor.process_message(_message("awake", "1"))
+        attributes = ready_sensor.extra_state_attributes
+        ready_sensor.process_message(_message("awake", "2"))
+        assert attributes["timestamp"] == "1"
+
+
+class TestDuplicates:
+    """Tests for suppressing redelivered messages."""
+
+    def test_redelivered_payload_is_not_decoded(self, ready_sensor):
+        """Same payload is suppressed before JSON decoding."""
+        ready_sensor.process_message(_message("alarm_alert_start", "1"))
+        with patch("custom_components.sleep_as_android.sensor.decode") as decode:
+            ready_sensor.process_message(_message("alarm_alert_start", "1"))
+            decode.assert_not_called()
+
+        assert ready_sensor.duplicates_suppressed == 1
+        assert ready_sensor.hass.bus.async_fire.call_count == 1
+
+    def test_same_event_with_other_payload(self, ready_sensor):
+        """Event with the same timestamp is suppressed even if payload differs."""
+        ready_sensor.process_message(_message("alarm_alert_start", "1"))
+        msg = _message("alarm_alert_start", "1")
+        msg.payload = msg.payload.replace(" ", "")
+        ready_sensor.process_message(msg)
+
+        assert ready_sensor.duplicates_suppressed == 1
+        assert ready_sensor.hass.bus.async_fire.call_count == 1
+
+    def test_repeated_snooze_is_processed(self, ready_sensor):
+        """Event repeated later with the same timestamp is not a duplicate."""
+        with patch(
+            "custom_components.sleep_as_android.sensor.monotonic",
+            side_effect=[100.0, 100.0 + DEDUPE_INTERVAL],
+        ):
+            ready_sensor.process_message(_message("alarm_snooze_clicked", "1"))
+            ready_sensor.process_message(_message("alarm_snooze_clicked", "1"))
+
+        assert ready_sensor.duplicates_suppressed == 0
+        assert ready_sensor.hass.bus.async_fire.call_count == 2
+
+    def test_retained_message_is_suppressed(self, ready_sensor):
+        """Retained redelivery is suppressed however late it comes."""
+        with patch(
+            "custom_components.sleep_as_android.sensor.monotonic",
+            side_effect=[100.0, 1000.0],
+        ):
+            ready_sensor.process_message(_message("alarm_snooze_clicked", "1"))
+            msg = _message("alarm_snooze_clicked", "1")
+            msg.retain = True
+            ready_sensor.process_message(msg)
+
+        assert ready_sensor.duplicates_suppressed == 1
+        assert ready_sensor.hass.bus.async_fire.call_count == 1
+
+    def test_new_events_are_processed(self, ready_sensor):
+        """Same event with new timestamp and events without timestamp are fired."""
+        ready_sensor.process_message(_message("awake", "1"))
+        ready_sensor.process_message(_message("awake", "2"))
+        msg = MagicMock()
+        msg.payload = json.dumps({"event": "awake"})
+        ready_sensor.process_message(msg)
+        ready_sensor.process_message(msg)
+
+        assert ready_sensor.duplicates_suppressed == 0
+        assert ready_sensor.hass.bus.async_fire.call_count == 4
+
+
+class TestEventMode:
+    """Tests for selecting fired events."""
+
+    @pytest.mark.parametrize(
+        "mode, event_types",
+        [
+            (EVENT_MODE_DEVICE, ["instance_phone"]),
+            (EVENT_MODE_DOMAIN, [DEVICE_TRIGGER_EVENT]),
+            (EVENT_MODE_BOTH, ["instance_phone", DEVICE_TRIGGER_EVENT]),
+        ],
+    )
+    def test_mode(self, ready_sensor, mode, event_types):
+        """Only selected events are fired, always from event loop."""
+        ready_sensor._instance.event_mode = mode
+        ready_sensor.process_message(_message("awake"))
+
+        fired = [c.args[0] for c in ready_sensor.hass.bus.async_fire.call_args_list]
+        assert fired == event_types
+        ready_sensor.hass.bus.fire.assert_not_called()
+
+    def test_payloads_are_not_shared(self, ready_sensor):
+        """Every event gets its own payload: listeners may keep or change it."""
+        ready_sensor._instance.event_mode = EVENT_MODE_BOTH
+        ready_sensor.process_message(_message("awake", "1"))
+        ready_sensor.process_message(_message("awake", "2"))
+
+        payloads = [c.args[1] for c in ready_sensor.hass.bus.async_fire.call_args_list]
+        assert payloads[0] == {"event": "awake"}
+        assert payloads[1] == {"device_id": "unknown", "type": "awake"}
+        assert payloads[2] == payloads[0] and payloads[2] is not payloads[0]
+        assert payloads[3] == payloads[1] and payloads[3] is not payloads[1]
+
+
+class TestMetrics:
+    """Tests for sensor metrics."""
+
+    def test_counters(self, ready_sensor):
+        """Decode errors and unknown events are counted."""
+        ready_sensor.process_message(_message("awake", "1"))
+        ready_sensor.process_message(_message("something_new", "2"))
+        bad = MagicMock()
+        bad.payload = "not json"
+        ready_sensor.process_message(bad)
+
+        metrics = ready_sensor._instance.metrics
+        assert metrics.decode_errors == 1
+        assert metrics.unknown_events == 1
+        assert metrics.histograms[STAGE_DECODE].count == 2
+        assert ready_sensor.stats()["duplicates_suppressed"] == 0
+
+
+def test_warnings_are_limited_per_sensor(ready_sensor):
+    """Misbehaving phone does not silence warnings about other devices."""
+    entry = MagicMock()
+    entry.entry_id = "sensor"
+    other = SleepAsAndroidSensor(ready_sensor.hass, entry, "tablet")
+    other._flush_pending()
+    bad = MagicMock()
+    bad.payload = "not json"
+    with patch.object(ready_sensor._warnings, "logger") as logger:
+        ready_sensor.process_message(bad)
+        ready_sensor.process_message(bad)
+    assert logger.log.call_count == 1
+    with patch.object(other._warnings, "logger") as logger:
+        other.process_message(bad)
+    assert logger.log.call_count == 1
+
+
+def test_device_info_is_cached(sensor):
+    """Device info is built once for the unique id."""
+    info = sensor.device_info
+    assert info["identifiers"] == {(DOMAIN, "instance_phone")}
+    assert sensor.device_info is info
+
+    sensor._instance.create_entity_id.side_effect = lambda name: "renamed_" + name
+    assert sensor.device_info["identifiers"] == {(DOMAIN, "renamed_phone")}
+
+
+def test_session_listeners(ready_sensor):
+    """Session listeners are called only when session changes."""
+    listener = MagicMock()
+    remove = ready_sensor.async_add_listener("session", listener)
+
+    ready_sensor.process_message(_message("light_sleep", "1000"))
+    listener.assert_not_called()
+
+    ready_sensor.process_message(_message("sleep_tracking_started", "2000"))
+    ready_sensor.process_message(_message("deep_sleep", "62000"))
+    ready_sensor.process_message(_message("rem", "182000"))
+    assert listener.call_count == 3
+    assert ready_sensor.session.durations["deep_sleep"] == 120
+
+    remove()
+    ready_sensor.process_message(_message("awake", "242000"))
+    assert listener.call_count == 3
+
+
+def test_derived_state_listeners(ready_sensor):
+    """Listeners of derived states are called on transitions only."""
+    listener = MagicMock()
+    ready_sensor.async_add_listener("sleeping", listener)
+
+    for event, timestamp in (("light_sleep", "1"), ("deep_sleep", "2"), ("awake", "3")):
+        ready_sensor.process_message(_message(event, timestamp))
+
+    assert listener.call_count == 2
+    assert ready_sensor.derived.values["sleeping"] is False
+
+
+async def test_registry_scan():
+    """Sensors of devices are restored; session, binary and diagnostic ones are not."""
+    instance = MagicMock()
+    instance.create_entity_id.side_effect = lambda name: "foo_" + name
+    instance.device_name_from_entity_id.side_effect = lambda unique_id: unique_id[4:]
+    instance.diagnostic_sensors = False
+    entry = MagicMock()
+    entry.entry_id = "scan"
+    _hass = MagicMock()
+    _hass.data = {DOMAIN: {entry.entry_id: instance}}
+    entities = []
+    for domain, unique_id, entity_category in (
+        ("sensor", "foo_phone", None),
+        ("sensor", "foo_phone/session", None),
+        ("binary_sensor", "foo_phone_sleeping", None),
+        ("sensor", "foo_latency_p99", EntityCategory.DIAGNOSTIC),
+        # device named like session sensor of another device
+        ("sensor", "foo_phone_session", None),
+        ("sensor", "foo_phone_session/session", None),
+    ):
+        entity = MagicMock()
+        entity.domain = domain
+        entity.unique_id = unique_id
+        entity.entity_category = entity_category
+        entities.append(entity)
+
+    with patch(
+        "custom_components.sleep_as_android.sensor.async_entries_for_config_entry",
+        return_value=entities,
+    ):
+        await async_setup_entry(_hass, entry, MagicMock())
+
+    instance.async_restore_sensors.assert_called_once_with(["phone", "phone_session"])
@@ -0,0 +1,124 @@
+"""Tests for sleep session aggregation."""
+import pytest
+
+from custom_components.sleep_as_android.session import SleepSession
+
+
+def _feed(session: SleepSession, *events: tuple[str, float]) -> list[bool]:
+    return [session.update(event, at) for event, at in events]
+
+
+class TestSleepSession:
+    """Tests for incremental session updates."""
+
+    def test_not_started(self):
+        """Events before tracking started are ignored."""
+        session = SleepSession()
+        assert _feed(session, ("deep_sleep", 0), ("sound_event_snore", 1)) == [
+            False,
+            False,
+        ]
+        assert session.as_dict()["started"] is None
+
+    def test_stages(self):
+        """Time is accounted to the stage that was current."""
+        session = SleepSession()
+        _feed(
+            session,
+            ("sleep_tracking_started", 0),
+            ("light_sleep", 60),
+            ("deep_sleep", 660),
+            ("rem", 1260),
+            ("awake", 1560),
+            ("not_awake", 1620),
+            ("light_sleep", 1680),
+            ("sleep_tracking_stopped", 1800),
+        )
+        assert session.durations == {
+            "light_sleep": 720,
+            "deep_sleep": 600,
+            "rem": 300,
+            "awake": 60,
+        }
+        assert session.sleep_seconds == 1620
+        assert session.stopped == 1800
+        assert not session.tracking
+
+    def test_pause(self):
+        """Paused time is not accounted."""
+        session = SleepSession()
+        _feed(
+            session,
+            ("sleep_tracking_started", 0),
+            ("deep_sleep", 0),
+            ("sleep_tracking_paused", 100),
+            ("sleep_tracking_resumed", 1000),
+            ("sleep_tracking_stopped", 1100),
+        )
+        assert session.durations["deep_sleep"] == 200
+
+    def test_counts(self):
+        """Sound events and snoozes are counted."""
+        session = SleepSession()
+        changed = _feed(
+            session,
+            ("sleep_tracking_started", 0),
+            ("sound_event_snore", 1),
+            ("sound_event_snore", 2),
+            ("sound_event_talk", 3),
+            ("alarm_alert_start", 4),
+            ("alarm_snooze_clicked", 5),
+        )
+        assert changed == [True, True, True, True, False, True]
+        attributes = session.as_dict()
+        assert attributes["snore"] == 2
+        assert attributes["talk"] == 1
+        assert attributes["cough"] == 0
+        assert attributes["snoozes"] == 1
+
+    def test_new_session_resets(self):
+        """Start of tracking begins a new session."""
+        session = SleepSession()
+        _feed(
+            session,
+            ("sleep_tracking_started", 0),
+            ("rem", 0),
+            ("sound_event_cough", 10),
+            ("sleep_tracking_started", 600),
+        )
+        assert session.durations["rem"] == 0
+        assert session.counts["sound_event_cough"] == 0
+        assert session.started == 600
+
+    def test_out_of_order(self):
+        """Late event does not make duration negative."""
+        session = SleepSession()
+        _feed(
+            session,
+            ("sleep_tracking_started", 100),
+            ("deep_sleep", 100),
+            ("rem", 50),
+        )
+        assert session.durations["deep_sleep"] == 0
+
+    @pytest.mark.parametrize("tracking", [True, False])
+    def test_restore(self, tracking):
+        """Session is restored from its attributes."""
+        session = SleepSession()
+        _feed(
+            session,
+            ("sleep_tracking_started", 0),
+            ("deep_sleep", 0),
+            ("sound_event_snore", 10),
+            ("rem", 600),
+        )
+        if not tracking:
+            session.update("sleep_tracking_stopped", 900)
+
+        restored = SleepSession()
+        restored.restore(session.as_dict())
+        assert restored.as_dict() == session.as_dict()
+
+        # time between the last event and restart is unknown
+        restored.update("awake", 1000)
+        assert restored.durations["rem"] == session.durations["rem"]
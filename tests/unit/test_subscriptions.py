@@ -0,0 +1,112 @@
+"""Tests for shared MQTT subscriptions."""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from custom_components.sleep_as_android.const import DATA_SUBSCRIPTIONS
+from custom_components.sleep_as_android.subscriptions import (
+    SubscriptionManager,
+    async_get_subscription_manager,
+)
+
+PREFIX = "custom_components.sleep_as_android.subscriptions.subscription."
+
+
+@pytest.fixture(params=[True, False], ids=["prepare_subscribe", "legacy"])
+def broker(request):
+    """Subscription helper that keeps subscribed topics like a broker.
+
+    Both subscription APIs are tested: prepare/subscribe of Home Assistant 2022.3
+    and newer, and single async_subscribe_topics of older releases.
+    """
+    subscribed = {}
+
+    def prepare(hass, new_state, topics):
+        subscribed.clear()
+        subscribed.update(topics)
+        return dict(topics)
+
+    async def subscribe(hass, sub_state=None, new_state=None, topics=None):
+        if topics is not None:
+            return prepare(hass, new_state, topics)
+        return sub_state
+
+    with patch(
+        "custom_components.sleep_as_android.subscriptions.PREPARE_SUBSCRIBE_TOPICS",
+        request.param,
+    ), patch(
+        PREFIX + "async_prepare_subscribe_topics", side_effect=prepare, create=True
+    ) as mocked_prepare, patch(
+        PREFIX + "async_subscribe_topics", side_effect=subscribe
+    ):
+        yield subscribed
+        if not request.param:
+            mocked_prepare.assert_not_called()
+
+
+def _publish(topics: dict, topic: str):
+    msg = MagicMock()
+    msg.topic = topic
+    for subscription in topics.values():
+        if subscription["topic"] in (topic, topic.rsplit("/", 1)[0] + "/+"):
+            subscription["msg_callback"](msg)
+    return msg
+
+
+async def test_identical_filters_share_subscription(broker):
+    """Two entries with the same topic result in one broker subscription."""
+    manager = SubscriptionManager(MagicMock())
+    first, second = MagicMock(), MagicMock()
+    unsub_first = await manager.async_subscribe("SleepAsAndroid/+", 0, first)
+    unsub_second = await manager.async_subscribe("SleepAsAndroid/+", 1, second)
+
+    assert list(broker) == ["SleepAsAndroid/+"]
+    assert manager.topic_filters == {"SleepAsAndroid/+": 1}
+
+    msg = _publish(broker, "SleepAsAndroid/phone")
+    first.assert_called_once_with(msg)
+    second.assert_called_once_with(msg)
+
+    await unsub_first()
+    assert list(broker) == ["SleepAsAndroid/+"]
+    await unsub_second()
+    assert broker == {}
+    assert len(manager) == 0
+
+
+async def test_covered_filter_is_routed(broker):
+    """Narrower filter is served by the wider subscription."""
+    manager = SubscriptionManager(MagicMock())
+    wide, narrow = MagicMock(), MagicMock()
+    await manager.async_subscribe("SleepAsAndroid/+", 0, wide)
+    unsub_narrow = await manager.async_subscribe("SleepAsAndroid/phone", 0, narrow)
+
+    assert list(broker) == ["SleepAsAndroid/+"]
+    _publish(broker, "SleepAsAndroid/phone")
+    _publish(broker, "SleepAsAndroid/tablet")
+    assert wide.call_count == 2
+    assert narrow.call_count == 1
+
+    await unsub_narrow()
+    _publish(broker, "SleepAsAndroid/phone")
+    assert narrow.call_count == 1
+
+
+async def test_failing_callback_does_not_block_others(broker):
+    """Error in one entry does not prevent delivery to another."""
+    manager = SubscriptionManager(MagicMock())
+    good = MagicMock()
+    await manager.async_subscribe("a/+", 0, MagicMock(side_effect=ValueError))
+    await manager.async_subscribe("a/+", 0, good)
+
+    _publish(broker, "a/b")
+    good.assert_called_once()
+
+
+def test_manager_is_shared():
+    """All entries use one manager."""
+    hass = MagicMock()
+    hass.data = {}
+    manager = async_get_subscription_manager(hass)
+    assert hass.data[DATA_SUBSCRIPTIONS] is manager
+    assert async_get_subscription_manager(hass) is manager
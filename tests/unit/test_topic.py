@@ -0,0 +1,112 @@
+"""Tests for MQTT topic router."""
+
+import pytest
+
+from custom_components.sleep_as_android.topic import (
+    TopicFilterIndex,
+    TopicRouter,
+    filter_covers,
+)
+
+
+class TestTopicRouter:
+    """Tests for topic router."""
+
+    @pytest.mark.parametrize(
+        "template, subscription_topic, position",
+        [
+            ("SleepAsAndroid/%%%device%%%", "SleepAsAndroid/+", 1),
+            ("foo/%%%device%%%/bar", "foo/+/bar", 1),
+            ("foo/%%%device%%%baz", "foo/+", 1),
+            ("%%%device%%%/#", "+/#", 0),
+            ("foo/bar", "foo/bar", 2),
+        ],
+    )
+    def test_compile(self, template, subscription_topic, position):
+        """Check subscription topic and device position."""
+        router = TopicRouter(template)
+        assert router.subscription_topic == subscription_topic
+        assert router.device_position == position
+
+    def test_invalid_multi_level_wildcard(self):
+        """Multi-level wildcard is allowed only at the end of topic."""
+        with pytest.raises(ValueError):
+            TopicRouter("foo/#/%%%device%%%")
+
+    @pytest.mark.parametrize(
+        "template, topic, expect",
+        [
+            ("SleepAsAndroid/%%%device%%%", "SleepAsAndroid/phone", "phone"),
+            ("foo/%%%device%%%/bar", "foo/phone/bar", "phone"),
+            ("foo/%%%device%%%baz", "foo/phonebaz", "phone"),
+            ("foo/pre%%%device%%%post/#", "foo/prephonepost/a/b", "phone"),
+            ("foo/%%%device%%%baz", "foo/phone", None),
+            ("foo/%%%device%%%baz", "foo/baz", None),
+            ("foo/%%%device%%%/bar", "foo", None),
+            ("foo/bar", "foo/bar", "bar"),
+        ],
+    )
+    def test_device_name(self, template, topic, expect):
+        """Check device name extraction."""
+        assert TopicRouter(template).device_name(topic) == expect
+
+    def test_intern_table_is_bounded(self):
+        """Distinct topics must not grow the intern table over its limit."""
+        router = TopicRouter("SleepAsAndroid/%%%device%%%", max_size=10)
+        for i in range(1000):
+            assert router.device_name(f"SleepAsAndroid/{i}") == str(i)
+        assert len(router) == 10
+
+        router.clear()
+        assert len(router) == 0
+
+
+@pytest.mark.parametrize(
+    "wide, narrow, expect",
+    [
+        ("a/+", "a/b", True),
+        ("a/+", "a/+", True),
+        ("a/#", "a/b/c", True),
+        ("a/#", "a", True),
+        ("#", "a/+/c", True),
+        ("a/b", "a/+", False),
+        ("a/+", "a/b/c", False),
+        ("a/+", "a/#", False),
+        ("a/+/c", "a/b/+", False),
+        ("a/b/c", "a/b", False),
+    ],
+)
+def test_filter_covers(wide, narrow, expect):
+    """Check if one topic filter covers another."""
+    assert filter_covers(wide, narrow) is expect
+
+
+class TestTopicFilterIndex:
+    """Tests for topic filter index."""
+
+    def test_match(self):
+        """All matching filters are found."""
+        index = TopicFilterIndex()
+        for topic_filter in ["a/b", "a/+", "a/#", "+/b", "#", "a/b/c", "b/+"]:
+            index.add(topic_filter, topic_filter)
+
+        assert sorted(index.match("a/b")) == ["#", "+/b", "a/#", "a/+", "a/b"]
+        assert sorted(index.match("a")) == ["#", "a/#"]
+        assert sorted(index.match("a/b/c")) == ["#", "a/#", "a/b/c"]
+        assert sorted(index.match("c/d")) == ["#"]
+
+    def test_add_resets_results(self):
+        """Adding filter drops remembered results."""
+        index = TopicFilterIndex()
+        index.add("a/+", 1)
+        assert index.match("a/b") == (1,)
+        index.add("a/b", 2)
+        assert index.match("a/b") == (2, 1)
+
+    def test_results_are_bounded(self):
+        """Distinct topics must not grow result table over its limit."""
+        index = TopicFilterIndex(max_size=10)
+        index.add("a/+", 1)
+        for i in range(100):
+            assert index.match(f"a/{i}") == (1,)
+        assert len(index._matches) == 10
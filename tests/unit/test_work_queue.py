@@ -0,0 +1,183 @@
+"""Tests for per-device message queue."""
+
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from custom_components.sleep_as_android.const import (
+    QUEUE_POLICY_BLOCK,
+    QUEUE_POLICY_COALESCE,
+    QUEUE_POLICY_DROP_OLDEST,
+)
+from custom_components.sleep_as_android.work_queue import DeviceQueue, event_type
+
+
+def _message(event: str, timestamp: int = 0) -> MagicMock:
+    msg = MagicMock()
+    msg.payload = json.dumps({"event": event, "value1": str(timestamp)})
+    return msg
+
+
+def _events(messages) -> list:
+    return [json.loads(m.payload)["event"] for m in messages]
+
+
+def _queue(policy: str, maxsize: int = 3):
+    processed = []
+    queue = DeviceQueue(
+        "phone",
+        processed.append,
+        asyncio.get_event_loop().create_task,
+        policy,
+        maxsize,
+    )
+    return queue, processed
+
+
+async def _drain():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_processed_in_background():
+    """Messages are processed by worker, not by caller."""
+    queue, processed = _queue(QUEUE_POLICY_DROP_OLDEST)
+    queue.put(_message("awake"))
+    queue.put(_message("rem"))
+    assert processed == []
+    assert queue.depth == 2
+
+    await _drain()
+
+    assert _events(processed) == ["awake", "rem"]
+    assert queue.stats() == {
+        "depth": 0,
+        "max_depth": 2,
+        "processed": 2,
+        "dropped": 0,
+        "coalesced": 0,
+    }
+
+
+async def test_drop_oldest():
+    """Oldest messages are dropped when queue is full."""
+    queue, processed = _queue(QUEUE_POLICY_DROP_OLDEST)
+    for event in ("a", "b", "c", "d", "e"):
+        queue.put(_message(event))
+
+    await _drain()
+
+    assert _events(processed) == ["c", "d", "e"]
+    assert queue.dropped == 2
+    assert queue.max_depth == 3
+
+
+async def test_coalesce():
+    """When queue is full, queued message of the same event type is replaced."""
+    queue, processed = _queue(QUEUE_POLICY_COALESCE, maxsize=4)
+    queue.put(_message("light_sleep", 1))
+    queue.put(_message("awake", 2))
+    queue.put(_message("rem", 3))
+    queue.put(_message("deep_sleep", 4))
+    queue.put(_message("light_sleep", 5))
+    queue.put(_message("snore", 6))
+
+    await _drain()
+
+    # new light_sleep is queued in arrival order, snore makes oldest message dropped
+    assert _events(processed) == ["rem", "deep_sleep", "light_sleep", "snore"]
+    assert json.loads(processed[2].payload)["value1"] == "5"
+    assert queue.coalesced == 1
+    assert queue.dropped == 1
+
+
+async def test_coalesce_only_when_full():
+    """Messages of the same event type are not coalesced while queue has room."""
+    queue, processed = _queue(QUEUE_POLICY_COALESCE)
+    queue.put(_message("light_sleep", 1))
+    queue.put(_message("light_sleep", 2))
+
+    await _drain()
+
+    assert [json.loads(m.payload)["value1"] for m in processed] == ["1", "2"]
+    assert queue.coalesced == 0
+
+
+@pytest.mark.parametrize(
+    "payload, expect",
+    [
+        ('{"event":"awake","value1":"1"}', "awake"),
+        ('{"value1": "1", "event" : "rem"}', "rem"),
+        (b'{"event":"awake"}', b"awake"),
+        ('{"value2": "\\"event\\": \\"x\\"", "event": "rem"}', "rem"),
+        ('{"value1": "1"}', None),
+        ("not json", None),
+    ],
+)
+def test_event_type(payload, expect):
+    """Event type is found without decoding payload."""
+    msg = MagicMock()
+    msg.payload = payload
+    assert event_type(msg) == expect
+
+
+async def test_block():
+    """Caller processes oldest message when queue is full, nothing is dropped."""
+    queue, processed = _queue(QUEUE_POLICY_BLOCK)
+    for event in ("a", "b", "c", "d", "e"):
+        queue.put(_message(event))
+    assert _events(processed) == ["a", "b"]
+
+    await _drain()
+
+    assert _events(processed) == ["a", "b", "c", "d", "e"]
+    assert queue.dropped == 0
+
+
+async def test_stop():
+    """Stopped queue forgets messages."""
+    queue, processed = _queue(QUEUE_POLICY_DROP_OLDEST)
+    queue.put(_message("awake"))
+    queue.stop()
+
+    await _drain()
+
+    assert processed == []
+    assert queue.depth == 0
+
+
+async def test_flush():
+    """Flushed messages are processed by caller, worker finds nothing left."""
+    queue, processed = _queue(QUEUE_POLICY_DROP_OLDEST)
+    queue.put(_message("awake"))
+    queue.put(_message("rem"))
+    queue.flush()
+    assert _events(processed) == ["awake", "rem"]
+
+    await _drain()
+
+    assert queue.processed == 2
+    assert queue.depth == 0
+
+
+@pytest.mark.parametrize("policy", [QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_COALESCE])
+async def test_error_does_not_stop_worker(policy):
+    """Worker continues after failed message."""
+    processed = []
+
+    def process(msg):
+        if json.loads(msg.payload)["event"] == "bad":
+            raise ValueError
+        processed.append(msg)
+
+    queue = DeviceQueue(
+        "phone", process, asyncio.get_event_loop().create_task, policy, 10
+    )
+    queue.put(_message("bad"))
+    queue.put(_message("awake"))
+
+    await _drain()
+
+    assert _events(processed) == ["awake"]